@@ -10,5 +10,103 @@ class Settings(BaseSettings):
 
     cors_allowed_origins: list[str] = ["http://localhost:3000", "http://127.0.0.1:3000"]
 
+    # Camera lifecycle: detection keeps running this long after the last client leaves, so
+    # reconnecting clients don't wait for the camera to reopen; stopping waits for the camera up to the timeout
+    detection_grace_period_s: float = 10.0
+    detection_stop_timeout_s: float = 5.0
+
+    # Frames of the detection loop: "camera" ("camera:<index>"), "video:<path>", "replay:<directory>" or
+    # "synthetic" ("synthetic:<people>"). Files, replays and synthetic frames play at frame_source_speed
+    # times their own rate (0 = as fast as they can be processed)
+    frame_source: str = "camera"
+    frame_source_speed: float = 1.0
+    frame_source_loop: bool = True
+    frame_source_seed: int = 0
+    record_session_dir: str | None = None  # Record the loop's frames there for replay:<directory>
+
+    # YOLO batching across frame sources
+    yolo_batch_max_size: int = 4
+    yolo_batch_max_wait_ms: float = 10.0
+
+    # Person detection in worker processes (0 = in-process thread, -1 = one per CPU core)
+    inference_process_workers: int = 0
+
+    # Adaptive YOLO input size from measured latency against the target FPS
+    target_fps: float = 30.0
+    adaptive_resolution: bool = False
+    adaptive_resolution_sizes: list[int] = [320, 416, 512, 640]
+
+    # Tracking sessions (ByteTrack + emotion history of one frame source): idle ones are evicted after
+    # tracking_session_idle_s, or after tracking_session_pressure_idle_s while memory is short
+    tracking_session_idle_s: float = 300.0
+    tracking_session_pressure_idle_s: float = 10.0
+    tracking_session_memory_limit_mb: int = 0  # Process RSS counted as pressure (0 = system memory only)
+    tracking_session_memory_percent: float = 90.0  # System memory use counted as pressure
+
+    # Re-identification: a new tracker ID whose face embedding has cosine similarity of at least reid_similarity
+    # with someone not in the frame (seen within reid_ttl_s) takes over that person's emotion history
+    reid: bool = True
+    reid_similarity: float = 0.9
+    reid_ttl_s: float = 60.0
+    reid_max_entries: int = 128  # Per tracking session
+
+    # Frames uploaded by clients over /api/ws/emotions/upload
+    upload_workers: int = 8
+    upload_max_frame_bytes: int = 2 * 1024 * 1024
+
+    # Load shedding: with the busiest pipeline stage (camera processing, upload workers, encoding) busy more
+    # than load_shedding_high of the time for load_shedding_down_after_s, the pipeline drops one quality tier
+    # (full, stable_emotions, low_resolution, low_quality, low_fps, metadata_only); below load_shedding_low
+    # for load_shedding_up_after_s it goes back up one. Off by default: on CPU, YOLO alone keeps the
+    # camera loop busy most of the time whatever the tier
+    load_shedding: bool = False
+    load_shedding_high: float = 0.8
+    load_shedding_low: float = 0.5
+    load_shedding_down_after_s: float = 1.0
+    load_shedding_up_after_s: float = 5.0
+    load_shedding_max_tier: str = "metadata_only"
+    load_shedding_imgsz: int = 320
+    load_shedding_quality_factor: float = 0.6
+    load_shedding_fps_factor: float = 0.5
+
+    # Still-image analysis (/api/emotions/analyze): pooled MediaPipe recognizers and decode threads
+    recognizer_pool_size: int = 4  # Static-mode graphs for one-off images
+    stream_recognizer_pool_size: int = 4  # Tracking-mode graphs, one per active ?stream=
+    recognizer_checkout_timeout_s: float = 10.0
+    analyze_decode_workers: int = 4
+    analyze_max_image_bytes: int = 5 * 1024 * 1024
+    analyze_batch_max_images: int = 32
+
+    # Health probes: a running pipeline with no frame for pipeline_stall_after_s is "stalled" (not ready),
+    # one below pipeline_min_fps_ratio * target_fps is "degraded"
+    health_cache_ttl_s: float = 1.0
+    pipeline_stall_after_s: float = 5.0
+    pipeline_min_fps_ratio: float = 0.5
+    pipeline_fps_window_s: float = 2.0
+
+    # Emotion-driven playback
+    auto_playback_min_dwell_s: float = 5.0
+    auto_playback_confidence: float = 0.6
+    auto_playback_interval_s: float = 15.0
+
+    # Track prefetching: URIs kept ready per emotion
+    playback_prefetch_size: int = 5
+
+    # Spotify metadata caches
+    spotify_device_cache_ttl_s: float = 60.0
+    spotify_playlist_cache_ttl_s: float = 3600.0
+
+    # Sessions ("memory" is per process; "sqlite" is shared by every worker on the host)
+    session_backend: str = "memory"
+    session_sqlite_path: str = "sessions.db"
+    session_ttl_s: float = 7 * 24 * 3600
+    session_max_entries: int = 1000
+    session_cookie_secure: bool = False
+    oauth_state_ttl_s: float = 600.0
+
+    # Admin endpoints (/api/admin/...) are refused unless a token is set; send it as X-Admin-Token
+    admin_token: str | None = None
+    profiler_max_duration_s: float = 60.0
+
 
 settings = Settings()
@@ -1,7 +1,11 @@
+import asyncio
 import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from app.core.settings import settings
-from app.routers import emotion_detection, checkhealth, spotify
+from app.routers import emotion_detection, checkhealth, spotify, metrics, admin
+from app.services.spotify_service import spotify_client
+from model.emotion_detector import broadcaster
 import logging
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
@@ -14,10 +18,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger("FastAPI")
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    spotify.playback_controller.stop()
+    await spotify_client.aclose()
+    await asyncio.get_running_loop().run_in_executor(None, broadcaster.shutdown)
+
+
 app = FastAPI(
         title=settings.app_name,
         version=settings.version,
         debug=settings.debug,
+        lifespan=lifespan,
         )
 
 app.add_middleware(
@@ -41,6 +55,8 @@ async def log_request(request: Request, call_next):
 app.include_router(emotion_detection.router)
 app.include_router(checkhealth.router)
 app.include_router(spotify.router, prefix="/api/spotify", tags=["Spotify"])
+app.include_router(metrics.router)
+app.include_router(admin.router)
 
 @app.get("/")
 async def root():
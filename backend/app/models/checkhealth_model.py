@@ -1,3 +1,4 @@
+from typing import Any
 from pydantic import BaseModel
 
 class HealthStatus(BaseModel):
@@ -5,3 +6,13 @@ class HealthStatus(BaseModel):
     service: str
     version: str
     services: dict[str, str]
+
+class LivenessStatus(BaseModel):
+    status: str
+    uptime_s: float
+
+class ReadinessStatus(BaseModel):
+    ready: bool
+    status: str
+    services: dict[str, str]
+    pipeline: dict[str, Any]
@@ -3,9 +3,18 @@ from pydantic import BaseModel
 class EmotionFrameRequest(BaseModel):
     frame: str
 
+class EmotionBatchRequest(BaseModel):
+    frames: list[str]
+
 class EmotionDetectionResponse(BaseModel):
-    emotion: str
-    frame: str
+    emotion: str | None = None
+    scores: dict[str, float] = {}
+    face_detected: bool = False
+    frame: str | None = None
+    error: str | None = None
+
+class EmotionBatchResponse(BaseModel):
+    results: list[EmotionDetectionResponse]
 
 class EmotionHistoryResponse(BaseModel):
     history: list[str]
@@ -0,0 +1,78 @@
+import asyncio
+import secrets
+import threading
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.core.settings import settings
+from model.emotion_detector import broadcaster
+from model.profiler import StackSampler
+
+router = APIRouter(prefix="/api/admin", tags=["Admin"])
+
+profile_lock = asyncio.Lock()
+
+
+def check_admin(request: Request):
+    """Error response unless the request carries the configured admin token"""
+    if not settings.admin_token:
+        return JSONResponse(status_code=403, content={"error": "Admin endpoints are disabled (no ADMIN_TOKEN set)"})
+
+    token = request.headers.get("X-Admin-Token", "")
+    if not secrets.compare_digest(token.encode(), settings.admin_token.encode()):
+        return JSONResponse(status_code=401, content={"error": "Invalid admin token"})
+
+    return None
+
+
+def pipeline_threads(all_threads: bool) -> dict[int, str]:
+    """Threads to sample: the event loop (the caller's thread) and the detection pipeline's threads"""
+    if all_threads:
+        return {thread.ident: thread.name for thread in threading.enumerate()
+                if thread.ident is not None and thread.name != "stack-sampler"}
+
+    threads = {threading.get_ident(): "event-loop"}
+
+    if broadcaster.detection_thread is not None and broadcaster.detection_thread.is_alive():
+        threads[broadcaster.detection_thread.ident] = "detection"
+
+    scheduler = broadcaster.inference_scheduler
+    if scheduler is not None and scheduler.thread is not None and scheduler.thread.is_alive():
+        threads[scheduler.thread.ident] = "inference-scheduler"
+
+    return threads
+
+
+@router.post("/profile")
+async def profile(request: Request, seconds: float = 10.0, interval_ms: float = 5.0,
+                  format: str = "json", all_threads: bool = False):
+    """
+    Sample the server's stacks for a while and report where the time goes
+
+    format=json (default) returns the hottest functions, breakdowns of
+    process_frame and its sub-calls, and the collapsed stacks; format=collapsed
+    returns only the collapsed stacks, ready for flamegraph.pl or speedscope.
+    """
+    error = check_admin(request)
+    if error:
+        return error
+
+    if format not in ("json", "collapsed"):
+        return JSONResponse(status_code=400, content={"error": f"Unknown format: {format}"})
+
+    if profile_lock.locked():
+        return JSONResponse(status_code=409, content={"error": "A profile is already running"})
+
+    async with profile_lock:
+        duration = max(0.1, min(seconds, settings.profiler_max_duration_s))
+        sampler = StackSampler(pipeline_threads(all_threads), interval=max(1.0, interval_ms) / 1000)
+
+        sampler.start(duration)
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            sampler.stop()
+
+    if format == "collapsed":
+        return PlainTextResponse(sampler.collapsed())
+
+    return sampler.report()
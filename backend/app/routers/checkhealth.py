@@ -1,16 +1,42 @@
+import time
 from fastapi import APIRouter
-from app.models.checkhealth_model import HealthStatus
+from fastapi.responses import JSONResponse
+from app.models.checkhealth_model import HealthStatus, LivenessStatus, ReadinessStatus
 from app.core.settings import settings
+from app.routers.spotify import playback_controller
 from app.services.checkhealth_service import *
 
 router = APIRouter(prefix="/api")
 
+health_cache = HealthCache(settings.health_cache_ttl_s)
+
+
+def current_health() -> dict:
+    # Spotify matters most for the session driving auto-playback
+    return health_cache.get(lambda: collect_health(spotify_session_id=playback_controller.owner))
+
+
 @router.get(path="/health", response_model=HealthStatus)
 async def check_health():
+    health = current_health()
     return HealthStatus(
-            status="ok",
+            status=health["status"],
             service="EmotiPlay Backend",
             version=settings.version,
-            services={"emotion_recognition": is_emotion_recognition_ok(), "spotify_integration": is_spotify_ok(), "mediapipe": is_mediapipe_loaded(),}
+            services=health["services"]
             )
 
+
+@router.get(path="/health/live", response_model=LivenessStatus)
+async def liveness():
+    """The process and its event loop respond"""
+    return LivenessStatus(status="alive", uptime_s=time.monotonic() - STARTED_AT)
+
+
+@router.get(path="/health/ready", response_model=ReadinessStatus)
+async def readiness():
+    """503 while the detection pipeline is stalled, so load balancers drain this instance"""
+    health = current_health()
+    status = ReadinessStatus(ready=health["ready"], status=health["status"],
+                             services=health["services"], pipeline=health["pipeline"])
+    return JSONResponse(status_code=200 if status.ready else 503, content=status.model_dump())
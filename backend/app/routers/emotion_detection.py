@@ -1,10 +1,30 @@
 import asyncio
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from app.models.emotion_detection_model import EmotionHistoryResponse
+import itertools
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+from app.core.settings import settings
+from app.models.emotion_detection_model import (EmotionHistoryResponse, EmotionFrameRequest, EmotionBatchRequest,
+                                                EmotionDetectionResponse, EmotionBatchResponse)
+from app.services.emotion_detection_service import decode_images, analyze_images, encode_image
 from model.emotion_detector import broadcaster
+from model.client_source import ClientFrameSource
+from model.stream_profiles import ClientStream, STREAM_PROFILES
+from model import metrics
 
 emotion_history = []
 
+client_ids = itertools.count(1)
+
+# Uploaded frames are processed here; concurrent uploads meet in the scheduler's YOLO batches
+upload_executor = ThreadPoolExecutor(max_workers=settings.upload_workers, thread_name_prefix="upload")
+# Drawing and JPEG encoding of the broadcast frame; one thread, as the broadcaster encodes one profile at a time anyway
+encode_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="frame-encode")
+
 router = APIRouter(prefix="/api")
 
 
@@ -14,61 +34,345 @@ async def websocket_endpoint(websocket: WebSocket):
     WebSocket endpoint for real-time emotion detection stream
 
     Auto-starts detection on first connection.
-    Auto-stops when all clients disconnect.
+    Auto-stops when all clients have been gone for detection_grace_period_s.
+
+    Query params:
+        annotate=false  Send raw frames; draw boxes client-side from "emotions"
+                        (bbox, faces, emotion, confidence per person; "probabilities"
+                        holds the model's latest per-emotion distribution)
+        profile=...     full (default), medium, thumbnail or metadata (no image)
+        adaptive=false  Keep the profile fixed instead of stepping down when
+                        the client falls behind
 
-    Sends frames as JSON with base64-encoded JPEG:
+    Sends each new frame once as JSON with base64-encoded JPEG
+    ("frame" is omitted in metadata mode):
     {
-        "type": "frame",
-        "data": "base64_jpeg_string",
+        "frame": "base64_jpeg_string",
+        "emotions": [...],
+        "profile": "full",
         "timestamp": 1234567890.123,
+        "seq": 1042,
+        "client_id": 3,
+        "trace": {"seq": 1042, "captured_at": 5123.456, "age_ms": 48.2, "stages_ms": {"detect": 21.0, ...}},
         "active_tracks": 2,
-        "total_clients": 1
+        "total_clients": 1,
+        "quality_tier": "full"
     }
+
+    quality_tier is the server's load shedding tier (full, stable_emotions,
+    low_resolution, low_quality, low_fps, metadata_only); in metadata_only
+    "frame" is left out whatever the profile. People whose settled emotion was
+    reused instead of inferred again carry "emotion_reused": true; a person
+    recognized as someone who left and came back under a new ID carries
+    "reidentified_from": <previous id> on the frame their history moved over.
+
+    Clients may acknowledge frames with {"ack": <seq>} once received or drawn;
+    acknowledged frames feed the glass-to-glass numbers of /api/emotions/latency.
     """
     await websocket.accept()
 
-    # Start detection if this is the first client
-    if len(broadcaster.clients) == 0:
-        print("First client connected - starting detection system...")
-        broadcaster.start()
+    params = websocket.query_params
+    annotated = params.get("annotate", "true").lower() != "false"
+    profile = params.get("profile", "full")
+    if profile not in STREAM_PROFILES:
+        await websocket.close(code=1008, reason=f"Unknown profile: {profile}")
+        return
 
-    await broadcaster.register_client(websocket)
+    stream = ClientStream(profile=profile, adaptive=params.get("adaptive", "true").lower() != "false")
 
+    # Starts detection for the first client (or keeps it, if one left moments ago)
     try:
-        # Keep connection alive and send frames
+        await broadcaster.register_client(websocket)
+    except Exception as e:
+        print(f"Could not start detection: {e}")
+        await websocket.close(code=1011, reason="Detection unavailable")
+        return
+
+    client_id = next(client_ids)
+    broadcaster.trace_stats.add_client(client_id)
+    acks = asyncio.create_task(receive_acks(websocket, client_id))
+
+    try:
+        # Keep connection alive and send each new frame once
+        last_seq = None
         while True:
-            frame_base64 = broadcaster.get_current_frame_base64()
-            emotion_data = broadcaster.get_current_data()
+            # The ack reader saw the client leave
+            if acks.done():
+                raise WebSocketDisconnect()
+
+            _, emotion_data, seq = broadcaster.get_current_frame()
 
-            if frame_base64:
+            if emotion_data is not None and seq != last_seq:
                 # Sort emotions by ID
                 emotions_list = sorted(emotion_data.get('people', []), key=lambda x: x['id'])
 
-                await websocket.send_json({
-                    "frame": frame_base64,
+                payload = {
                     "emotions": emotions_list,
+                    "profile": stream.current,
                     "timestamp": asyncio.get_event_loop().time(),
-                    "active_tracks": len(broadcaster.emotion_tracker.last_seen) if broadcaster.emotion_tracker else 0,
-                    "total_clients": len(broadcaster.clients)
-                })
+                    "seq": seq,
+                    "client_id": client_id,
+                    "active_tracks": broadcaster.active_tracks(),
+                    "total_clients": len(broadcaster.clients),
+                    "quality_tier": broadcaster.load_shedding.tier_name
+                }
+
+                # Images are the first thing dropped when the server can't keep up
+                if stream.current != "metadata" and not broadcaster.load_shedding.metadata_only:
+                    payload["frame"] = await asyncio.get_running_loop().run_in_executor(
+                        encode_executor, partial(broadcaster.get_current_frame_base64, annotated=annotated, profile=stream.current))
+
+                trace = broadcaster.get_trace(seq)
+                if trace is not None:
+                    payload["trace"] = trace.to_payload()
+
+                send_start = time.monotonic()
+                await websocket.send_json(payload)
+                sent_at = time.monotonic()
+                send_latency = sent_at - send_start
+                if trace is not None:
+                    broadcaster.trace_stats.record_send(client_id, trace, sent_at)
+                skipped = max(0, seq - last_seq - 1) if last_seq is not None else 0
+                stream.record_send(send_latency, skipped=skipped)
+                metrics.WS_SEND_SECONDS.observe(send_latency)
+                if skipped:
+                    metrics.DROPPED_CLIENT.inc(skipped)
+                last_seq = seq
 
             await asyncio.sleep(0.033)
 
     except WebSocketDisconnect:
-        broadcaster.unregister_client(websocket)
         print("Client disconnected normally")
 
     except Exception as e:
-        broadcaster.unregister_client(websocket)
         print(f"WebSocket error: {e}")
 
     finally:
-        # Stop detection if no more clients
-        if len(broadcaster.clients) == 0:
-            print("Last client disconnected - stopping detection system...")
-            broadcaster.stop()
+        acks.cancel()
+        broadcaster.trace_stats.remove_client(client_id)
+
+        # The last client out stops detection after the grace period; shielded so a cancelled handler still counts
+        await asyncio.shield(broadcaster.unregister_client(websocket))
+
+
+async def receive_acks(websocket: WebSocket, client_id: int):
+    """Record the client's {"ack": seq} messages; returns when the client goes away"""
+    while True:
+        try:
+            message = await websocket.receive_json()
+        except (ValueError, KeyError):
+            continue  # Not JSON text; ignore it
+        except (WebSocketDisconnect, RuntimeError):
+            return
+
+        acked_at = time.monotonic()
+        seq = message.get("ack") if isinstance(message, dict) else None
+        trace = broadcaster.get_trace(seq) if isinstance(seq, int) else None
+        if trace is not None:
+            broadcaster.trace_stats.record_ack(client_id, trace, acked_at)
+
+
+@router.websocket("/ws/emotions/upload")
+async def upload_endpoint(websocket: WebSocket):
+    """
+    WebSocket endpoint for emotion detection on the client's own camera
+
+    Send each frame as a binary message (JPEG or PNG bytes) or as text
+    {"frame": "<base64>", "seq": 17}. A frame arriving while the previous one
+    is still waiting is replaced, so only the newest is processed. People are
+    tracked per connection; the server camera is not used.
+
+    Replies carry metadata only, one per processed frame:
+    {
+        "seq": 17,
+        "emotions": [...],
+        "active_tracks": 2,
+        "queue_ms": 3.1,
+        "processing_ms": 41.5,
+        "dropped": 4,
+        "quality_tier": "full",
+        "timestamp": 1234567890.123
+    }
+    """
+    await websocket.accept()
+
+    loop = asyncio.get_running_loop()
+    source = ClientFrameSource(broadcaster, max_frame_bytes=settings.upload_max_frame_bytes)
+    frame_ready = asyncio.Event()
+    receiver = None
+
+    try:
+        # Starts inference if this is the first source; closed in finally even if it fails halfway
+        try:
+            await loop.run_in_executor(upload_executor, source.open)
+        except Exception as e:
+            print(f"Could not start detection: {e}")
+            await websocket.send_json({"error": "Detection unavailable"})
+            await websocket.close(code=1011, reason="Detection unavailable")
+            return
+
+        receiver = asyncio.create_task(receive_frames(websocket, source, frame_ready))
+
+        while True:
+            await frame_ready.wait()
+            frame_ready.clear()
+
+            # The receiver saw the client leave
+            if receiver.done():
+                raise WebSocketDisconnect()
+
+            pending = source.take()
+            if pending is None:
+                continue
+
+            result = await loop.run_in_executor(upload_executor, source.process, pending)
+            if result is not None:
+                await websocket.send_json(result)
+
+    except WebSocketDisconnect:
+        print("Upload client disconnected normally")
+
+    except Exception as e:
+        print(f"Upload WebSocket error: {e}")
+
+    finally:
+        if receiver:
+            receiver.cancel()
+        # Runs to the end even if this handler is cancelled, so the tracker is always unregistered
+        await asyncio.shield(loop.run_in_executor(upload_executor, source.close))
+
+
+async def receive_frames(websocket: WebSocket, source: ClientFrameSource, frame_ready: asyncio.Event):
+    """Hand each received frame to the source; returns when the client goes away"""
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+            if message.get("bytes") is not None:
+                accepted = source.offer(message["bytes"])
+            else:
+                try:
+                    body = json.loads(message.get("text") or "")
+                    accepted = source.offer(body["frame"], body.get("seq"))
+                except (ValueError, KeyError, TypeError):
+                    continue  # Not a frame message; ignore it
+
+            if accepted:
+                frame_ready.set()
+    except (WebSocketDisconnect, RuntimeError):
+        return
+    finally:
+        frame_ready.set()
+
+
+@router.get("/emotions/latency")
+async def latency():
+    """Frame latency percentiles per pipeline stage and per connected client, and the load shedding tier"""
+    return {**broadcaster.trace_stats.report(), "load_shedding": broadcaster.load_shedding.stats()}
+
+
+@router.get("/emotions/sessions")
+async def sessions():
+    """Open tracking sessions (one per running frame source) and how long each has been idle"""
+    return {"sessions": broadcaster.sessions.report() if broadcaster.sessions else []}
 
 
 @router.get("/emotions/history", response_model=EmotionHistoryResponse)
 async def history():
     return EmotionHistoryResponse(history=emotion_history)
+
+
+async def read_images(request: Request, batch: bool):
+    """Images of a JSON body (base64) or a multipart upload; returns (items, error response)"""
+    content_type = request.headers.get("content-type", "")
+
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        uploads = form.getlist("files") + form.getlist("file") + form.getlist("frame")
+        items = [await upload.read() if hasattr(upload, "read") else upload for upload in uploads]
+    else:
+        try:
+            body = await request.json()
+            items = EmotionBatchRequest.model_validate(body).frames if batch else [EmotionFrameRequest.model_validate(body).frame]
+        except (ValueError, ValidationError):
+            expected = '{"frames": [base64, ...]}' if batch else '{"frame": base64}'
+            return None, JSONResponse(status_code=422, content={"error": f"Expected {expected} or a multipart upload"})
+
+    if not items:
+        return None, JSONResponse(status_code=422, content={"error": "No image provided"})
+
+    if len(items) > (settings.analyze_batch_max_images if batch else 1):
+        return None, JSONResponse(status_code=413, content={"error": f"At most {settings.analyze_batch_max_images} images per batch"})
+
+    return items, None
+
+
+async def analyze_items(items, annotate: bool, stream: str | None = None) -> list[EmotionDetectionResponse]:
+    decoded = await decode_images(items)
+    images = [image for image in decoded if not isinstance(image, Exception)]
+    analyses = iter(await analyze_images(images, annotate=annotate, stream_id=stream))
+
+    responses = []
+    for image in decoded:
+        if isinstance(image, Exception):
+            responses.append(EmotionDetectionResponse(error=str(image)))
+            continue
+
+        analysis = next(analyses)
+        if isinstance(analysis, Exception):
+            responses.append(EmotionDetectionResponse(error=f"Analysis failed: {analysis}"))
+        elif analysis is None:
+            responses.append(EmotionDetectionResponse(face_detected=False))
+        else:
+            responses.append(EmotionDetectionResponse(
+                emotion=analysis['emotion'],
+                scores=analysis['scores'],
+                face_detected=True,
+                frame=encode_image(analysis['image']) if annotate else None
+            ))
+    return responses
+
+
+@router.post("/emotions/analyze", response_model=EmotionDetectionResponse)
+async def analyze(request: Request, annotate: bool = False, stream: str | None = None):
+    """
+    Emotion of the face in one image, without opening the video WebSocket
+
+    Send {"frame": "<base64>"} as JSON or the image file as multipart ("file").
+    annotate=true also returns the image with the scores drawn on it.
+    stream=<id> marks successive snapshots of one camera, which then reuse a
+    tracking face mesh instead of detecting the face from scratch.
+    """
+    items, error = await read_images(request, batch=False)
+    if error:
+        return error
+
+    try:
+        result = (await analyze_items(items, annotate, stream))[0]
+    except TimeoutError as e:
+        return JSONResponse(status_code=503, content={"error": str(e)})
+
+    if result.error:
+        return JSONResponse(status_code=400, content={"error": result.error})
+    return result
+
+
+@router.post("/emotions/analyze/batch", response_model=EmotionBatchResponse)
+async def analyze_batch(request: Request, annotate: bool = False, stream: str | None = None):
+    """
+    Emotions of many images: {"frames": ["<base64>", ...]} or multipart "files"
+
+    Results keep the request order; an image that can't be read gets an "error".
+    With stream=<id> the images are taken as consecutive frames of that stream.
+    """
+    items, error = await read_images(request, batch=True)
+    if error:
+        return error
+
+    try:
+        return EmotionBatchResponse(results=await analyze_items(items, annotate, stream))
+    except TimeoutError as e:
+        return JSONResponse(status_code=503, content={"error": str(e)})
+
@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Response
+from model.metrics import REGISTRY, CONTENT_TYPE
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Pipeline metrics in the Prometheus text format"""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
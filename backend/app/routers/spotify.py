@@ -1,28 +1,22 @@
 from fastapi import APIRouter, Request
 from fastapi.responses import RedirectResponse, JSONResponse
 import secrets
-import os
-import base64
 import urllib.parse
-import requests
 import random as rd
-from dotenv import load_dotenv
-from app.services.spotify_service import make_spotify_api_request, find_spotify_device_id
+from app.core.settings import settings
+from app.services.spotify_client import SpotifyAuthError, SpotifyToken
+from app.services.playback_controller import PlaybackController
+from app.services.playback_planner import PlaybackPlanner
+from app.services.session_store import session_store
+from app.services.spotify_cache import is_device_gone
+from app.services.spotify_service import (spotify_client, spotify_cache, make_spotify_api_request, find_spotify_device_id,
+                                          load_session_token, save_session_token, delete_session)
 from app.models.spotify_detection_model import PlaybackRequest
-
-# Load environment
-load_dotenv()
+from model.emotion_detector import broadcaster
 
 router = APIRouter()
 
-client_id = os.getenv("SPOTIFY_CLIENT_ID")
-client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
-redirect_uri = "http://127.0.0.1:8000/api/spotify/callback"
-
-# In-memory store
-oauth_states = {}
-stored_access_token = None
-default_device_id = None
+SESSION_COOKIE = "emotiplay_session"
 
 playlists = {
     "neutral": {
@@ -55,135 +49,245 @@ playlists = {
     }
 }
 
+playback_planner = PlaybackPlanner(
+    spotify_client,
+    spotify_cache,
+    {emotion: entry['playlist'] for emotion, entry in playlists.items()},
+    queue_size=settings.playback_prefetch_size,
+    pool_ttl=settings.spotify_playlist_cache_ttl_s,
+)
+
+def not_logged_in():
+    return JSONResponse(status_code=401, content={"error": "Access token not available. Please login first."})
+
+
+def set_session_cookie(response, session_id: str):
+    response.set_cookie(
+        SESSION_COOKIE,
+        session_id,
+        max_age=int(settings.session_ttl_s),
+        httponly=True,
+        secure=settings.session_cookie_secure,
+        samesite="lax",
+    )
+
+
 @router.get("/login")
-def login():
+async def login(request: Request):
+    session_id = request.cookies.get(SESSION_COOKIE) or session_store.new_session_id()
+
     state = secrets.token_urlsafe(16)
-    oauth_states[state] = True
+    await session_store.aput_oauth_state(state, session_id)
 
     scope = "user-read-private user-read-email user-modify-playback-state user-read-playback-state"
 
     query_params = {
         "response_type": "code",
-        "client_id": client_id,
+        "client_id": spotify_client.client_id,
         "scope": scope,
-        "redirect_uri": redirect_uri,
+        "redirect_uri": spotify_client.redirect_uri,
         "state": state,
     }
 
-    url = "https://accounts.spotify.com/authorize?" + urllib.parse.urlencode(query_params)
-    return RedirectResponse(url)
+    url = f"{spotify_client.accounts_base}/authorize?" + urllib.parse.urlencode(query_params)
+    response = RedirectResponse(url)
+    set_session_cookie(response, session_id)
+    return response
 
 
 @router.get("/callback")
-def callback(request: Request):
-    global stored_access_token
-
+async def callback(request: Request):
     code = request.query_params.get("code")
     state = request.query_params.get("state")
 
-    if not state or state not in oauth_states:
+    session_id = await session_store.apop_oauth_state(state) if state else None
+    if not session_id:
         return JSONResponse(status_code=400, content={"error": "State mismatch"})
 
-    oauth_states.pop(state)
+    try:
+        # Keeps the refresh token too, so the session outlives the one-hour access token
+        token = await spotify_client.exchange_code(code)
+    except SpotifyAuthError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
 
-    auth_str = f"{client_id}:{client_secret}"
-    b64_auth = base64.b64encode(auth_str.encode()).decode()
+    await save_session_token(session_id, token)
 
-    token_url = "https://accounts.spotify.com/api/token"
+    # Device list and playlist sizes are ready before the first /play
+    spotify_cache.warm_in_background(session_id, token, [entry['playlist'] for entry in playlists.values()])
+    playback_planner.prefetch_in_background(token)
 
-    data = {
-        "code": code,
-        "redirect_uri": redirect_uri,
-        "grant_type": "authorization_code"
-    }
+    response = JSONResponse(content={
+        "message": "Authentication successful — token stored on server",
+        "note": "You can now call /play and /pause without passing a token"
+    })
+    set_session_cookie(response, session_id)
+    return response
 
-    headers = {
-        "Authorization": f"Basic {b64_auth}",
-        "Content-Type": "application/x-www-form-urlencoded"
-    }
 
-    response = requests.post(token_url, data=data, headers=headers)
+@router.post("/logout")
+async def logout(request: Request):
+    session_id = request.cookies.get(SESSION_COOKIE)
+    if session_id:
+        await delete_session(session_id)
+        spotify_cache.invalidate_devices(session_id)
+        playback_planner.forget(session_id)
+        if playback_controller.owner == session_id:
+            playback_controller.stop()
+
+    response = JSONResponse(content={"message": "Logged out"})
+    response.delete_cookie(SESSION_COOKIE)
+    return response
+
+
+@router.get("/devices")
+async def get_devices(request: Request):
+    session_id = request.cookies.get(SESSION_COOKIE)
+    token = await load_session_token(session_id)
+    if not token:
+        return not_logged_in()
+
+    response = await make_spotify_api_request("GET", "/devices", token)
+    await save_session_token(session_id, token)
 
     if response.status_code != 200:
         return JSONResponse(status_code=response.status_code, content={"error": response.text})
 
-    token_info = response.json()
-    stored_access_token = token_info["access_token"]
+    devices = response.json()
+    spotify_cache.devices.set(session_id, devices.get("devices") or None)
 
-    return JSONResponse(content={
-        "message": "Authentication successful — token stored on server",
-        "note": "You can now call /play and /pause without passing a token"
-    })
+    return JSONResponse(content=devices)
 
-@router.get("/devices")
-def get_devices():
-    global stored_access_token
 
-    print("si esta funcionando")
-    if not stored_access_token:
-        return JSONResponse(status_code=401, content={"error": "Access token not available. Please login first."})
+async def player_command(session_id: str, token: SpotifyToken, action: str, json_data=None):
+    """Send a player command to the cached device, rediscovering it once if it went away; returns an error response or None"""
+    for rediscovered in (False, True):
+        device_id = await find_spotify_device_id(session_id, token)
 
+        if not device_id:
+            return JSONResponse(status_code=400, content={"error": "No available device found. Is spotifyd running?"})
 
-    response = make_spotify_api_request("GET", "/devices", stored_access_token)
+        response = await make_spotify_api_request("PUT", f"/{action}?device_id={device_id}", token, json_data)
 
-    if response.status_code != 200:
-        return JSONResponse(status_code=response.status_code, content={"error": response.text})
+        if response.status_code in [200, 204]:
+            return None
 
-    return JSONResponse(content=response.json())
+        if rediscovered or not is_device_gone(response.status_code, response.text):
+            break
 
-@router.post("/play")
-def play_music(request: PlaybackRequest):
-    global default_device_id
+        spotify_cache.invalidate_devices(session_id)
 
-    emotion = request.emotion
+    return JSONResponse(status_code=response.status_code, content={"error": response.text})
 
-    if not stored_access_token:
-        return JSONResponse(status_code=401, content={"error": "Access token not available. Please login first."})
 
-    if not default_device_id:
-        default_device_id = find_spotify_device_id(stored_access_token)
+async def start_playback(session_id: str | None, emotion: str):
+    """Play a random song from the emotion's playlist for a session; returns an error response or None"""
+    token = await load_session_token(session_id)
+    if not token:
+        return not_logged_in()
 
-    if not default_device_id:
-        return JSONResponse(status_code=400, content={"error": "No available device found. Is spotifyd running?"})
+    try:
+        # With the track lined up and the device cached, the play call is the only request to Spotify
+        playlist_uri = playlists[emotion]['playlist']
+        track_uri = await playback_planner.track_for(session_id, token, emotion)
 
-    print(default_device_id)
-    play_endpoint = f"/play?device_id={default_device_id}"
+        if track_uri:
+            offset = {"uri": track_uri}
+        else:
+            total_songs = await spotify_cache.playlist_total(token, playlist_uri, playlists[emotion]['total_songs'])
+            offset = {"position": rd.randint(0, total_songs - 1)}
 
-    play_data = {
-            "context_uri": f"{playlist[emotion]['playlist']}",
-            "offset": {
-                "position": rd.randint(0, playlist[emotion]['total_songs'] - 1)
-                },
-            "position_ms": 0
-            }
+        play_data = {
+                "context_uri": playlist_uri,
+                "offset": offset,
+                "position_ms": 0
+                }
 
-    response = make_spotify_api_request("PUT", play_endpoint, stored_access_token, play_data)
+        return await player_command(session_id, token, "play", play_data)
+    finally:
+        await save_session_token(session_id, token)
+
+
+async def auto_play(emotion: str) -> bool:
+    """Playback for the session that started the controller"""
+    return emotion in playlists and await start_playback(playback_controller.owner, emotion) is None
+
+
+async def auto_line_up(emotion: str):
+    """Pick a track of the emotion the controller is leaning towards"""
+    session_id = playback_controller.owner
+    token = await load_session_token(session_id)
+    if not token or emotion not in playlists:
+        return
+
+    try:
+        await playback_planner.line_up(session_id, token, emotion)
+    finally:
+        await save_session_token(session_id, token)
 
-    if response.status_code not in [200, 204]:
-        return JSONResponse(status_code=response.status_code, content={"error": response.text})
+
+playback_controller = PlaybackController(
+    auto_play,
+    min_dwell=settings.auto_playback_min_dwell_s,
+    confidence_threshold=settings.auto_playback_confidence,
+    command_interval=settings.auto_playback_interval_s,
+    prepare=auto_line_up,
+)
+
+
+@router.post("/play")
+async def play_music(request: PlaybackRequest, http_request: Request):
+    emotion = request.emotion
+
+    if emotion not in playlists:
+        return JSONResponse(status_code=400, content={"error": f"Unknown emotion: {emotion}"})
+
+    error = await start_playback(http_request.cookies.get(SESSION_COOKIE), emotion)
+    if error:
+        return error
 
     return {"message": "Playback started or resumed"}
 
 
-@router.get("/pause")
-def pause_music():
-    global default_device_id
+@router.post("/auto/start")
+async def start_auto_playback(request: Request):
+    session_id = request.cookies.get(SESSION_COOKIE)
+    if not await load_session_token(session_id):
+        return not_logged_in()
 
-    if not stored_access_token:
-        return JSONResponse(status_code=401, content={"error": "Access token not available. Please login first."})
+    # One camera, one controller: the latest session to start it owns the playback
+    playback_controller.stop()
+    playback_controller.start(broadcaster, owner=session_id)
+    return playback_controller.status()
 
-    if not default_device_id:
-        default_device_id = find_spotify_device_id(stored_access_token)
 
-    if not default_device_id:
-        return JSONResponse(status_code=400, content={"error": "No available device found. Is spotifyd running?"})
+@router.post("/auto/stop")
+async def stop_auto_playback(request: Request):
+    owner = playback_controller.owner
+    if owner is not None and request.cookies.get(SESSION_COOKIE) != owner:
+        return JSONResponse(status_code=403, content={"error": "Automatic playback was started by another session"})
 
-    pause_endpoint = f"/pause?device_id={default_device_id}"
+    playback_controller.stop()
+    return playback_controller.status()
 
 
-    response = make_spotify_api_request("PUT", pause_endpoint, stored_access_token)
+@router.get("/auto")
+async def auto_playback_status():
+    return playback_controller.status()
 
-    if response.status_code not in [200, 204]:
-        return JSONResponse(status_code=response.status_code, content={"error": response.text})
+
+@router.get("/pause")
+async def pause_music(request: Request):
+    session_id = request.cookies.get(SESSION_COOKIE)
+    token = await load_session_token(session_id)
+    if not token:
+        return not_logged_in()
+
+    try:
+        error = await player_command(session_id, token, "pause")
+    finally:
+        await save_session_token(session_id, token)
+
+    if error:
+        return error
 
     return {"message": "Playback paused"}
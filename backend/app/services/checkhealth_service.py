@@ -1,12 +1,98 @@
-# Implementar correctamente las funciones para health
+import importlib.util
+import sys
+import time
+from threading import Lock
+from typing import Callable
 
-def is_emotion_recognition_ok():
-    return "operational"
+from app.core.settings import settings
+from app.services.spotify_service import spotify_client, cached_session_token
+from model.emotion_detector import broadcaster
+
+STARTED_AT = time.monotonic()
+
+
+def pipeline_status(pipeline: dict) -> str:
+    """idle, starting, operational, degraded (below the FPS floor) or stalled (no frames for too long)"""
+    if not pipeline['running']:
+        return "idle"
+
+    if not pipeline['detection_thread_alive']:
+        return "stalled"
+
+    # No frame yet: measure the stall from the start instead
+    quiet_for = pipeline['seconds_since_last_frame']
+    if quiet_for is None:
+        quiet_for = pipeline['seconds_since_start'] or 0.0
+        if quiet_for <= settings.pipeline_stall_after_s:
+            return "starting"
+
+    if quiet_for > settings.pipeline_stall_after_s:
+        return "stalled"
+
+    warmed_up = (pipeline['seconds_since_start'] or 0.0) > 2 * settings.pipeline_fps_window_s
+    if warmed_up and pipeline['fps'] < settings.target_fps * settings.pipeline_min_fps_ratio:
+        return "degraded"
 
-def is_spotify_ok():
     return "operational"
 
-def is_mediapipe_loaded():
-    return "loaded"
 
+def is_emotion_recognition_ok(pipeline: dict | None = None) -> str:
+    return pipeline_status(pipeline or broadcaster.get_pipeline_state(settings.pipeline_fps_window_s))
+
+
+def is_spotify_ok(session_id: str | None = None) -> str:
+    """Whether the app can talk to Spotify, and the state of a session's token if one is given"""
+    if not spotify_client.client_id or not spotify_client.client_secret:
+        return "not configured"
+
+    if session_id is None:
+        return "configured"
+
+    # The session driving auto-playback loaded its token in this process; the store isn't read on the event loop
+    token = cached_session_token(session_id)
+    if token is None:
+        return "not logged in"
+    if not token.expires_soon():
+        return "token valid"
+    return "token refreshable" if token.refresh_token else "token expired"
+
+
+def is_mediapipe_loaded() -> str:
+    if "mediapipe" in sys.modules:
+        return "loaded"
+    return "available" if importlib.util.find_spec("mediapipe") is not None else "missing"
+
+
+def collect_health(spotify_session_id: str | None = None) -> dict:
+    pipeline = broadcaster.get_pipeline_state(settings.pipeline_fps_window_s)
+    emotion_recognition = is_emotion_recognition_ok(pipeline)
+
+    return {
+        # A stalled pipeline can't serve video; let the load balancer drain this instance
+        "ready": emotion_recognition != "stalled",
+        "status": "ok" if emotion_recognition in ("idle", "starting", "operational") else emotion_recognition,
+        "services": {
+            "emotion_recognition": emotion_recognition,
+            "spotify_integration": is_spotify_ok(spotify_session_id),
+            "mediapipe": is_mediapipe_loaded(),
+        },
+        "pipeline": {**pipeline, "target_fps": settings.target_fps},
+    }
+
+
+class HealthCache:
+    """Reuses a health snapshot for ttl seconds so frequent probes stay cheap"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.value = None
+        self.computed_at = float("-inf")
+        self.lock = Lock()
 
+    def get(self, compute: Callable[[], dict]) -> dict:
+        with self.lock:
+            now = time.monotonic()
+            if now - self.computed_at >= self.ttl:
+                self.value = compute()
+                self.computed_at = now
+            return self.value
@@ -1,4 +1,264 @@
+import asyncio
+import base64
+import binascii
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from threading import Condition
+from typing import Callable, Hashable
+
+import cv2
+import numpy as np
+
+from app.core.settings import settings
 from emotion_processor.main import EmotionRecognitionSystem
 
-# Arregla esto con un modelo que sirva xd
-recognizer = EmotionRecognitionSystem()
+
+class ImageDecodeError(ValueError):
+    pass
+
+
+class PoolWaiter:
+    __slots__ = ('stream_id', 'instance', 'taken_over')
+
+    def __init__(self, stream_id: Hashable | None):
+        self.stream_id = stream_id
+        self.instance = None
+        self.taken_over = False
+
+
+class RecognizerPool:
+    """Bounded pool of EmotionRecognitionSystem instances with per-stream affinity
+
+    A MediaPipe graph can't be used from two threads at once, so callers check
+    one out for as long as they need it. Instances are created lazily, up to
+    `size`. Checkouts with a stream_id always get that stream's instance, so a
+    tracking-mode graph keeps following the same face. When every idle
+    instance is bound, the least recently used stream loses its instance,
+    which is reset before serving the newcomer. Streams are plain ?stream=
+    requests with no end to observe, so this takeover is the only way an
+    instance leaves its stream. Checkouts without a stream_id wait for an
+    unbound instance rather than take a stream's, unless every instance is
+    bound to a stream.
+    """
+
+    def __init__(self, size: int, factory: Callable[[], EmotionRecognitionSystem] = EmotionRecognitionSystem):
+        self.size = max(1, size)
+        self.factory = factory
+        self.idle: list[EmotionRecognitionSystem] = []  # Most recently checked in last
+        self.created = 0
+        self.affinity: dict[Hashable, EmotionRecognitionSystem] = {}
+        self.bound_to: dict[int, Hashable] = {}  # {id(instance): stream_id}
+        self.last_used: dict[Hashable, float] = {}
+        self.waiters: list[PoolWaiter] = []  # Oldest first
+        self.stats = Counter()
+        self.condition = Condition()
+
+    def _bind(self, stream_id: Hashable, instance: EmotionRecognitionSystem):
+        self.affinity[stream_id] = instance
+        self.bound_to[id(instance)] = stream_id
+
+    def _unbind(self, stream_id: Hashable):
+        instance = self.affinity.pop(stream_id, None)
+        if instance is not None:
+            self.bound_to.pop(id(instance), None)
+        self.last_used.pop(stream_id, None)
+
+    def _assign(self, stream_id: Hashable | None, instance: EmotionRecognitionSystem):
+        if stream_id is not None:
+            self._bind(stream_id, instance)
+            self.last_used[stream_id] = time.monotonic()
+
+    def _take_idle(self, stream_id: Hashable | None) -> tuple[EmotionRecognitionSystem | None, bool]:
+        """(instance, whether it was taken over from another stream); no instance means wait or create"""
+        if stream_id in self.affinity:
+            instance = self.affinity[stream_id]
+            if any(idle is instance for idle in self.idle):
+                self.idle = [idle for idle in self.idle if idle is not instance]
+                self.stats['affinity_hits'] += 1
+                return instance, False
+            return None, False  # Still busy with this stream's previous frame
+
+        unbound = [idle for idle in self.idle if id(idle) not in self.bound_to]
+        if unbound:
+            instance = unbound[-1]
+            self.idle = [idle for idle in self.idle if idle is not instance]
+            return instance, False
+
+        if self.created < self.size or not self.idle:
+            return None, False
+
+        # An unbound instance is busy and will be back; taking a stream's would cost it its tracking state
+        if stream_id is None and len(self.bound_to) < self.created:
+            return None, False
+
+        instance = min(self.idle, key=lambda idle: self.last_used.get(self.bound_to[id(idle)], 0.0))
+        self.idle = [idle for idle in self.idle if idle is not instance]
+        self._unbind(self.bound_to[id(instance)])
+        self.stats['takeovers'] += 1
+        return instance, True
+
+    def _take_or_create(self, stream_id: Hashable | None) -> tuple[EmotionRecognitionSystem | None, bool]:
+        """Take, create or take over an instance and bind it to the stream, all under the lock"""
+        instance, taken_over = self._take_idle(stream_id)
+        if instance is None and self.created < self.size and stream_id not in self.affinity:
+            # Rare (at most `size` times), so building the graph under the lock is fine
+            instance = self.factory()
+            self.created += 1
+            self.stats['created'] += 1
+        if instance is not None:
+            # Bound before the lock is released, so a second waiter of the same new stream waits for this instance
+            self._assign(stream_id, instance)
+        return instance, taken_over
+
+    def _dispatch(self):
+        """Hand freed instances to waiters in arrival order
+
+        Handing over directly, rather than letting woken threads race for the
+        idle list, stops a busy stream from taking its instance straight back
+        at every checkin while other callers time out.
+        """
+        for waiter in list(self.waiters):
+            instance, taken_over = self._take_or_create(waiter.stream_id)
+            if instance is None:
+                continue
+            waiter.instance, waiter.taken_over = instance, taken_over
+            self.waiters.remove(waiter)
+            if not self.idle:
+                break
+        self.condition.notify_all()
+
+    def checkout(self, stream_id: Hashable | None = None, timeout: float | None = None) -> EmotionRecognitionSystem:
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self.condition:
+            self.stats['checkouts'] += 1
+            if stream_id is not None:
+                self.stats['stream_checkouts'] += 1
+
+            # Whatever is idle now is of no use to the queued waiters, so there's no queue to jump
+            instance, taken_over = self._take_or_create(stream_id)
+            if instance is None:
+                waiter = PoolWaiter(stream_id)
+                self.waiters.append(waiter)
+                self.stats['waits'] += 1
+                while waiter.instance is None:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self.waiters.remove(waiter)
+                        self.stats['timeouts'] += 1
+                        raise TimeoutError("No emotion recognizer available")
+                    self.condition.wait(remaining)
+                instance, taken_over = waiter.instance, waiter.taken_over
+
+        if taken_over:
+            instance.reset()
+        return instance
+
+    def checkin(self, instance: EmotionRecognitionSystem):
+        with self.condition:
+            self.idle.append(instance)
+            self._dispatch()
+
+    @contextmanager
+    def recognizer(self, stream_id: Hashable | None = None, timeout: float | None = None):
+        instance = self.checkout(stream_id, timeout)
+        try:
+            yield instance
+        finally:
+            self.checkin(instance)
+
+    def status(self) -> dict:
+        with self.condition:
+            return {
+                'size': self.size,
+                'created': self.created,
+                'idle': len(self.idle),
+                'streams': len(self.affinity),
+                'waiting': len(self.waiters),
+                **self.stats,
+            }
+
+
+# One-off images: static mode, so no tracking state is carried between unrelated pictures
+recognizer_pool = RecognizerPool(settings.recognizer_pool_size,
+                                 factory=partial(EmotionRecognitionSystem, static_image_mode=True))
+# Successive frames of one camera: tracking mode, each stream sticking to its own instance
+stream_recognizer_pool = RecognizerPool(settings.stream_recognizer_pool_size)
+
+decode_executor = ThreadPoolExecutor(max_workers=settings.analyze_decode_workers, thread_name_prefix="image-decode")
+# One thread per pooled recognizer, so a checkout never waits on a thread that isn't running
+recognition_executor = ThreadPoolExecutor(max_workers=recognizer_pool.size + stream_recognizer_pool.size,
+                                          thread_name_prefix="recognizer")
+
+
+def decode_image(data: bytes | str) -> np.ndarray:
+    """BGR image from raw file bytes or base64 (a data: URL prefix is allowed)"""
+    if isinstance(data, str):
+        if data.startswith("data:"):
+            data = data.split(",", 1)[-1]
+        try:
+            data = base64.b64decode(data, validate=True)
+        except (binascii.Error, ValueError):
+            raise ImageDecodeError("Invalid base64 image") from None
+
+    if len(data) > settings.analyze_max_image_bytes:
+        raise ImageDecodeError(f"Image larger than {settings.analyze_max_image_bytes} bytes")
+
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ImageDecodeError("Unsupported or corrupt image")
+    return image
+
+
+def encode_image(image: np.ndarray) -> str:
+    _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 80])
+    return base64.b64encode(buffer).decode('utf-8')
+
+
+async def decode_images(items: list[bytes | str]) -> list[np.ndarray | Exception]:
+    """Decode off the event loop, in parallel; failures come back in place of their image"""
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(
+        *(loop.run_in_executor(decode_executor, decode_image, item) for item in items),
+        return_exceptions=True
+    )
+
+
+def analyze_chunk(pool: RecognizerPool, images: list[np.ndarray], annotate: bool,
+                  stream_id: Hashable | None = None) -> list[dict | None | Exception]:
+    """Run images back to back on one checked-out recognizer"""
+    results = []
+    with pool.recognizer(stream_id, timeout=settings.recognizer_checkout_timeout_s) as recognizer:
+        for image in images:
+            try:
+                results.append(recognizer.analyze(image, draw=annotate))
+            except Exception as e:
+                results.append(e)
+    return results
+
+
+async def analyze_images(images: list[np.ndarray], annotate: bool = False,
+                         stream_id: Hashable | None = None) -> list[dict | None | Exception]:
+    """None where no face was found
+
+    Unrelated images are split across the static pool. Frames of a stream run
+    in order on that stream's tracking instance.
+    """
+    if not images:
+        return []
+
+    loop = asyncio.get_running_loop()
+    if stream_id is not None:
+        return await loop.run_in_executor(recognition_executor, analyze_chunk,
+                                          stream_recognizer_pool, images, annotate, stream_id)
+
+    chunk_size = -(-len(images) // min(recognizer_pool.size, len(images)))
+    chunks = [images[i:i + chunk_size] for i in range(0, len(images), chunk_size)]
+
+    chunk_results = await asyncio.gather(
+        *(loop.run_in_executor(recognition_executor, analyze_chunk, recognizer_pool, chunk, annotate) for chunk in chunks)
+    )
+    return [result for results in chunk_results for result in results]
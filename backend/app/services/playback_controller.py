@@ -0,0 +1,144 @@
+import asyncio
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable
+
+
+class PlaybackController:
+    """Turns the broadcaster's smoothed emotions into rate-limited Spotify playback commands
+
+    An emotion becomes the target only after it has been the confident dominant
+    emotion for `min_dwell` seconds. Target changes are coalesced so at most one
+    command goes out per `command_interval`, and a command for the emotion that
+    is already playing is skipped. Halfway through the dwell, `prepare` (if
+    given) gets a chance to get the likely next emotion ready.
+    """
+
+    def __init__(self, play: Callable[[str], Awaitable[bool]], min_dwell: float = 5.0,
+                 confidence_threshold: float = 0.6, command_interval: float = 15.0,
+                 prepare: Callable[[str], Awaitable[None]] | None = None):
+        self.play = play
+        self.prepare = prepare
+        self.min_dwell = min_dwell
+        self.confidence_threshold = confidence_threshold
+        self.command_interval = command_interval
+
+        self.candidate: str | None = None
+        self.candidate_since = 0.0
+        self.target: str | None = None
+        self.playing: str | None = None
+        self.prepared: str | None = None
+        self.last_command_at = float("-inf")
+        self.commands_sent = 0
+        self.commands_skipped = 0
+        self.commands_failed = 0
+
+        self.owner: str | None = None  # Session whose Spotify account plays
+        self.broadcaster = None
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.changed: asyncio.Event | None = None
+        self.task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def dominant_emotion(self, people: list[dict]) -> str | None:
+        """Confidence-weighted vote over everyone whose smoothed emotion clears the threshold"""
+        scores = defaultdict(float)
+        for person in people:
+            emotion = person.get("emotion")
+            confidence = person.get("confidence", 0.0)
+            if emotion and confidence >= self.confidence_threshold:
+                scores[emotion.lower()] += confidence
+
+        return max(scores, key=scores.get) if scores else None
+
+    def on_frame(self, frame_data: dict):
+        """Broadcaster subscriber; runs on the detection thread"""
+        emotion = self.dominant_emotion(frame_data.get("people", []))
+        if emotion is not None:
+            self.loop.call_soon_threadsafe(self._observe, emotion, time.monotonic())
+
+    def _observe(self, emotion: str, now: float):
+        if emotion != self.candidate:
+            self.candidate = emotion
+            self.candidate_since = now
+            return
+
+        held = now - self.candidate_since
+        if (self.prepare is not None and held >= self.min_dwell / 2
+                and emotion not in (self.playing, self.prepared)):
+            self.prepared = emotion
+            self.loop.create_task(self._prepare(emotion))
+
+        if held >= self.min_dwell and emotion != self.target:
+            self.target = emotion
+            self.changed.set()
+
+    async def _prepare(self, emotion: str):
+        try:
+            await self.prepare(emotion)
+        except Exception as e:
+            print(f"Could not prepare playback for {emotion}: {e}")
+
+    async def run(self):
+        while True:
+            await self.changed.wait()
+
+            # Later changes while we wait only move the target: one command per interval
+            wait = self.last_command_at + self.command_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.changed.clear()
+
+            target = self.target
+            if target is None or target == self.playing:
+                self.commands_skipped += 1
+                continue
+
+            self.last_command_at = time.monotonic()
+            if await self.play(target):
+                self.playing = target
+                self.commands_sent += 1
+            else:
+                self.commands_failed += 1
+                self.changed.set()  # Retry on the next interval
+
+    def start(self, broadcaster, owner: str | None = None):
+        if self.running:
+            return
+
+        self.owner = owner
+        self.loop = asyncio.get_running_loop()
+        self.changed = asyncio.Event()
+        self.candidate = None
+        self.target = None
+        self.playing = None
+        self.prepared = None
+        self.broadcaster = broadcaster
+        self.broadcaster.subscribe(self.on_frame)
+        self.task = self.loop.create_task(self.run())
+
+    def stop(self):
+        if self.broadcaster is not None:
+            self.broadcaster.unsubscribe(self.on_frame)
+            self.broadcaster = None
+
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+        self.owner = None
+
+    def status(self) -> dict:
+        return {
+            "running": self.running,
+            "candidate": self.candidate,
+            "target": self.target,
+            "playing": self.playing,
+            "prepared": self.prepared,
+            "commands_sent": self.commands_sent,
+            "commands_skipped": self.commands_skipped,
+            "commands_failed": self.commands_failed,
+        }
@@ -0,0 +1,113 @@
+import asyncio
+import random
+from collections import deque
+
+from app.services.spotify_cache import SpotifyCache, TTLCache
+from app.services.spotify_client import SpotifyClient, SpotifyToken
+
+
+class PlaybackPlanner:
+    """Keeps track URIs per emotion ready and picks the likely next emotion's track ahead of the switch
+
+    Track pools are fetched once per playlist and cached. When an emotion looks
+    likely, one of its tracks is picked for the session, so the switch is one
+    play call on a track that is already known. Nothing is added to Spotify's
+    queue: it is first in, first out and shared with the user, so a queued
+    track of an emotion that never came would play later anyway, and a "next"
+    would land on whatever the user queued.
+    """
+
+    def __init__(self, client: SpotifyClient, cache: SpotifyCache, playlists: dict[str, str],
+                 queue_size: int = 5, pool_ttl: float = 3600.0):
+        self.client = client
+        self.cache = cache
+        self.playlists = playlists
+        self.queue_size = queue_size
+
+        self.pools = TTLCache(pool_ttl)
+        self.queues: dict[str, deque[str]] = {emotion: deque() for emotion in playlists}
+        self.lined_up: dict[str, tuple[str, str]] = {}  # {session_id: (emotion, track URI) to play on a switch}
+        self.background: set[asyncio.Task] = set()
+
+    def _in_background(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.background.add(task)
+        task.add_done_callback(self.background.discard)
+
+    # ----------------------------------------
+    # Track pools
+    # ----------------------------------------
+
+    async def fetch_pool(self, token: SpotifyToken, playlist_uri: str) -> list[str] | None:
+        """One page of track URIs from a random spot in the playlist"""
+        playlist_id = playlist_uri.rsplit(":", 1)[-1]
+        total = await self.cache.playlist_total(token, playlist_uri, fallback=0)
+        offset = random.randrange(0, max(1, total - 99)) if total > 100 else 0
+
+        response = await self.client.request("GET", f"/playlists/{playlist_id}/tracks", token, params={
+            "fields": "items(track(uri))",
+            "limit": 100,
+            "offset": offset,
+        })
+        if response.status_code != 200:
+            return None
+
+        uris = [item["track"]["uri"] for item in response.json().get("items", [])
+                if item.get("track") and item["track"].get("uri")]
+        return uris or None
+
+    async def fill(self, token: SpotifyToken, emotion: str):
+        queue = self.queues[emotion]
+        if len(queue) >= self.queue_size:
+            return
+
+        playlist_uri = self.playlists[emotion]
+        pool = await self.pools.get(playlist_uri, lambda: self.fetch_pool(token, playlist_uri))
+        if not pool:
+            return
+
+        candidates = [uri for uri in pool if uri not in queue]
+        queue.extend(random.sample(candidates, min(len(candidates), self.queue_size - len(queue))))
+
+    async def next_track(self, token: SpotifyToken, emotion: str) -> str | None:
+        """Pop a prefetched track, topping the queue back up in the background"""
+        queue = self.queues[emotion]
+        if not queue:
+            await self.fill(token, emotion)
+        if not queue:
+            return None
+
+        uri = queue.popleft()
+        if len(queue) <= self.queue_size // 2:
+            self._in_background(self.fill(token, emotion))
+        return uri
+
+    async def prefetch_all(self, token: SpotifyToken):
+        await asyncio.gather(*(self.fill(token, emotion) for emotion in self.playlists), return_exceptions=True)
+
+    def prefetch_in_background(self, token: SpotifyToken):
+        self._in_background(self.prefetch_all(token))
+
+    # ----------------------------------------
+    # Switching
+    # ----------------------------------------
+
+    async def line_up(self, session_id: str, token: SpotifyToken, emotion: str):
+        """Pick the track a switch to a likely emotion will play (once per emotion)"""
+        lined_up = self.lined_up.get(session_id)
+        if lined_up and lined_up[0] == emotion:
+            return
+
+        uri = await self.next_track(token, emotion)
+        if uri:
+            self.lined_up[session_id] = (emotion, uri)
+
+    async def track_for(self, session_id: str, token: SpotifyToken, emotion: str) -> str | None:
+        """The lined-up track if it is for this emotion, else a fresh one"""
+        lined_up = self.lined_up.pop(session_id, None)
+        if lined_up and lined_up[0] == emotion:
+            return lined_up[1]
+        return await self.next_track(token, emotion)
+
+    def forget(self, session_id: str):
+        self.lined_up.pop(session_id, None)
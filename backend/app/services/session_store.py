@@ -0,0 +1,211 @@
+import asyncio
+import json
+import secrets
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import Lock
+
+from app.core.settings import settings
+
+
+class SessionStore(ABC):
+    """Per-session data (keyed by the session cookie) and pending OAuth states"""
+
+    def __init__(self, session_ttl: float, oauth_state_ttl: float):
+        self.session_ttl = session_ttl
+        self.oauth_state_ttl = oauth_state_ttl
+
+    @staticmethod
+    def new_session_id() -> str:
+        return secrets.token_urlsafe(32)
+
+    @abstractmethod
+    def get(self, session_id: str) -> dict | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, session_id: str, data: dict):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def put_oauth_state(self, state: str, session_id: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def pop_oauth_state(self, state: str) -> str | None:
+        """Session that started the login, or None if the state is unknown or expired"""
+        raise NotImplementedError
+
+    # ----------------------------------------
+    # Async access for request handlers
+    # ----------------------------------------
+
+    async def _run(self, method, *args):
+        """Run a store call; stores doing blocking I/O move it off the event loop"""
+        return method(*args)
+
+    async def aget(self, session_id: str) -> dict | None:
+        return await self._run(self.get, session_id)
+
+    async def aset(self, session_id: str, data: dict):
+        await self._run(self.set, session_id, data)
+
+    async def adelete(self, session_id: str):
+        await self._run(self.delete, session_id)
+
+    async def aput_oauth_state(self, state: str, session_id: str):
+        await self._run(self.put_oauth_state, state, session_id)
+
+    async def apop_oauth_state(self, state: str) -> str | None:
+        return await self._run(self.pop_oauth_state, state)
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-local store; least recently used sessions go first when full"""
+
+    def __init__(self, session_ttl: float, oauth_state_ttl: float, max_sessions: int = 1000):
+        super().__init__(session_ttl, oauth_state_ttl)
+        self.max_sessions = max_sessions
+        self.sessions: OrderedDict[str, tuple[dict, float]] = OrderedDict()
+        self.oauth_states: dict[str, tuple[str, float]] = {}
+        self.lock = Lock()
+
+    def get(self, session_id: str) -> dict | None:
+        with self.lock:
+            entry = self.sessions.get(session_id)
+            if entry is None:
+                return None
+
+            data, expires_at = entry
+            if time.time() >= expires_at:
+                del self.sessions[session_id]
+                return None
+
+            self.sessions.move_to_end(session_id)
+            return data
+
+    def set(self, session_id: str, data: dict):
+        with self.lock:
+            self.sessions[session_id] = (data, time.time() + self.session_ttl)
+            self.sessions.move_to_end(session_id)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+
+    def delete(self, session_id: str):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    def put_oauth_state(self, state: str, session_id: str):
+        now = time.time()
+        with self.lock:
+            # Abandoned logins expire instead of piling up
+            for expired in [key for key, (_, expires_at) in self.oauth_states.items() if expires_at <= now]:
+                del self.oauth_states[expired]
+            self.oauth_states[state] = (session_id, now + self.oauth_state_ttl)
+
+    def pop_oauth_state(self, state: str) -> str | None:
+        with self.lock:
+            entry = self.oauth_states.pop(state, None)
+
+        if entry is None or time.time() >= entry[1]:
+            return None
+        return entry[0]
+
+
+class SQLiteSessionStore(SessionStore):
+    """Store in a SQLite file, shared by every worker process on the host"""
+
+    def __init__(self, path: str, session_ttl: float, oauth_state_ttl: float, workers: int = 4):
+        super().__init__(session_ttl, oauth_state_ttl)
+        self.path = path
+        # Queries can wait up to 5s on another worker's write lock; they do it on these threads
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="session-store")
+
+        self._execute("PRAGMA journal_mode=WAL")
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS oauth_states (state TEXT PRIMARY KEY, session_id TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    async def _run(self, method, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, partial(method, *args))
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5.0)
+
+    def _execute(self, query: str, params: tuple = ()) -> list[tuple]:
+        connection = self._connect()
+        try:
+            with connection:
+                return connection.execute(query, params).fetchall()
+        finally:
+            connection.close()
+
+    def get(self, session_id: str) -> dict | None:
+        now = time.time()
+        rows = self._execute("SELECT data FROM sessions WHERE id = ? AND expires_at > ?", (session_id, now))
+        if not rows:
+            return None
+
+        # Sliding expiry, like the in-memory LRU
+        self._execute("UPDATE sessions SET expires_at = ? WHERE id = ?", (now + self.session_ttl, session_id))
+        return json.loads(rows[0][0])
+
+    def set(self, session_id: str, data: dict):
+        now = time.time()
+        self._execute(
+            "INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at",
+            (session_id, json.dumps(data), now + self.session_ttl)
+        )
+        self._execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+
+    def delete(self, session_id: str):
+        self._execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def put_oauth_state(self, state: str, session_id: str):
+        now = time.time()
+        self._execute("DELETE FROM oauth_states WHERE expires_at <= ?", (now,))
+        self._execute(
+            "INSERT OR REPLACE INTO oauth_states (state, session_id, expires_at) VALUES (?, ?, ?)",
+            (state, session_id, now + self.oauth_state_ttl)
+        )
+
+    def pop_oauth_state(self, state: str) -> str | None:
+        connection = self._connect()
+        try:
+            with connection:
+                # One transaction, so two workers can't both consume the same state
+                connection.execute("BEGIN IMMEDIATE")
+                row = connection.execute("SELECT session_id, expires_at FROM oauth_states WHERE state = ?",
+                                         (state,)).fetchone()
+                connection.execute("DELETE FROM oauth_states WHERE state = ?", (state,))
+        finally:
+            connection.close()
+
+        if row is None or time.time() >= row[1]:
+            return None
+        return row[0]
+
+
+def create_session_store() -> SessionStore:
+    if settings.session_backend == "sqlite":
+        return SQLiteSessionStore(settings.session_sqlite_path, settings.session_ttl_s, settings.oauth_state_ttl_s)
+
+    if settings.session_backend == "memory":
+        return InMemorySessionStore(settings.session_ttl_s, settings.oauth_state_ttl_s, settings.session_max_entries)
+
+    raise ValueError(f"Unknown session backend: {settings.session_backend}")
+
+
+session_store = create_session_store()
@@ -0,0 +1,141 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+from app.services.spotify_client import SpotifyClient, SpotifyToken
+
+
+class TTLCache:
+    """Async TTL cache with single-flight loads and background refresh
+
+    Entries older than `refresh_after` are still served, while a background
+    task reloads them; entries older than `ttl` are reloaded before returning.
+    Loaders returning None are not cached.
+    """
+
+    def __init__(self, ttl: float, refresh_after: float | None = None, max_entries: int = 256):
+        self.ttl = ttl
+        self.refresh_after = refresh_after if refresh_after is not None else ttl / 2
+        self.max_entries = max_entries
+        self.entries: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+        self.loading: dict[Hashable, asyncio.Future] = {}
+        self.background: set[asyncio.Task] = set()
+
+    def set(self, key: Hashable, value: Any):
+        if value is None:
+            self.entries.pop(key, None)
+            return
+
+        self.entries[key] = (value, time.monotonic())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable | None = None):
+        if key is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(key, None)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        # Concurrent misses for the same key share one request
+        if key in self.loading:
+            return await asyncio.shield(self.loading[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self.loading[key] = future
+        try:
+            value = await loader()
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when nobody else was waiting
+            raise
+        finally:
+            self.loading.pop(key, None)
+
+    async def _refresh(self, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        try:
+            await self._load(key, loader)
+        except Exception:
+            pass  # Keep serving the cached value until it expires
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self.entries.get(key)
+        if entry is not None:
+            value, stored_at = entry
+            age = time.monotonic() - stored_at
+            if age < self.ttl:
+                if age >= self.refresh_after and key not in self.loading:
+                    task = asyncio.create_task(self._refresh(key, loader))
+                    self.background.add(task)
+                    task.add_done_callback(self.background.discard)
+                return value
+
+        return await self._load(key, loader)
+
+
+def is_device_gone(status_code: int, body: str) -> bool:
+    """Spotify's answer when the device we targeted has disappeared"""
+    return status_code == 404 or "device not found" in body.lower()
+
+
+class SpotifyCache:
+    """Cached device discovery and playlist track counts"""
+
+    def __init__(self, client: SpotifyClient, device_ttl: float = 60.0, playlist_ttl: float = 3600.0):
+        self.client = client
+        self.devices = TTLCache(device_ttl)
+        self.playlist_totals = TTLCache(playlist_ttl)
+        self.background: set[asyncio.Task] = set()
+
+    async def fetch_devices(self, token: SpotifyToken) -> list[dict] | None:
+        response = await self.client.request("GET", "/me/player/devices", token)
+        if response.status_code != 200:
+            return None
+        return response.json().get("devices", [])
+
+    async def device_id(self, session_id: str, token: SpotifyToken) -> str | None:
+        """Active device of a session's account if there is one, else the first available"""
+        devices = await self.devices.get(session_id, lambda: self.fetch_devices(token))
+        if not devices:
+            self.devices.invalidate(session_id)  # An empty list is not worth keeping
+            return None
+
+        active = [device for device in devices if device.get("is_active")]
+        return (active or devices)[0]["id"]
+
+    def invalidate_devices(self, session_id: str):
+        self.devices.invalidate(session_id)
+
+    async def fetch_playlist_total(self, token: SpotifyToken, playlist_uri: str) -> int | None:
+        playlist_id = playlist_uri.rsplit(":", 1)[-1]
+        response = await self.client.request("GET", f"/playlists/{playlist_id}", token,
+                                             params={"fields": "tracks.total"})
+        if response.status_code != 200:
+            return None
+        return response.json().get("tracks", {}).get("total")
+
+    async def warm(self, session_id: str, token: SpotifyToken, playlist_uris: list[str]):
+        """Load devices and playlist counts ahead of the first /play"""
+        await asyncio.gather(
+            self.device_id(session_id, token),
+            *(self.playlist_totals.get(uri, lambda uri=uri: self.fetch_playlist_total(token, uri)) for uri in playlist_uris),
+            return_exceptions=True
+        )
+
+    def warm_in_background(self, session_id: str, token: SpotifyToken, playlist_uris: list[str]):
+        task = asyncio.create_task(self.warm(session_id, token, playlist_uris))
+        self.background.add(task)
+        task.add_done_callback(self.background.discard)
+
+    async def playlist_total(self, token: SpotifyToken, playlist_uri: str, fallback: int) -> int:
+        """Current track count of a playlist, or the fallback when Spotify can't tell"""
+        try:
+            total = await self.playlist_totals.get(playlist_uri, lambda: self.fetch_playlist_total(token, playlist_uri))
+        except Exception:
+            total = None
+        return total or fallback
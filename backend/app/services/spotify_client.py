@@ -0,0 +1,173 @@
+import asyncio
+import base64
+import random
+import time
+
+import httpx
+
+SPOTIFY_API_BASE = "https://api.spotify.com/v1"
+SPOTIFY_ACCOUNTS_BASE = "https://accounts.spotify.com"
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class SpotifyAuthError(Exception):
+    pass
+
+
+class SpotifyToken:
+    """Access/refresh token pair of one Spotify login"""
+
+    def __init__(self, access_token: str, refresh_token: str | None = None, expires_in: float = 3600):
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.expires_at = time.time() + expires_in
+        self.lock = asyncio.Lock()
+
+    @classmethod
+    def from_response(cls, token_info: dict) -> "SpotifyToken":
+        return cls(token_info["access_token"], token_info.get("refresh_token"), token_info.get("expires_in", 3600))
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SpotifyToken":
+        token = cls(data["access_token"])
+        token.load(data)
+        return token
+
+    def load(self, data: dict):
+        """Take over a stored copy of this token (refreshed by another worker process)"""
+        self.access_token = data["access_token"]
+        self.refresh_token = data.get("refresh_token")
+        self.expires_at = data["expires_at"]
+
+    def to_dict(self) -> dict:
+        return {
+            "access_token": self.access_token,
+            "refresh_token": self.refresh_token,
+            "expires_at": self.expires_at,
+        }
+
+    def update(self, token_info: dict):
+        self.access_token = token_info["access_token"]
+        # Spotify only sometimes rotates the refresh token; keep the old one otherwise
+        self.refresh_token = token_info.get("refresh_token", self.refresh_token)
+        self.expires_at = time.time() + token_info.get("expires_in", 3600)
+
+    def expires_soon(self, margin: float = 60.0) -> bool:
+        return time.time() >= self.expires_at - margin
+
+
+class SpotifyClient:
+    """Async Spotify Web API client over one pooled keep-alive connection"""
+
+    def __init__(self, client_id: str | None, client_secret: str | None, redirect_uri: str,
+                 api_base: str = SPOTIFY_API_BASE, accounts_base: str = SPOTIFY_ACCOUNTS_BASE,
+                 max_retries: int = 3, backoff: float = 0.5, timeout: float = 10.0,
+                 transport: httpx.AsyncBaseTransport | None = None):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.redirect_uri = redirect_uri
+        self.api_base = api_base.rstrip("/")
+        self.accounts_base = accounts_base.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.http = httpx.AsyncClient(
+            timeout=timeout,
+            transport=transport,  # An in-process stand-in (httpx.ASGITransport) in tests
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60)
+        )
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    # ----------------------------------------
+    # OAuth
+    # ----------------------------------------
+
+    def _basic_auth(self) -> str:
+        auth_str = f"{self.client_id}:{self.client_secret}"
+        return base64.b64encode(auth_str.encode()).decode()
+
+    async def _token_request(self, data: dict) -> dict:
+        headers = {
+            "Authorization": f"Basic {self._basic_auth()}",
+            "Content-Type": "application/x-www-form-urlencoded"
+        }
+        response = await self._send("POST", f"{self.accounts_base}/api/token", headers=headers, data=data)
+
+        if response.status_code != 200:
+            raise SpotifyAuthError(response.text)
+
+        return response.json()
+
+    async def exchange_code(self, code: str) -> SpotifyToken:
+        token_info = await self._token_request({
+            "code": code,
+            "redirect_uri": self.redirect_uri,
+            "grant_type": "authorization_code"
+        })
+        return SpotifyToken.from_response(token_info)
+
+    async def refresh(self, token: SpotifyToken, force: bool = False):
+        """Refresh an expiring token in place; concurrent callers wait for one refresh"""
+        stale_access_token = token.access_token
+
+        async with token.lock:
+            # Someone else refreshed while we were waiting for the lock
+            if token.access_token != stale_access_token or not (force or token.expires_soon()):
+                return
+
+            if not token.refresh_token:
+                raise SpotifyAuthError("Access token expired and no refresh token is available")
+
+            token.update(await self._token_request({
+                "grant_type": "refresh_token",
+                "refresh_token": token.refresh_token
+            }))
+
+    # ----------------------------------------
+    # Requests
+    # ----------------------------------------
+
+    def _retry_delay(self, attempt: int, response: httpx.Response | None) -> float:
+        if response is not None and response.status_code == 429:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return float(retry_after)
+
+        return self.backoff * (2 ** attempt) * (0.5 + random.random() / 2)
+
+    async def _send(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send with retries and backoff on 429, 5xx and connection errors"""
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = await self.http.request(method, url, **kwargs)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                    return response
+            except httpx.TransportError:
+                if attempt == self.max_retries:
+                    raise
+
+            await asyncio.sleep(self._retry_delay(attempt, response))
+
+    async def request(self, method: str, endpoint: str, token: SpotifyToken,
+                      json_data=None, params: dict | None = None) -> httpx.Response:
+        """Call an API endpoint (relative to /v1), refreshing the token when it expires or is rejected"""
+        if token.expires_soon() and token.refresh_token:
+            await self.refresh(token)
+
+        for refreshed in (False, True):
+            headers = {
+                "Authorization": f"Bearer {token.access_token}",
+                "Content-Type": "application/json"
+            }
+            response = await self._send(method, f"{self.api_base}{endpoint}", headers=headers,
+                                        json=json_data, params=params)
+
+            if response.status_code != 401 or refreshed or not token.refresh_token:
+                return response
+
+            await self.refresh(token, force=True)
+
+        return response
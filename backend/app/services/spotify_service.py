@@ -1,25 +1,82 @@
-import requests
+import os
+from collections import OrderedDict
+from dotenv import load_dotenv
+from app.core.settings import settings
+from app.services.spotify_client import SpotifyClient, SpotifyToken, SPOTIFY_API_BASE, SPOTIFY_ACCOUNTS_BASE
+from app.services.spotify_cache import SpotifyCache
+from app.services.session_store import session_store
 
-SPOTIFY_API_BASE = "https://api.spotify.com/v1/me/player"
+load_dotenv()
 
-def make_spotify_api_request(method: str, endpoint: str, token: str, json_data=None):
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
+SPOTIFY_PLAYER_ENDPOINT = "/me/player"
 
-    url = f"{SPOTIFY_API_BASE}{endpoint}"
+# One pooled client per process; base URLs can point at a local stand-in server
+spotify_client = SpotifyClient(
+    client_id=os.getenv("SPOTIFY_CLIENT_ID"),
+    client_secret=os.getenv("SPOTIFY_CLIENT_SECRET"),
+    redirect_uri=os.getenv("SPOTIFY_REDIRECT_URI", "http://127.0.0.1:8000/api/spotify/callback"),
+    api_base=os.getenv("SPOTIFY_API_BASE", SPOTIFY_API_BASE),
+    accounts_base=os.getenv("SPOTIFY_ACCOUNTS_BASE", SPOTIFY_ACCOUNTS_BASE),
+)
 
-    response = requests.request(method, url, headers=headers, json=json_data)
-    return response
+spotify_cache = SpotifyCache(
+    spotify_client,
+    device_ttl=settings.spotify_device_cache_ttl_s,
+    playlist_ttl=settings.spotify_playlist_cache_ttl_s,
+)
 
-def find_spotify_device_id(token: str):
-    response = make_spotify_api_request("GET", "/devices", token)
+async def make_spotify_api_request(method: str, endpoint: str, token: SpotifyToken, json_data=None):
+    return await spotify_client.request(method, f"{SPOTIFY_PLAYER_ENDPOINT}{endpoint}", token, json_data)
 
-    if response.status_code == 200:
-        devices = response.json().get("devices", [])
-        if devices:
-            first_device_id = devices[0]["id"]
-            return first_device_id
+async def find_spotify_device_id(session_id: str, token: SpotifyToken):
+    return await spotify_cache.device_id(session_id, token)
 
-    return None
+
+# One token object per session, so concurrent requests of a session share its refresh lock: a token
+# rebuilt from the store on every request would refresh on its own, and the loser's write would clobber
+# a rotated refresh token
+session_tokens: OrderedDict[str, SpotifyToken] = OrderedDict()
+
+
+def cached_session_token(session_id: str | None) -> SpotifyToken | None:
+    """A session's token as this process last saw it, without touching the store"""
+    return session_tokens.get(session_id) if session_id else None
+
+
+async def load_session_token(session_id: str | None) -> SpotifyToken | None:
+    if not session_id:
+        return None
+
+    data = await session_store.aget(session_id)
+    if not data or "spotify_token" not in data:
+        session_tokens.pop(session_id, None)
+        return None
+
+    stored = data["spotify_token"]
+    token = session_tokens.get(session_id)
+    if token is None:
+        token = session_tokens[session_id] = SpotifyToken.from_dict(stored)
+    elif stored["expires_at"] > token.expires_at:
+        token.load(stored)  # Another worker sharing the store refreshed it
+
+    session_tokens.move_to_end(session_id)
+    while len(session_tokens) > settings.session_max_entries:
+        session_tokens.popitem(last=False)
+    return token
+
+
+async def save_session_token(session_id: str, token: SpotifyToken):
+    """Persist a session's token (call again after requests, in case it was refreshed)"""
+    data = await session_store.aget(session_id) or {}
+    stored = data.get("spotify_token")
+    if stored and stored["expires_at"] > token.expires_at:
+        token.load(stored)  # Refreshed by another worker in the meantime; don't write the older one back
+    elif stored != token.to_dict():
+        data["spotify_token"] = token.to_dict()
+        await session_store.aset(session_id, data)
+    session_tokens[session_id] = token
+
+
+async def delete_session(session_id: str):
+    session_tokens.pop(session_id, None)
+    await session_store.adelete(session_id)
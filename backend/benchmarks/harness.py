@@ -0,0 +1,101 @@
+"""
+Timing, result files and regression checks shared by the benchmark runners
+"""
+
+import gc
+import json
+import os
+import platform
+import subprocess
+import time
+
+import numpy as np
+
+
+def measure(function, iterations=100, warmup=10, min_seconds=0.0):
+    """Call function() repeatedly; returns per-call latency stats in milliseconds
+
+    Garbage collection is paused while timing (like timeit) so one unlucky
+    collection doesn't land in a single sample.
+    """
+    for _ in range(warmup):
+        function()
+
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        while len(samples) < iterations or time.perf_counter() - started < min_seconds:
+            start = time.perf_counter()
+            function()
+            samples.append((time.perf_counter() - start) * 1000)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    return summarize(samples)
+
+
+def summarize(samples_ms):
+    samples = np.asarray(samples_ms, dtype=float)
+    return {
+        'iterations': int(samples.size),
+        'mean_ms': float(samples.mean()),
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p95_ms': float(np.percentile(samples, 95)),
+        'min_ms': float(samples.min()),
+        'max_ms': float(samples.max()),
+        'stdev_ms': float(samples.std()),
+    }
+
+
+def environment():
+    """Where the numbers came from, so runs on different machines aren't compared blindly"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def save_results(path, results):
+    report = {'environment': environment(), 'benchmarks': results}
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)['benchmarks']
+
+
+def compare(results, baseline, threshold, metric='p50_ms'):
+    """Benchmarks slower than the baseline by more than threshold (a fraction); prints a table"""
+    regressions = []
+    print(f"\n{'benchmark':32s} {'baseline':>10s} {'current':>10s} {'change':>8s}")
+
+    for name, stats in results.items():
+        previous = baseline.get(name)
+        if previous is None or previous.get(metric) is None or stats.get(metric) is None:
+            print(f"{name:32s} {'-':>10s} {stats.get(metric, 0):10.3f} {'new':>8s}")
+            continue
+
+        change = (stats[metric] - previous[metric]) / previous[metric] if previous[metric] else 0.0
+        flag = ''
+        if change > threshold:
+            regressions.append((name, previous[metric], stats[metric], change))
+            flag = '  REGRESSION'
+        print(f"{name:32s} {previous[metric]:10.3f} {stats[metric]:10.3f} {change:+7.1%}{flag}")
+
+    return regressions
@@ -0,0 +1,115 @@
+"""
+YOLO input size sweep: person detection recall against latency
+
+Runs the same frames at every input size and compares the detections with a
+reference run at the largest size (or --reference-size). Recall is the share
+of reference people matched at IoU >= --iou.
+
+Usage (from backend/):
+    python -m benchmarks.imgsz_sweep --video recording.mp4 --frames 300
+    python -m benchmarks.imgsz_sweep --camera 0 --output sweep.json
+"""
+
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+import supervision as sv
+from ultralytics import YOLO
+
+from model.adaptive_resolution import downscale, upscale_detections
+from model.inference_scheduler import YoloDetector
+
+
+def read_frames(source, limit):
+    """Read up to limit frames from a video file or camera index"""
+    cap = cv2.VideoCapture(source)
+    frames = []
+    while len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def detect_at(detector, frame, imgsz):
+    """Detect on a frame downscaled to imgsz; returns (detections in full resolution, seconds)"""
+    start = time.perf_counter()
+    scaled, scale = downscale(frame, imgsz)
+    detections = detector([scaled], imgsz=imgsz)[0]
+    elapsed = time.perf_counter() - start
+    return upscale_detections(detections, scale), elapsed
+
+
+def match_count(reference, candidate, iou_threshold):
+    """Number of reference boxes matched by a candidate box"""
+    if len(reference) == 0 or len(candidate) == 0:
+        return 0
+
+    iou = sv.box_iou_batch(reference.xyxy, candidate.xyxy)
+    return int((iou.max(axis=1) >= iou_threshold).sum())
+
+
+def run_sweep(frames, sizes, reference_size, iou_threshold, warmup=5):
+    detector = YoloDetector(YOLO('yolov8n.pt'), conf=0.5)
+
+    for frame in frames[:warmup]:
+        for imgsz in sizes:
+            detect_at(detector, frame, imgsz)
+
+    references = [detect_at(detector, frame, reference_size)[0] for frame in frames]
+    total_people = sum(len(reference) for reference in references)
+
+    results = []
+    for imgsz in sizes:
+        latencies = []
+        matched = 0
+        for frame, reference in zip(frames, references):
+            detections, elapsed = detect_at(detector, frame, imgsz)
+            latencies.append(elapsed * 1000)
+            matched += match_count(reference, detections, iou_threshold)
+
+        results.append({
+            'imgsz': imgsz,
+            'recall': matched / total_people if total_people else None,
+            'latency_ms_mean': float(np.mean(latencies)),
+            'latency_ms_p50': float(np.percentile(latencies, 50)),
+            'latency_ms_p95': float(np.percentile(latencies, 95)),
+            'max_fps': 1000.0 / float(np.mean(latencies))
+        })
+        print(f"imgsz={imgsz:4d}  recall={results[-1]['recall'] or 0:.3f}  "
+              f"p50={results[-1]['latency_ms_p50']:.1f}ms  p95={results[-1]['latency_ms_p95']:.1f}ms")
+
+    return {'frames': len(frames), 'reference_size': reference_size, 'reference_people': total_people,
+            'iou_threshold': iou_threshold, 'sizes': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--video', help='Recorded video file')
+    source.add_argument('--camera', type=int, help='Camera index')
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[320, 416, 512, 640])
+    parser.add_argument('--reference-size', type=int, default=None)
+    parser.add_argument('--iou', type=float, default=0.5)
+    parser.add_argument('--output', default='imgsz_sweep.json')
+    args = parser.parse_args()
+
+    frames = read_frames(args.video if args.video else args.camera, args.frames)
+    if not frames:
+        raise SystemExit("No frames could be read")
+
+    report = run_sweep(frames, sorted(args.sizes), args.reference_size or max(args.sizes), args.iou)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+"""
+Benchmark suite for the detection and landmark pipelines
+
+Every benchmark runs on fixed inputs (the face photos in docs/images, drawn
+faces and seeded landmark sets), so two runs on the same machine measure the
+same work. Results go to a JSON file; pass an earlier file as --baseline to
+fail the run when a benchmark's median gets slower than --threshold.
+
+    landmarks.points_processing        PointsProcessing.main on one face's landmarks
+    landmarks.recognize_emotion        EmotionRecognition.recognize_emotion on its features
+    landmarks.frame_processing         EmotionRecognitionSystem.frame_processing on a photo
+    detector.process_frame[N]          EmotionDetectionBroadcaster.process_frame with N people
+                                       (fixed person boxes stand in for YOLO, so N is exact;
+                                       YOLO itself is covered by benchmarks.imgsz_sweep)
+    tracker.emotion_tracker[N]         EmotionTracker update + smoothing for N tracks per frame
+    stream.fanout[N]                   Payload building (draw, encode, JSON) for N clients per
+                                       published frame, as the WebSocket endpoint does it
+
+Usage (from backend/):
+    python -m benchmarks.pipeline --output bench.json
+    python -m benchmarks.pipeline --baseline bench.json --threshold 0.15 --output bench_new.json
+    python -m benchmarks.pipeline --only landmarks tracker
+"""
+
+import argparse
+import copy
+import itertools
+import json
+import sys
+from functools import partial
+
+import numpy as np
+import supervision as sv
+
+from benchmarks.harness import measure, save_results, load_results, compare
+from benchmarks.synthetic import recorded_frames, synthetic_face, face_canvas, synthetic_landmarks
+
+LANDMARK_SETS = 32
+
+# ============================================
+# INPUTS
+# ============================================
+
+
+def face_tiles():
+    return recorded_frames() + [synthetic_face(seed) for seed in range(5)]
+
+
+def feature_points(seed):
+    """Landmarks grouped by feature, as FaceMeshProcessor.process returns them"""
+    from emotion_processor.face_mesh.face_mesh_processor import FaceMeshExtractor
+
+    extractor = FaceMeshExtractor()
+    face_points = synthetic_landmarks(seed)
+    return {
+        'eyebrows': extractor.get_eyebrows_points(face_points),
+        'eyes': extractor.get_eyes_points(face_points),
+        'nose': extractor.get_nose_points(face_points),
+        'mouth': extractor.get_mouth_points(face_points)
+    }
+
+
+class FixedDetector:
+    """Stands in for YOLO, returning the same person boxes for every frame"""
+
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+    def __call__(self, frames, imgsz=None):
+        return [
+            sv.Detections(
+                xyxy=self.boxes.copy(),
+                confidence=np.full(len(self.boxes), 0.9, dtype=np.float32),
+                class_id=np.zeros(len(self.boxes), dtype=int)
+            )
+            for _ in frames
+        ]
+
+    def close(self):
+        pass
+
+# ============================================
+# BENCHMARKS (setup functions returning the call to time)
+# ============================================
+
+
+def setup_points_processing():
+    from emotion_processor.data_processing.main import PointsProcessing
+
+    processing = PointsProcessing()
+    inputs = itertools.cycle([feature_points(seed) for seed in range(LANDMARK_SETS)])
+    return lambda: processing.main(next(inputs))
+
+
+def setup_recognize_emotion():
+    from emotion_processor.data_processing.main import PointsProcessing
+    from emotion_processor.emotions_recognition.main import EmotionRecognition
+
+    # Processors reuse their result dicts, so keep a copy per face
+    processing = PointsProcessing()
+    features = [copy.deepcopy(processing.main(feature_points(seed))) for seed in range(LANDMARK_SETS)]
+
+    recognition = EmotionRecognition()
+    inputs = itertools.cycle(features)
+    return lambda: recognition.recognize_emotion(next(inputs))
+
+
+def setup_frame_processing():
+    from emotion_processor.main import EmotionRecognitionSystem
+
+    system = EmotionRecognitionSystem()
+    frames = itertools.cycle(recorded_frames())
+    # frame_processing draws on its input, so every call gets a fresh copy
+    return lambda: system.frame_processing(next(frames).copy())
+
+
+def setup_process_frame(people):
+    from model.emotion_detector import broadcaster
+    from model.inference_scheduler import InferenceScheduler
+    from model.load_shedding import LoadSheddingController
+
+    broadcaster.load_models()
+    frame, boxes = face_canvas(people, face_tiles())
+
+    broadcaster.inference_scheduler = InferenceScheduler(FixedDetector(boxes))
+    broadcaster.load_shedding = LoadSheddingController(enabled=False)  # No tier changes mid-benchmark
+    broadcaster.sessions.open(broadcaster.source_id)
+
+    return lambda: broadcaster.process_frame(frame)
+
+
+def setup_emotion_tracker(tracks):
+    from model.emotion_detector import EmotionTracker
+
+    tracker = EmotionTracker(window_seconds=5, update_interval=1.0)
+    emotions = ['Angry', 'Disgust', 'Fear', 'Happy', 'Sad', 'Surprise', 'Neutral']
+    rng = np.random.default_rng(0)
+    readings = [(emotions[e], float(c)) for e, c in zip(rng.integers(0, 7, 997), rng.uniform(0.3, 1.0, 997))]
+    clock = itertools.count()
+
+    def one_frame():
+        now = next(clock) / 30.0  # Simulated 30 fps clock
+        for tracker_id in range(tracks):
+            emotion, confidence = readings[(tracker_id + int(now * 30)) % len(readings)]
+            tracker.add_detection(tracker_id, emotion, confidence, now)
+            tracker.get_smoothed_emotion(tracker_id, now)
+        tracker.cleanup_old_trackers(now, timeout=10.0)
+
+    return one_frame
+
+
+def setup_fanout(clients):
+    from model.emotion_detector import broadcaster
+
+    frame, boxes = face_canvas(5, face_tiles())
+    frame.flags.writeable = False
+    people = [
+        {'id': i, 'bbox': [int(v) for v in box], 'emotion': 'Happy', 'confidence': 0.8, 'has_face': True, 'faces': []}
+        for i, box in enumerate(boxes)
+    ]
+
+    def publish_and_fan_out():
+        with broadcaster.frame_lock:
+            broadcaster.current_frame = frame
+            broadcaster.current_data = {'people': people}
+            broadcaster.frame_seq += 1
+
+        for _ in range(clients):
+            _, emotion_data, _ = broadcaster.get_current_frame()
+            payload = {
+                'emotions': sorted(emotion_data['people'], key=lambda x: x['id']),
+                'profile': 'full',
+                'timestamp': 0.0,
+                'active_tracks': len(emotion_data['people']),
+                'total_clients': clients,
+                'frame': broadcaster.get_current_frame_base64(annotated=True, profile='full')
+            }
+            # What WebSocket.send_json does before writing to the socket
+            json.dumps(payload, separators=(',', ':'), ensure_ascii=False)
+
+    return publish_and_fan_out
+
+
+BENCHMARKS = {
+    'landmarks.points_processing': setup_points_processing,
+    'landmarks.recognize_emotion': setup_recognize_emotion,
+    'landmarks.frame_processing': setup_frame_processing,
+    **{f'detector.process_frame[{n}]': partial(setup_process_frame, n) for n in (1, 5, 10)},
+    **{f'tracker.emotion_tracker[{n}]': partial(setup_emotion_tracker, n) for n in (10, 100, 500)},
+    **{f'stream.fanout[{n}]': partial(setup_fanout, n) for n in (1, 10, 50)},
+}
+
+# ============================================
+# RUNNER
+# ============================================
+
+
+def run(names, iterations, warmup):
+    results = {}
+    for name in names:
+        try:
+            function = BENCHMARKS[name]()
+            results[name] = measure(function, iterations=iterations, warmup=warmup)
+        except Exception as e:
+            results[name] = {'error': f'{type(e).__name__}: {e}'}
+            print(f"{name:32s} failed: {results[name]['error']}")
+            continue
+
+        stats = results[name]
+        print(f"{name:32s} p50={stats['p50_ms']:8.3f}ms  p95={stats['p95_ms']:8.3f}ms  "
+              f"mean={stats['mean_ms']:8.3f}ms  (n={stats['iterations']})")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', nargs='+', default=None, help='Run benchmarks whose name starts with any of these')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=None, help='Earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Allowed median slowdown (0.10 = 10%%)')
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if not args.only or any(name.startswith(p) for p in args.only)]
+    if not names:
+        raise SystemExit(f"No benchmark matches {args.only}; available: {', '.join(BENCHMARKS)}")
+
+    results = run(names, args.iterations, args.warmup)
+    save_results(args.output, results)
+    print(f"Results written to {args.output}")
+
+    failed = [name for name, stats in results.items() if 'error' in stats]
+
+    regressions = []
+    if args.baseline:
+        regressions = compare({k: v for k, v in results.items() if 'error' not in v},
+                              load_results(args.baseline), args.threshold)
+        for name, before, after, change in regressions:
+            print(f"Regression: {name} {before:.3f}ms -> {after:.3f}ms ({change:+.1%})")
+
+    if failed or regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Concurrency load test for the pooled face mesh recognizers
+
+Runs many threads against RecognizerPool the way the analyze endpoints do:
+half send one-off images (no stream), half send consecutive frames of their
+own stream. While a thread holds an instance, it records it as in use and
+fails the run if another thread holds the same instance, so the exclusive
+use MediaPipe requires is checked as well as timed. It reports throughput,
+checkout waits, the share of stream checkouts that found their own instance
+(affinity hits), and how many instances were taken over from other streams.
+
+--synthetic-ms replaces the recognizer with a sleep of that long, which tests
+the pool itself on machines without MediaPipe.
+
+Usage (from backend/):
+    python -m benchmarks.recognizer_pool_load --threads 16 --pool-size 4 --seconds 10
+    python -m benchmarks.recognizer_pool_load --synthetic-ms 15 --streams 8
+"""
+
+import argparse
+import itertools
+import sys
+import threading
+import time
+
+import numpy as np
+
+from benchmarks.harness import summarize
+from benchmarks.synthetic import recorded_frames, synthetic_face
+
+
+class SyntheticRecognizer:
+    """Stands in for EmotionRecognitionSystem, busy for a fixed time per image"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.resets = 0
+
+    def analyze(self, face_image, draw=False):
+        time.sleep(self.seconds)
+        return {'emotion': 'neutral', 'scores': {}}
+
+    def reset(self):
+        self.resets += 1
+
+
+def worker(pool, stream_id, images, deadline, in_use, in_use_lock, latencies, errors):
+    frames = itertools.cycle(images)
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            with pool.recognizer(stream_id, timeout=10.0) as recognizer:
+                with in_use_lock:
+                    if id(recognizer) in in_use:
+                        errors.append(f"{stream_id} got an instance already used by {in_use[id(recognizer)]}")
+                    in_use[id(recognizer)] = stream_id
+                try:
+                    recognizer.analyze(next(frames))
+                finally:
+                    with in_use_lock:
+                        in_use.pop(id(recognizer), None)
+        except Exception as e:
+            errors.append(f"{stream_id}: {type(e).__name__}: {e}")
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+def run(pool, threads, streams, seconds, images):
+    in_use = {}
+    in_use_lock = threading.Lock()
+    latencies = []
+    errors = []
+    deadline = time.monotonic() + seconds
+
+    workers = [
+        threading.Thread(
+            target=worker,
+            args=(pool, f'stream-{i}' if i < streams else None, images, deadline,
+                  in_use, in_use_lock, latencies, errors),
+            name=f'load-{i}'
+        )
+        for i in range(threads)
+    ]
+
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return latencies, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--streams', type=int, default=None, help='Threads sending a stream (default: half)')
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--synthetic-ms', type=float, default=None,
+                        help='Use a stand-in recognizer that takes this long per image')
+    args = parser.parse_args()
+
+    from app.services.emotion_detection_service import RecognizerPool
+
+    if args.synthetic_ms is not None:
+        factory = lambda: SyntheticRecognizer(args.synthetic_ms / 1000)
+        images = [np.zeros((8, 8, 3), dtype=np.uint8)]
+    else:
+        from emotion_processor.main import EmotionRecognitionSystem
+        factory = EmotionRecognitionSystem
+        images = recorded_frames() + [synthetic_face(seed) for seed in range(5)]
+
+    streams = args.threads // 2 if args.streams is None else min(args.streams, args.threads)
+    pool = RecognizerPool(args.pool_size, factory=factory)
+    latencies, errors, elapsed = run(pool, args.threads, streams, args.seconds, images)
+
+    status = pool.status()
+    print(f"{args.threads} threads ({streams} streams) on {args.pool_size} recognizers for {elapsed:.1f}s")
+    print(f"Throughput: {len(latencies) / elapsed:.1f} images/s")
+    if latencies:
+        stats = summarize([seconds * 1000 for seconds in latencies])
+        print(f"Latency (checkout + analyze): p50={stats['p50_ms']:.2f}ms  p95={stats['p95_ms']:.2f}ms  "
+              f"max={stats['max_ms']:.2f}ms")
+    print(f"Pool: {status}")
+    if status.get('stream_checkouts'):
+        print(f"Affinity hit rate: {status.get('affinity_hits', 0) / status['stream_checkouts']:.1%} "
+              f"of stream checkouts got their own instance back")
+
+    for error in errors[:10]:
+        print(f"Error: {error}")
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Replay a frame source through the full detection pipeline, headless
+
+Runs the broadcaster's detection loop (YOLO, tracking, emotion inference,
+publishing) on a recorded session, a video file or synthetic frames for a
+fixed number of frames and reports per-stage latency percentiles. At
+--speed 0 (the default) every frame is processed, in order, as fast as the
+pipeline allows, so two runs of the same recording measure the same work;
+at --speed 1 frames arrive with their original timing and late ones are
+skipped, as they would be from a live camera.
+
+Record a session first (from the camera, or any other source):
+    python -m benchmarks.replay --record recordings/lobby --source camera --seconds 30
+
+Then replay it:
+    python -m benchmarks.replay --source replay:recordings/lobby --frames 600 --output replay.json
+    python -m benchmarks.replay --source replay:recordings/lobby --baseline replay.json --threshold 0.15
+    python -m benchmarks.replay --source synthetic:4 --frames 300 --encode
+"""
+
+import argparse
+import sys
+import time
+from threading import Event
+
+from benchmarks.harness import save_results, load_results, compare
+
+
+def record(args):
+    from model.frame_sources import create_frame_source, SessionRecorder
+
+    source = create_frame_source(args.source, speed=1.0, loop=False, seed=args.seed)
+    if not source.open():
+        raise SystemExit(f"Could not open frame source {args.source}")
+
+    recorder = SessionRecorder(args.record, drop_when_behind=False)  # Nothing else runs here; keep every frame
+    deadline = time.monotonic() + args.seconds
+    try:
+        while time.monotonic() < deadline and not source.exhausted:
+            frame = source.read()
+            if frame is not None:
+                recorder.record(frame, time.monotonic())
+            elif not source.paces_itself:
+                time.sleep(0.01)
+    finally:
+        source.close()
+        recorder.close()
+
+
+def replay(args):
+    from app.core.settings import settings
+    from model.emotion_detector import broadcaster
+    from model.frame_trace import TraceStats
+
+    settings.frame_source = args.source
+    settings.frame_source_speed = args.speed
+    settings.frame_source_loop = True
+    settings.frame_source_seed = args.seed
+    settings.record_session_dir = None
+    settings.load_shedding = args.load_shedding
+
+    # Keep every frame of the run in the percentiles
+    broadcaster.trace_stats = TraceStats(window=args.frames)
+    done = Event()
+    seen = []
+
+    def on_frame(frame_data):
+        if done.is_set():
+            return
+        if args.encode:
+            broadcaster.get_current_frame_base64(annotated=True, profile='full')  # Recorded as encode:full
+        seen.append(len(frame_data['people']))
+        if len(seen) >= args.frames:
+            done.set()
+
+    broadcaster.load_models()
+    broadcaster.subscribe(on_frame)
+    broadcaster.start()
+    started = time.monotonic()
+    try:
+        if not done.wait(args.timeout):
+            print(f"Timed out after {len(seen)} of {args.frames} frames")
+    finally:
+        elapsed = time.monotonic() - started
+        broadcaster.unsubscribe(on_frame)
+        broadcaster.stop()
+
+    results = {
+        f'replay.{stage}': summary
+        for stage, summary in broadcaster.trace_stats.report()['stages'].items()
+    }
+    results['replay.throughput'] = {
+        'frames': len(seen),
+        'seconds': elapsed,
+        'fps': len(seen) / elapsed if elapsed else 0.0,
+        'people_per_frame': sum(seen) / len(seen) if seen else 0.0,
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', default='synthetic',
+                        help='Frame source spec: camera[:index], video:<path>, replay:<dir> or synthetic[:people]')
+    parser.add_argument('--speed', type=float, default=0.0, help='1 = original timing, 0 = as fast as possible')
+    parser.add_argument('--frames', type=int, default=300, help='Frames to process')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of synthetic sources')
+    parser.add_argument('--encode', action='store_true', help='Also draw and encode every frame, as a client would')
+    parser.add_argument('--load-shedding', action='store_true', help='Turn load shedding on (off by default)')
+    parser.add_argument('--timeout', type=float, default=600.0)
+    parser.add_argument('--record', default=None, help='Record --seconds of --source to this directory instead')
+    parser.add_argument('--seconds', type=float, default=30.0)
+    parser.add_argument('--output', default='replay_results.json')
+    parser.add_argument('--baseline', default=None, help='Earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Allowed median slowdown (0.10 = 10%%)')
+    args = parser.parse_args()
+
+    if args.record:
+        record(args)
+        return
+
+    results = replay(args)
+    for name, stats in results.items():
+        if 'p50_ms' in stats:
+            print(f"{name:32s} p50={stats['p50_ms']:8.3f}ms  p95={stats['p95_ms']:8.3f}ms  "
+                  f"p99={stats['p99_ms']:8.3f}ms  (n={stats['count']})")
+    throughput = results['replay.throughput']
+    print(f"{throughput['frames']} frames in {throughput['seconds']:.1f}s ({throughput['fps']:.1f} fps, "
+          f"{throughput['people_per_frame']:.1f} people per frame)")
+
+    save_results(args.output, results)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        timed = {name: stats for name, stats in results.items() if 'p50_ms' in stats}
+        regressions = compare(timed, load_results(args.baseline), args.threshold)
+        for name, before, after, change in regressions:
+            print(f"Regression: {name} {before:.3f}ms -> {after:.3f}ms ({change:+.1%})")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Deterministic benchmark inputs: recorded frames from docs/images, drawn faces and landmark sets
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+DOCS_IMAGES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'docs', 'images')
+RECORDED_FACES = ['face_mesh_frontal.jpg', 'frontal_points.jpg', 'mesh_points.jpg', 'nose_points.jpg', 'right_points.jpg']
+
+FACE_MESH_POINTS = 478  # MediaPipe face mesh with refined landmarks
+
+
+def recorded_frames(height=480):
+    """The face photos shipped in docs/images, resized to a common height"""
+    frames = []
+    for name in RECORDED_FACES:
+        image = cv2.imread(os.path.join(DOCS_IMAGES, name))
+        if image is None:
+            continue
+        width = int(image.shape[1] * height / image.shape[0])
+        frames.append(cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA))
+    return frames
+
+
+def synthetic_face(seed, size=(240, 180)):
+    """A drawn face (head, eyes, brows, nose, mouth) on a plain background"""
+    rng = np.random.default_rng(seed)
+    height, width = size
+    image = np.full((height, width, 3), rng.integers(150, 230, size=3), dtype=np.uint8)
+
+    center = (width // 2, height // 2)
+    axes = (int(width * 0.38), int(height * 0.42))
+    skin = tuple(int(c) for c in rng.integers([120, 150, 190], [170, 200, 240]))
+    cv2.ellipse(image, center, axes, 0, 0, 360, skin, -1)
+
+    eye_y = int(height * 0.42)
+    for side in (-1, 1):
+        eye_x = center[0] + side * int(width * 0.15)
+        cv2.ellipse(image, (eye_x, eye_y), (14, 7), 0, 0, 360, (255, 255, 255), -1)
+        cv2.circle(image, (eye_x, eye_y), 5, (40, 30, 20), -1)
+        brow_lift = int(rng.integers(-4, 5))
+        cv2.line(image, (eye_x - 16, eye_y - 16 + brow_lift), (eye_x + 16, eye_y - 18 - brow_lift), (40, 30, 20), 3)
+
+    cv2.line(image, (center[0], eye_y + 8), (center[0] - 6, int(height * 0.6)), (90, 90, 140), 2)
+
+    smile = int(rng.integers(-12, 13))
+    mouth_y = int(height * 0.72)
+    cv2.ellipse(image, (center[0], mouth_y), (30, abs(smile) + 2), 0, 0 if smile >= 0 else 180,
+                180 if smile >= 0 else 360, (60, 40, 150), 3)
+    return image
+
+
+def face_canvas(people, tiles, size=(480, 640)):
+    """A frame with one face tile per person laid out on a grid; returns (frame, person boxes)"""
+    height, width = size
+    columns = int(np.ceil(np.sqrt(people)))
+    rows = int(np.ceil(people / columns)) if people else 1
+    cell_h, cell_w = height // rows, width // columns
+
+    frame = np.full((height, width, 3), 200, dtype=np.uint8)
+    boxes = []
+    for index in range(people):
+        row, column = divmod(index, columns)
+        tile = tiles[index % len(tiles)]
+
+        scale = min(cell_h / tile.shape[0], cell_w / tile.shape[1])
+        tile = cv2.resize(tile, (max(1, int(tile.shape[1] * scale)), max(1, int(tile.shape[0] * scale))))
+
+        y1, x1 = row * cell_h, column * cell_w
+        frame[y1:y1 + tile.shape[0], x1:x1 + tile.shape[1]] = tile
+        boxes.append([x1, y1, x1 + tile.shape[1], y1 + tile.shape[0]])
+
+    return frame, np.array(boxes, dtype=np.float32).reshape(-1, 4)
+
+
+def synthetic_landmarks(seed, size=(480, 640)):
+    """A face mesh point list ([index, x, y] per landmark) as FaceMeshExtractor.extract_points returns it"""
+    rng = np.random.default_rng(seed)
+    height, width = size
+    xs = rng.integers(width // 4, 3 * width // 4, FACE_MESH_POINTS)
+    ys = rng.integers(height // 4, 3 * height // 4, FACE_MESH_POINTS)
+    return [[i, int(x), int(y)] for i, (x, y) in enumerate(zip(xs, ys))]
@@ -0,0 +1,304 @@
+"""
+Load generator for the detection WebSocket: how many dashboards one server can feed
+
+Opens N concurrent clients against /api/ws/emotions/detect, for each client
+count in --clients, and measures over --seconds (after --warmup):
+
+    delivered FPS     frames received per client per second, against the FPS
+                      the server produced (sequence numbers seen)
+    bytes per second  payload bytes received, per client and in total
+    frame age         capture -> sent, from each payload's trace; on the same
+                      host also capture -> received (the trace's captured_at is
+                      the server's monotonic clock, which only this machine shares)
+    skipped frames    sequence gaps, i.e. frames a client never got
+    server CPU        of the server process and its children (100% = one core)
+    generator CPU     of this process, so a saturated load generator isn't
+                      mistaken for a saturated server
+
+--spawn starts the server itself on the synthetic frame source (no camera
+needed) with the same settings for every run; otherwise point --url at a
+running server and pass --server-pid to measure its CPU.
+
+Usage (from backend/):
+    python -m benchmarks.ws_load --spawn --clients 1 10 25 50 100 --output ws_load.json
+    python -m benchmarks.ws_load --spawn --clients 50 --profile medium --baseline ws_load.json
+    python -m benchmarks.ws_load --url ws://localhost:8000/api/ws/emotions/detect --server-pid 4242
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+import psutil
+from websockets.asyncio.client import connect
+
+from benchmarks.harness import save_results, load_results, compare
+
+DETECT_PATH = '/api/ws/emotions/detect'
+
+# ============================================
+# CLIENTS
+# ============================================
+
+
+class ClientStats:
+    """What one simulated dashboard received while measuring"""
+
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+        self.images = 0
+        self.skipped = 0
+        self.ages_ms = []  # Capture -> sent
+        self.receive_ages_ms = []  # Capture -> received (same host only)
+        self.seqs = []
+        self.error = None
+
+
+async def run_client(url, stats, measuring, stop, ack, local):
+    try:
+        async with connect(url, max_size=None, open_timeout=30) as ws:
+            last_seq = None
+            while not stop.is_set():
+                try:
+                    message = await asyncio.wait_for(ws.recv(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    continue
+                received_at = time.monotonic()
+
+                payload = json.loads(message)
+                seq = payload.get('seq')
+                if ack and seq is not None:
+                    await ws.send(json.dumps({'ack': seq}))
+
+                if measuring.is_set():
+                    stats.frames += 1
+                    stats.bytes += len(message)  # Payloads are ASCII JSON, so characters are bytes
+                    stats.images += 'frame' in payload
+                    stats.seqs.append(seq)
+                    if last_seq is not None and seq is not None:
+                        stats.skipped += max(0, seq - last_seq - 1)
+
+                    trace = payload.get('trace')
+                    if trace:
+                        stats.ages_ms.append(trace['age_ms'])
+                        if local:
+                            stats.receive_ages_ms.append((received_at - trace['captured_at']) * 1000)
+                last_seq = seq
+    except Exception as e:
+        stats.error = f'{type(e).__name__}: {e}'
+
+# ============================================
+# CPU
+# ============================================
+
+
+class CpuMeter:
+    """CPU time of a process (and its children) between start() and stop()"""
+
+    def __init__(self, pid=None):
+        self.process = psutil.Process(pid) if pid is not None else None
+        self.started = None
+
+    def cpu_seconds(self):
+        processes = [self.process]
+        try:
+            processes += self.process.children(recursive=True)
+        except psutil.Error:
+            pass
+
+        total = 0.0
+        for process in processes:
+            try:
+                times = process.cpu_times()
+                total += times.user + times.system
+            except psutil.Error:
+                pass
+        return total
+
+    def start(self):
+        if self.process is not None:
+            self.started = (time.monotonic(), self.cpu_seconds())
+
+    def stop(self):
+        """Average CPU use since start() in percent of one core, or None"""
+        if self.process is None or self.started is None:
+            return None
+        wall, cpu = self.started
+        return (self.cpu_seconds() - cpu) / max(1e-9, time.monotonic() - wall) * 100
+
+# ============================================
+# RUNS
+# ============================================
+
+
+def percentiles(samples):
+    if not samples:
+        return {'count': 0}
+    values = np.asarray(samples, dtype=float)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'count': int(values.size), 'p50_ms': float(p50), 'p95_ms': float(p95),
+            'p99_ms': float(p99), 'max_ms': float(values.max())}
+
+
+async def run_step(url, clients, args, server_cpu, local):
+    measuring = asyncio.Event()
+    stop = asyncio.Event()
+    stats = [ClientStats() for _ in range(clients)]
+    tasks = [asyncio.create_task(run_client(url, s, measuring, stop, args.ack, local)) for s in stats]
+
+    await asyncio.sleep(args.warmup)
+    generator_cpu = CpuMeter(os.getpid())
+    server_cpu.start()
+    generator_cpu.start()
+    measuring.set()
+    started = time.monotonic()
+
+    await asyncio.sleep(args.seconds)
+
+    measuring.clear()
+    elapsed = time.monotonic() - started
+    result = {'server_cpu_percent': server_cpu.stop(), 'generator_cpu_percent': generator_cpu.stop()}
+    stop.set()
+    await asyncio.gather(*tasks)
+
+    connected = [s for s in stats if s.error is None]
+    seqs = [seq for s in connected for seq in s.seqs if seq is not None]
+    per_client_fps = [s.frames / elapsed for s in connected]
+    total_bytes = sum(s.bytes for s in connected)
+
+    result.update({
+        'clients': clients,
+        'failed_clients': len(stats) - len(connected),
+        'errors': sorted({s.error for s in stats if s.error})[:5],
+        'seconds': elapsed,
+        'server_fps': (max(seqs) - min(seqs)) / elapsed if seqs else 0.0,
+        'delivered_fps_mean': float(np.mean(per_client_fps)) if per_client_fps else 0.0,
+        'delivered_fps_min': float(np.min(per_client_fps)) if per_client_fps else 0.0,
+        'bytes_per_second': total_bytes / elapsed,
+        'bytes_per_second_per_client': total_bytes / elapsed / max(1, len(connected)),
+        'frames_with_image': sum(s.images for s in connected),
+        'skipped_frames': sum(s.skipped for s in connected),
+        'frame_age_at_send': percentiles([age for s in connected for age in s.ages_ms]),
+        'frame_age_at_receive': percentiles([age for s in connected for age in s.receive_ages_ms]),
+    })
+
+    # p50_ms etc. at the top level make the age at receipt (or at send, remotely) comparable to a baseline
+    result.update(result['frame_age_at_receive'] if local else result['frame_age_at_send'])
+    return result
+
+
+def print_step(name, result):
+    cpu = result['server_cpu_percent']
+    age = result['frame_age_at_receive'] if result['frame_age_at_receive']['count'] else result['frame_age_at_send']
+    print(f"{name:18s} server={result['server_fps']:5.1f}fps  delivered={result['delivered_fps_mean']:5.1f}fps "
+          f"(min {result['delivered_fps_min']:5.1f})  {result['bytes_per_second'] / 1e6:7.2f}MB/s  "
+          f"age p50={age.get('p50_ms', 0):6.1f}ms p95={age.get('p95_ms', 0):6.1f}ms  "
+          f"server cpu={'-' if cpu is None else f'{cpu:.0f}%'}  "
+          f"generator cpu={result['generator_cpu_percent']:.0f}%"
+          f"{'  failed=' + str(result['failed_clients']) if result['failed_clients'] else ''}")
+
+# ============================================
+# SERVER
+# ============================================
+
+
+def spawn_server(args):
+    """Start uvicorn on the synthetic frame source; returns the process once it answers"""
+    env = dict(
+        os.environ,
+        FRAME_SOURCE=args.source,
+        FRAME_SOURCE_SPEED=str(args.speed),
+        FRAME_SOURCE_SEED='0',
+        DETECTION_GRACE_PERIOD_S=str(args.warmup + 30),  # Keep the pipeline running between steps
+        LOAD_SHEDDING='false',  # Every step measures the same pipeline, whatever the load of the last one
+    )
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app.main:app', '--host', '127.0.0.1', '--port', str(args.port),
+         '--log-level', 'warning'],
+        env=env
+    )
+
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"Server exited during startup (code {server.returncode})")
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{args.port}/api/health/live', timeout=1):
+                return server
+        except OSError:
+            time.sleep(0.5)
+
+    server.terminate()
+    raise SystemExit(f"Server did not answer within {args.startup_timeout:.0f}s")
+
+
+async def run(args, url, server_pid, local):
+    server_cpu = CpuMeter(server_pid)
+    results = {}
+    for clients in args.clients:
+        name = f'ws.fanout[{clients}]'
+        results[name] = await run_step(url, clients, args, server_cpu, local)
+        print_step(name, results[name])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 10, 50], help='Client counts to run, in order')
+    parser.add_argument('--seconds', type=float, default=15.0, help='Measured time per client count')
+    parser.add_argument('--warmup', type=float, default=5.0, help='Unmeasured time after connecting')
+    parser.add_argument('--profile', default='full', help='Stream profile: full, medium, thumbnail or metadata')
+    parser.add_argument('--no-annotate', action='store_true', help='Ask for raw frames (annotate=false)')
+    parser.add_argument('--fixed', action='store_true', help='Keep the profile fixed (adaptive=false)')
+    parser.add_argument('--no-ack', dest='ack', action='store_false', help="Don't acknowledge frames")
+    parser.add_argument('--url', default=None, help=f'Server WebSocket URL (default: ws://127.0.0.1:PORT{DETECT_PATH})')
+    parser.add_argument('--server-pid', type=int, default=None, help='Server process to measure CPU of')
+    parser.add_argument('--spawn', action='store_true', help='Start a server on --source for the run')
+    parser.add_argument('--source', default='synthetic:3', help='Frame source of a spawned server')
+    parser.add_argument('--speed', type=float, default=1.0, help='Frame source speed of a spawned server')
+    parser.add_argument('--port', type=int, default=8765, help='Port of a spawned server')
+    parser.add_argument('--startup-timeout', type=float, default=120.0)
+    parser.add_argument('--output', default='ws_load_results.json')
+    parser.add_argument('--baseline', default=None, help='Earlier results file to compare frame age against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Allowed median slowdown (0.10 = 10%%)')
+    args = parser.parse_args()
+
+    query = {'profile': args.profile}
+    if args.no_annotate:
+        query['annotate'] = 'false'
+    if args.fixed:
+        query['adaptive'] = 'false'
+
+    server = spawn_server(args) if args.spawn else None
+    try:
+        base = args.url or f'ws://127.0.0.1:{args.port}{DETECT_PATH}'
+        url = f'{base}{"&" if "?" in base else "?"}{urlencode(query)}'
+        server_pid = server.pid if server else args.server_pid
+        local = urlsplit(url).hostname in ('127.0.0.1', 'localhost', '::1')
+        results = asyncio.run(run(args, url, server_pid, local))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    save_results(args.output, results)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        regressions = compare(results, load_results(args.baseline), args.threshold)
+        for name, before, after, change in regressions:
+            print(f"Regression: {name} {before:.3f}ms -> {after:.3f}ms ({change:+.1%})")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
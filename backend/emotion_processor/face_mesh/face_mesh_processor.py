@@ -5,14 +5,20 @@ from typing import Any, Tuple, List, Dict
 
 
 class FaceMeshInference:
-    def __init__(self, min_detection_confidence=0.6, min_tracking_confidence=0.6):
-        self.face_mesh = mp.solutions.face_mesh.FaceMesh(
-            static_image_mode=False,
+    def __init__(self, min_detection_confidence=0.6, min_tracking_confidence=0.6, static_image_mode=False):
+        self.options = dict(
+            static_image_mode=static_image_mode,
             max_num_faces=1,
             refine_landmarks=True,
             min_detection_confidence=min_detection_confidence,
             min_tracking_confidence=min_tracking_confidence
         )
+        self.face_mesh = mp.solutions.face_mesh.FaceMesh(**self.options)
+
+    def reset(self):
+        # Tracking mode carries landmarks over from the previous frame; a new graph forgets them
+        self.face_mesh.close()
+        self.face_mesh = mp.solutions.face_mesh.FaceMesh(**self.options)
 
     def process(self, image: np.ndarray) -> Tuple[bool, Any]:
         rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
@@ -39,9 +45,12 @@ class FaceMeshExtractor:
         return mesh_points
 
     def extract_feature_points(self, face_points: List[List[int]], feature_indices: dict):
+        # New dicts every call, so points handed out earlier are never overwritten
         for feature, indices in feature_indices.items():
-            for sub_feature, sub_indices in indices.items():
-                self.points[feature][sub_feature] = [face_points[i][1:] for i in sub_indices]
+            self.points[feature] = {
+                sub_feature: [face_points[i][1:] for i in sub_indices]
+                for sub_feature, sub_indices in indices.items()
+            }
 
     def get_eyebrows_points(self, face_points: List[List[int]]) -> Dict[str, List[List[int]]]:
         feature_indices = {
@@ -98,8 +107,8 @@ class FaceMeshDrawer:
 
 
 class FaceMeshProcessor:
-    def __init__(self):
-        self.inference = FaceMeshInference()
+    def __init__(self, static_image_mode: bool = False):
+        self.inference = FaceMeshInference(static_image_mode=static_image_mode)
         self.extractor = FaceMeshExtractor()
         self.drawer = FaceMeshDrawer()
 
@@ -122,3 +131,6 @@ class FaceMeshProcessor:
             return points, True, face_image
 
         return points, True, original_image
+
+    def reset(self):
+        self.inference.reset()
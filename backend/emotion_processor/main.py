@@ -6,8 +6,8 @@ from emotion_processor.emotions_visualizations.main import EmotionsVisualization
 
 
 class EmotionRecognitionSystem:
-    def __init__(self):
-        self.face_mesh = FaceMeshProcessor()
+    def __init__(self, static_image_mode: bool = False):
+        self.face_mesh = FaceMeshProcessor(static_image_mode=static_image_mode)
         self.data_processing = PointsProcessing()
         self.emotions_recognition = EmotionRecognition()
         self.emotions_visualization = EmotionsVisualization()
@@ -23,3 +23,22 @@ class EmotionRecognitionSystem:
             Exception(f"No face mesh")
             return face_image
 
+    def analyze(self, face_image: np.ndarray, draw: bool = False) -> dict | None:
+        # Dominant emotion and every score, or None when no face mesh is found
+        face_points, control_process, original_image = self.face_mesh.process(face_image, draw=draw)
+        if not control_process:
+            return None
+
+        processed_features = self.data_processing.main(face_points)
+        emotions = self.emotions_recognition.recognize_emotion(processed_features)
+        result = {
+            'emotion': max(emotions, key=emotions.get),
+            'scores': {emotion: float(score) for emotion, score in emotions.items()},
+        }
+        if draw:
+            result['image'] = self.emotions_visualization.main(emotions, original_image)
+        return result
+
+    def reset(self):
+        # Forget tracking state before following a different stream
+        self.face_mesh.reset()
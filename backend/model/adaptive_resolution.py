@@ -0,0 +1,88 @@
+"""
+Adaptive YOLO input size per frame source
+
+Each source runs YOLO on a downscaled copy of its frame. The size is picked
+from the measured detection latency against the target FPS and is stepped up
+when the people in view are small (far from the camera). Boxes are mapped
+back to the full-resolution frame so face crops keep every pixel.
+"""
+
+import time
+import cv2
+
+
+def downscale(frame, imgsz):
+    """Resize so the long side is imgsz; returns (frame, scale) with scale <= 1"""
+    height, width = frame.shape[:2]
+    scale = min(1.0, imgsz / max(height, width))
+    if scale >= 1.0:
+        return frame, 1.0
+
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA), scale
+
+
+def upscale_detections(detections, scale):
+    """Map boxes found on a downscaled frame back to full resolution"""
+    if scale != 1.0 and len(detections) > 0:
+        detections.xyxy = detections.xyxy / scale
+    return detections
+
+
+class AdaptiveResolution:
+    """Chooses the YOLO input size for one source from latency and person size"""
+
+    def __init__(self, sizes=(320, 416, 512, 640), target_fps=30, budget_fraction=0.5,
+                 small_person_ratio=0.2, cooldown=1.0, smoothing=0.2, stale_after=30.0):
+        self.sizes = sorted(sizes)
+        self.index = len(self.sizes) - 1
+        self.frame_budget = budget_fraction / target_fps
+        self.small_person_ratio = small_person_ratio
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+        self.stale_after = stale_after
+
+        self.latency = {}  # {imgsz: (smoothed seconds, measured_at)}
+        self.last_change = 0.0
+
+    @property
+    def imgsz(self):
+        return self.sizes[self.index]
+
+    def fits_budget(self, index, now):
+        """Whether a size is known (or assumed, if not measured recently) to fit the latency budget"""
+        entry = self.latency.get(self.sizes[index])
+        if entry is None or now - entry[1] > self.stale_after:
+            return True
+        return entry[0] <= self.frame_budget
+
+    def record(self, latency, detections, frame_height, now=None):
+        """Feed one measurement and step the size up or down if needed"""
+        now = time.monotonic() if now is None else now
+        size = self.imgsz
+
+        previous = self.latency.get(size)
+        if previous is not None and now - previous[1] <= self.stale_after:
+            latency = previous[0] + self.smoothing * (latency - previous[0])
+        self.latency[size] = (latency, now)
+
+        if now - self.last_change < self.cooldown:
+            return
+
+        people_small = False
+        if len(detections) > 0 and frame_height > 0:
+            heights = detections.xyxy[:, 3] - detections.xyxy[:, 1]
+            people_small = heights.min() / frame_height < self.small_person_ratio
+
+        can_grow = self.index < len(self.sizes) - 1 and self.fits_budget(self.index + 1, now)
+
+        if people_small and can_grow:
+            self.index += 1
+        elif latency > self.frame_budget and self.index > 0:
+            self.index -= 1
+        elif latency < 0.6 * self.frame_budget and can_grow:
+            self.index += 1
+        else:
+            return
+
+        self.last_change = now
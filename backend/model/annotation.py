@@ -0,0 +1,60 @@
+"""
+Annotation layer for published frames
+
+Inference never draws into the camera frame. It produces a structured overlay
+(the `people` list of the frame data: boxes, IDs, emotions and face boxes),
+and the encode stage draws it onto a copy, once per published frame, only for
+clients that asked for annotated frames.
+"""
+
+import cv2
+
+DEFAULT_BOX_COLOR = (0, 255, 0)
+
+EMOTION_COLORS = {
+    'Happy': (0, 255, 255),
+    'Sad': (255, 0, 0),
+    'Angry': (0, 0, 255),
+    'Surprise': (255, 0, 255),
+    'Fear': (128, 0, 128),
+    'Disgust': (0, 128, 0),
+    'Neutral': (200, 200, 200)
+}
+
+
+def draw_label(frame, text, pos, bg_color, text_color=(255, 255, 255)):
+    """Draw text with background"""
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    font_scale = 0.6
+    thickness = 2
+
+    (text_width, text_height), baseline = cv2.getTextSize(text, font, font_scale, thickness)
+
+    x, y = pos
+    cv2.rectangle(frame, (x, y - text_height - 10), (x + text_width + 10, y), bg_color, -1)
+    cv2.putText(frame, text, (x + 5, y - 5), font, font_scale, text_color, thickness)
+
+
+def draw_overlay(frame, people, colors=EMOTION_COLORS):
+    """Return an annotated copy of a frame; the source frame is left untouched"""
+    annotated = frame.copy()
+
+    for person in people:
+        x1, y1, x2, y2 = person['bbox']
+        emotion = person.get('emotion')
+        box_color = colors.get(emotion, DEFAULT_BOX_COLOR) if emotion else DEFAULT_BOX_COLOR
+
+        # Person bounding box and ID
+        cv2.rectangle(annotated, (x1, y1), (x2, y2), box_color, 2)
+        draw_label(annotated, f"ID: {person['id']}", (x1, y1), box_color)
+
+        # Faces that fed the emotion model
+        for fx1, fy1, fx2, fy2 in person.get('faces', []):
+            cv2.rectangle(annotated, (fx1, fy1), (fx2, fy2), box_color, 1)
+
+        # Smoothed emotion
+        if emotion:
+            label = f"{emotion} ({person['confidence'] * 100:.0f}%)"
+            draw_label(annotated, label, (x1, y2 + 5), box_color)
+
+    return annotated
@@ -0,0 +1,111 @@
+"""
+Frames pushed by WebSocket clients from their own cameras
+
+Each connection is a frame source with a tracking session of its own
+(ByteTrack and EmotionTracker), while YOLO runs batched with every other
+source through the broadcaster's shared InferenceScheduler. Only the newest
+frame waiting to be processed is kept; one arriving while another is pending
+replaces it, so a client sending faster than the server keeps up gets fresh
+results instead of a growing queue.
+"""
+
+import base64
+import binascii
+import itertools
+import time
+
+import cv2
+import numpy as np
+
+from model import metrics
+from model.tracking_sessions import SessionClosed
+
+source_numbers = itertools.count(1)
+
+
+class ClientFrameSource:
+    """One client's uploaded frames and the tracking state that follows them"""
+
+    def __init__(self, broadcaster, max_frame_bytes=2 * 1024 * 1024):
+        self.broadcaster = broadcaster
+        self.max_frame_bytes = max_frame_bytes
+        self.source_id = f'client:{next(source_numbers)}'
+        self.pending = None  # (seq, data, received_at), newest only
+        self.received = 0
+        self.replaced = 0
+        self.rejected = 0
+        self.processed = 0
+
+    def open(self):
+        """Open a tracking session on the shared inference scheduler"""
+        self.broadcaster.add_client_source(self)
+
+    def close(self):
+        self.pending = None
+        self.broadcaster.remove_client_source(self)
+
+    # ----------------------------------------
+    # Backpressure
+    # ----------------------------------------
+
+    def offer(self, data, seq=None):
+        """Keep a received frame (raw bytes or base64) as the next one to process; False if rejected"""
+        self.received += 1
+        if len(data) > self.max_frame_bytes:
+            self.rejected += 1
+            return False
+
+        if self.pending is not None:
+            self.replaced += 1
+            metrics.DROPPED_UPLOAD.inc()
+
+        self.pending = (self.received if seq is None else seq, data, time.monotonic())
+        return True
+
+    def take(self):
+        """The newest pending frame, or None"""
+        pending, self.pending = self.pending, None
+        return pending
+
+    # ----------------------------------------
+    # Processing (runs on a worker thread)
+    # ----------------------------------------
+
+    def decode(self, data):
+        if isinstance(data, str):
+            if data.startswith('data:'):
+                data = data.split(',', 1)[-1]
+            try:
+                data = base64.b64decode(data, validate=True)
+            except (binascii.Error, ValueError):
+                return None
+
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    def process(self, pending):
+        """Detect and track people in one uploaded frame; returns the metadata sent back (None once closed)"""
+        seq, data, received_at = pending
+        started_at = time.monotonic()
+
+        frame = self.decode(data)
+        if frame is None:
+            self.rejected += 1
+            return {'seq': seq, 'error': 'Unsupported or corrupt image'}
+
+        try:
+            _, frame_data = self.broadcaster.process_frame(frame, source_id=self.source_id)
+        except SessionClosed:
+            return None  # The connection ended while the frame waited for a worker
+        self.processed += 1
+        finished_at = time.monotonic()
+
+        return {
+            'seq': seq,
+            'emotions': sorted(frame_data['people'], key=lambda x: x['id']),
+            'active_tracks': self.broadcaster.active_tracks(self.source_id),
+            'queue_ms': (started_at - received_at) * 1000,
+            'processing_ms': (finished_at - started_at) * 1000,
+            'dropped': self.replaced,
+            'quality_tier': self.broadcaster.load_shedding.tier_name,
+            'timestamp': time.time(),
+        }
@@ -2,7 +2,7 @@
 FastAPI WebSocket Emotion Detection Integration
 
 Split into two files:
-1. emotion_detector.py - This file (camera + detection logic)
+1. emotion_detector.py - This file (frame sources + detection logic)
 2. fastapi_router.py - Your FastAPI router (imports from this)
 """
 
@@ -12,10 +12,33 @@ from torchvision import models, transforms
 from ultralytics import YOLO
 import supervision as sv
 import cv2
+import numpy as np
 from collections import defaultdict, deque
 import time
 import base64
-from threading import Thread, Lock
+import asyncio
+from threading import Thread, Lock, RLock, Event, local
+from model.inference_scheduler import InferenceScheduler, YoloDetector
+from model.inference_workers import InferenceWorkerPool
+from model.adaptive_resolution import AdaptiveResolution
+from model.annotation import EMOTION_COLORS, draw_overlay
+from model.stream_profiles import STREAM_PROFILES, encode_profile
+from model import metrics
+from model.frame_trace import FrameTrace, TraceBuffer, TraceStats
+from model.tracking_sessions import TrackingSessionManager, SessionClosed
+from model.load_shedding import LoadSheddingController
+from model.frame_sources import create_frame_source, SessionRecorder
+from model.reidentification import ReIdentifier
+
+# ============================================
+# SETTINGS
+# ============================================
+
+
+def get_settings():
+    """App settings, imported lazily because app.main imports this module through its routers"""
+    from app.core.settings import settings
+    return settings
 
 # ============================================
 # MODEL DEFINITIONS
@@ -55,11 +78,15 @@ class EmotionTracker:
         self.emotion_history = defaultdict(deque)
         self.current_emotions = {}
         self.last_seen = {}
+        self.reused = {}  # {tracker_id: frames in a row its settled emotion was reused}
+        self.distributions = {}  # {tracker_id: {emotion: probability}} of the latest detection
 
-    def add_detection(self, tracker_id, emotion, confidence, current_time):
-        """Add a new emotion detection for a tracked person"""
+    def add_detection(self, tracker_id, emotion, confidence, current_time, distribution=None):
+        """Add a new emotion detection for a tracked person (with the model's full distribution, if known)"""
         self.emotion_history[tracker_id].append((current_time, emotion, confidence))
         self.last_seen[tracker_id] = current_time
+        if distribution is not None:
+            self.distributions[tracker_id] = distribution
 
         # Clean old detections
         cutoff_time = current_time - self.window_seconds
@@ -98,20 +125,53 @@ class EmotionTracker:
 
         return best_emotion, avg_confidence
 
+    def reuse_settled(self, tracker_id, current_time, max_reuse, min_confidence=0.6, min_samples=5):
+        """Whether to skip inference this frame and keep the smoothed emotion (at most max_reuse frames in a row)"""
+        current = self.current_emotions.get(tracker_id)
+        settled = (current is not None and current[1] >= min_confidence and
+                   len(self.emotion_history.get(tracker_id, ())) >= min_samples)
+
+        if not settled or self.reused.get(tracker_id, 0) >= max_reuse:
+            self.reused[tracker_id] = 0
+            return False
+
+        self.reused[tracker_id] = self.reused.get(tracker_id, 0) + 1
+        self.last_seen[tracker_id] = current_time
+        return True
+
+    def release(self, tracker_id):
+        """Forget a tracked person; returns their (history, current emotion) state, or None if unknown"""
+        if tracker_id not in self.last_seen:
+            return None
+
+        history = self.emotion_history.pop(tracker_id, deque())
+        current = self.current_emotions.pop(tracker_id, None)
+        del self.last_seen[tracker_id]
+        self.reused.pop(tracker_id, None)
+        self.distributions.pop(tracker_id, None)
+        return history, current
+
+    def adopt(self, tracker_id, state, current_time):
+        """Continue a released person's history under tracker_id (a re-identified returning person)"""
+        history, _ = state
+        if history:
+            # Time away doesn't count: the old detections end where the new ones begin
+            shift = current_time - history[-1][0]
+            merged = [(timestamp + shift, emotion, confidence) for timestamp, emotion, confidence in history]
+            merged.extend(self.emotion_history.get(tracker_id, ()))
+            self.emotion_history[tracker_id] = deque(sorted(merged, key=lambda detection: detection[0]))
+
+        self.current_emotions.pop(tracker_id, None)
+        self.last_seen[tracker_id] = current_time
+
     def cleanup_old_trackers(self, current_time, timeout=10.0):
-        """Remove trackers not seen in timeout seconds"""
+        """Remove trackers not seen in timeout seconds; returns {tracker_id: state} of the removed ones"""
         to_remove = []
         for tracker_id, last_time in self.last_seen.items():
             if current_time - last_time > timeout:
                 to_remove.append(tracker_id)
 
-        for tracker_id in to_remove:
-            if tracker_id in self.emotion_history:
-                del self.emotion_history[tracker_id]
-            if tracker_id in self.current_emotions:
-                del self.current_emotions[tracker_id]
-            if tracker_id in self.last_seen:
-                del self.last_seen[tracker_id]
+        return {tracker_id: self.release(tracker_id) for tracker_id in to_remove}
 
 # ============================================
 # FRAME BROADCASTER - SINGLETON
@@ -134,68 +194,127 @@ class EmotionDetectionBroadcaster:
             return
 
         self.clients = set()
+        self.subscribers = []  # Callbacks fed each frame's data from the detection thread
         self.current_frame = None
-        self.current_data = None  # Store emotion data
+        self.current_data = None  # Store emotion data (also the overlay to draw)
+        self.frame_seq = 0
         self.frame_lock = Lock()
+        self.encoded_cache = {}  # {(annotated, profile): (frame_seq, jpg_base64)}
+        self.annotated_cache = (None, None)  # (frame_seq, annotated frame)
+        self.encode_lock = Lock()
+        self.traces = TraceBuffer()  # Recent frames' FrameTrace by sequence number
+        self.trace_stats = TraceStats()
         self.running = False
         self.detection_thread = None
+        self.stop_event = None  # Set to end the current detection run
+        self.state_lock = RLock()  # Serializes start/stop (event loop, upload workers)
+        self.lifecycle_lock = asyncio.Lock()  # Serializes client arrivals and departures
+        self.shutdown_task = None  # Pending stop once the grace period after the last client ends
+        self.load_shedding = LoadSheddingController()  # Replaced by one configured from settings on load
+        self.started_at = None
+        self.publish_times = deque(maxlen=300)  # Monotonic times of recently published frames
+        self.client_sources = set()  # ClientFrameSource of every client uploading its own frames
+        self.load_lock = Lock()
+        self.thread_state = local()  # Per-thread face cascade (upload workers run alongside the camera)
 
         # Models (lazy loaded)
         self.yolo_model = None
-        self.tracker = None
+        self.inference_scheduler = None
+        self.source_id = 'camera:0'
+        self.sessions = None  # Tracker state per frame source (TrackingSessionManager)
         self.face_cascade = None
         self.emotion_model = None
         self.emotion_transform = None
-        self.emotion_tracker = None
         self.device = None
 
         self.emotions = ['Angry', 'Disgust', 'Fear', 'Happy', 'Sad', 'Surprise', 'Neutral']
-        self.emotion_colors = {
-            'Happy': (0, 255, 255),
-            'Sad': (255, 0, 0),
-            'Angry': (0, 0, 255),
-            'Surprise': (255, 0, 255),
-            'Fear': (128, 0, 128),
-            'Disgust': (0, 128, 0),
-            'Neutral': (200, 200, 200)
-        }
+        self.emotion_colors = EMOTION_COLORS
+
+        metrics.CONNECTED_CLIENTS.set_function(lambda: len(self.clients))
+        metrics.CLIENT_SOURCES.set_function(lambda: len(self.client_sources))
+        metrics.QUALITY_TIER.set_function(lambda: self.load_shedding.tier)
+        metrics.PIPELINE_LOAD.set_function(lambda: self.load_shedding.load)
 
         self._initialized = True
 
     def load_models(self):
-        """Load all models (call once)"""
-        if self.yolo_model is not None:
-            return
+        """Load all models (call once; client sources may call it from worker threads)"""
+        with self.load_lock:
+            if self.inference_scheduler is None:
+                self._load_models()
 
+    def _load_models(self):
         print("Loading models...")
-
-        # YOLO
-        self.yolo_model = YOLO('yolov8n.pt')
+        settings = get_settings()
+
+        # YOLO, either here or in worker processes
+        load_start = time.perf_counter()
+        if settings.inference_process_workers:
+            workers = settings.inference_process_workers if settings.inference_process_workers > 0 else None
+            detector = InferenceWorkerPool(
+                workers=workers,
+                model_path='yolov8n.pt',
+                conf=0.5,
+                max_batch_size=settings.yolo_batch_max_size
+            )
+            detector.start()
+            for index, seconds in detector.load_times.items():
+                metrics.MODEL_LOAD_SECONDS.labels(f'yolo_worker_{index}').set(seconds)
+        else:
+            self.yolo_model = YOLO('yolov8n.pt')
+            detector = YoloDetector(self.yolo_model, conf=0.5)
+        metrics.MODEL_LOAD_SECONDS.labels('yolo').set(time.perf_counter() - load_start)
         print("✓ YOLO loaded")
 
-        # Tracker
-        self.tracker = sv.ByteTrack(
-            track_activation_threshold=0.4,
-            lost_track_buffer=90,
-            minimum_matching_threshold=0.7,
-            minimum_consecutive_frames=3,
-            frame_rate=30
+        # Batched inference shared by all frame sources
+        self.inference_scheduler = InferenceScheduler(
+            detector,
+            max_batch_size=settings.yolo_batch_max_size,
+            max_wait_ms=settings.yolo_batch_max_wait_ms
+        )
+
+        # Trackers, one session per frame source while it runs
+        self.sessions = TrackingSessionManager(
+            self,
+            idle_timeout=settings.tracking_session_idle_s,
+            pressure_idle_timeout=settings.tracking_session_pressure_idle_s,
+            memory_limit_mb=settings.tracking_session_memory_limit_mb,
+            memory_percent_limit=settings.tracking_session_memory_percent
+        )
+        print("✓ ByteTrack sessions ready")
+
+        # Quality tiers to fall back on when a pipeline stage is busy nearly all the time
+        self.load_shedding = LoadSheddingController(
+            high_watermark=settings.load_shedding_high,
+            low_watermark=settings.load_shedding_low,
+            down_after=settings.load_shedding_down_after_s,
+            up_after=settings.load_shedding_up_after_s,
+            capacity={'upload': settings.upload_workers},
+            max_tier=settings.load_shedding_max_tier,
+            enabled=settings.load_shedding,
+            imgsz=settings.load_shedding_imgsz,
+            quality_factor=settings.load_shedding_quality_factor,
+            fps_factor=settings.load_shedding_fps_factor
         )
-        print("✓ ByteTrack tracker loaded")
+        self.inference_scheduler.imgsz_cap = lambda: self.load_shedding.max_imgsz
 
-        # Face detector
+        # Face detector (each processing thread gets its own copy through get_face_cascade)
+        load_start = time.perf_counter()
         self.face_cascade = cv2.CascadeClassifier(
             cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
         )
+        metrics.MODEL_LOAD_SECONDS.labels('haar').set(time.perf_counter() - load_start)
         print("✓ Face detector loaded")
 
         # Emotion model
+        load_start = time.perf_counter()
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         self.emotion_model = create_emotion_model(num_classes=7).to(self.device)
 
         checkpoint = torch.load('best_emotion_model.pth', map_location=self.device)
         self.emotion_model.load_state_dict(checkpoint['model_state_dict'])
         self.emotion_model.eval()
+        metrics.MODEL_LOAD_SECONDS.labels('emotion').set(time.perf_counter() - load_start)
         print(f"✓ Emotion model loaded (Best acc: {checkpoint['best_acc']:.2f}%)")
 
         # Transform
@@ -207,61 +326,140 @@ class EmotionDetectionBroadcaster:
             transforms.Normalize(mean=[0.5], std=[0.5])
         ])
 
-        # Emotion tracker
-        self.emotion_tracker = EmotionTracker(window_seconds=5, update_interval=1.0)
-
         print(f"✓ Using device: {self.device}")
 
+    def create_tracker(self):
+        """Create a ByteTrack instance for one frame source"""
+        return sv.ByteTrack(
+            track_activation_threshold=0.4,
+            lost_track_buffer=90,
+            minimum_matching_threshold=0.7,
+            minimum_consecutive_frames=3,
+            frame_rate=30
+        )
+
+    def create_emotion_tracker(self):
+        """Create the emotion history of one frame source"""
+        return EmotionTracker(window_seconds=5, update_interval=1.0)
+
+    def create_reidentifier(self, emotion_tracker):
+        """Create the face re-identification index of one frame source (None when disabled)"""
+        settings = get_settings()
+        if not settings.reid:
+            return None
+
+        return ReIdentifier(
+            emotion_tracker,
+            max_entries=settings.reid_max_entries,
+            ttl=settings.reid_ttl_s,
+            threshold=settings.reid_similarity
+        )
+
+    def get_face_cascade(self):
+        """Haar face detector for the calling thread (a CascadeClassifier must not be shared between threads)"""
+        cascade = getattr(self.thread_state, 'face_cascade', None)
+        if cascade is None:
+            cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+            self.thread_state.face_cascade = cascade
+        return cascade
+
+    def create_resolution(self):
+        """Create the adaptive YOLO input size controller for one source (None when disabled)"""
+        settings = get_settings()
+        if not settings.adaptive_resolution:
+            return None
+
+        return AdaptiveResolution(
+            sizes=settings.adaptive_resolution_sizes,
+            target_fps=settings.target_fps
+        )
+
     def get_emotion(self, face_image):
         """Predict emotion from face image"""
-        if face_image.size == 0:
+        result = self.infer_emotions([face_image])[0]
+        if result is None:
             return None, 0.0
 
+        probabilities, _ = result
+        predicted = int(np.argmax(probabilities))
+        return self.emotions[predicted], float(probabilities[predicted])
+
+    def infer_emotions(self, face_images):
+        """Emotion probabilities and hidden activation of each face image, in one batched forward pass
+
+        Returns a (probabilities, hidden) pair of numpy arrays per image, or None
+        for an image that couldn't be processed. hidden is the classifier's
+        256-d penultimate activation (what re-identification compares).
+        """
+        results = [None] * len(face_images)
+        tensors, indices = [], []
+        for index, face_image in enumerate(face_images):
+            if face_image.size == 0:
+                continue
+            try:
+                tensors.append(self.emotion_transform(face_image))
+                indices.append(index)
+            except Exception as e:
+                continue
+
+        if not tensors:
+            return results
+
         try:
-            face_tensor = self.emotion_transform(face_image).unsqueeze(0).to(self.device)
+            batch = torch.stack(tensors).to(self.device)
 
             with torch.no_grad():
-                output = self.emotion_model(face_tensor)
+                # MobileNetV2.forward, split after the classifier's hidden layer
+                features = self.emotion_model.features(batch)
+                features = torch.flatten(nn.functional.adaptive_avg_pool2d(features, 1), 1)
+                hidden = self.emotion_model.classifier[:3](features)
+                output = self.emotion_model.classifier[3:](hidden)
                 probabilities = torch.nn.functional.softmax(output, dim=1)
-                confidence, predicted = torch.max(probabilities, 1)
 
-            emotion_label = self.emotions[predicted.item()]
-            confidence_score = confidence.item()
-
-            return emotion_label, confidence_score
+            probabilities = probabilities.cpu().numpy()
+            hidden = hidden.cpu().numpy()
 
         except Exception as e:
-            return None, 0.0
-
-    def draw_label(self, frame, text, pos, bg_color, text_color=(255, 255, 255)):
-        """Draw text with background"""
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        font_scale = 0.6
-        thickness = 2
-
-        (text_width, text_height), baseline = cv2.getTextSize(text, font, font_scale, thickness)
-
-        x, y = pos
-        cv2.rectangle(frame, (x, y - text_height - 10), (x + text_width + 10, y), bg_color, -1)
-        cv2.putText(frame, text, (x + 5, y - 5), font, font_scale, text_color, thickness)
-
-    def process_frame(self, frame):
-        """Process a single frame and return annotated frame"""
+            return results
+
+        metrics.EMOTION_BATCH_SIZE.observe(len(indices))
+        for row, index in enumerate(indices):
+            results[index] = (probabilities[row], hidden[row])
+        return results
+
+    def process_frame(self, frame, trace=None, source_id=None):
+        """Process a single frame and return it untouched with its detection data (marking its trace if given)
+
+        Frames of the camera by default; client sources pass their own source_id.
+        """
+        process_start = time.perf_counter()
+        with self.sessions.use(source_id or self.source_id) as session:
+            result = self.process_session_frame(session, frame, trace)
+        # The camera loop and the upload workers are separate stages: one thread against a pool
+        stage = 'process' if source_id in (None, self.source_id) else 'upload'
+        self.load_shedding.observe(stage, time.perf_counter() - process_start)
+        return result
+
+    def process_session_frame(self, session, frame, trace=None):
+        """process_frame with the source's tracking session already in hand"""
         current_time = time.time()
+        source_id = session.source_id
+        emotion_tracker = session.emotion_tracker
+        reid = session.reid
+        face_cascade = self.get_face_cascade()
+        shedding = self.load_shedding
 
         # Store detection results for this frame
         frame_data = {
             'people': []
         }
 
-        # Detect people with YOLO
-        results = self.yolo_model(frame, classes=[0], verbose=False, conf=0.5)
-
-        # Convert to Supervision detections
-        detections = sv.Detections.from_ultralytics(results[0])
-
-        # Update tracker
-        detections = self.tracker.update_with_detections(detections)
+        # Detect people with YOLO (batched with other sources) and update this source's tracker
+        detections = self.inference_scheduler.detect(source_id, frame)
+        if trace is not None:
+            trace.mark('detect')
+        present_ids = {int(tracker_id) for tracker_id in detections.tracker_id}
+        pending_faces = []  # (person_data, tracker_id, face box, face crop)
 
         # Process each tracked person
         for i, (xyxy, confidence, class_id, tracker_id) in enumerate(zip(
@@ -282,136 +480,333 @@ class EmotionDetectionBroadcaster:
             if person_crop.size == 0:
                 continue
 
-            # Detect faces
-            gray_person = cv2.cvtColor(person_crop, cv2.COLOR_BGR2GRAY)
-            faces = self.face_cascade.detectMultiScale(
-                gray_person,
-                scaleFactor=1.1,
-                minNeighbors=5,
-                minSize=(30, 30)
-            )
-
             # Get smoothed emotion
-            smoothed_emotion, smoothed_conf = self.emotion_tracker.get_smoothed_emotion(
+            smoothed_emotion, smoothed_conf = emotion_tracker.get_smoothed_emotion(
                 tracker_id, current_time
             )
 
-            # Store person data
+            # Store person data (also the overlay drawn at encode time)
             person_data = {
                 'id': int(tracker_id),
                 'bbox': [x1, y1, x2, y2],
                 'emotion': smoothed_emotion,
                 'confidence': float(smoothed_conf) if smoothed_conf else 0.0,
-                'has_face': len(faces) > 0
+                'has_face': False,
+                'faces': []
             }
 
-            # Determine box color
-            if smoothed_emotion:
-                box_color = self.emotion_colors.get(smoothed_emotion, (0, 255, 0))
-            else:
-                box_color = (0, 255, 0)
-
-            # Draw person bounding box
-            cv2.rectangle(frame, (x1, y1), (x2, y2), box_color, 2)
+            # Under load, a settled emotion is reused for a few frames instead of looking for the face again
+            if shedding.skip_stable_emotions and emotion_tracker.reuse_settled(
+                tracker_id, current_time, shedding.stable_refresh_frames
+            ):
+                person_data['has_face'] = True
+                person_data['emotion_reused'] = True
+                frame_data['people'].append(person_data)
+                continue
 
-            # Draw person ID
-            self.draw_label(frame, f'ID: {tracker_id}', (x1, y1), box_color)
+            # Detect faces
+            haar_start = time.perf_counter()
+            gray_person = cv2.cvtColor(person_crop, cv2.COLOR_BGR2GRAY)
+            faces = face_cascade.detectMultiScale(
+                gray_person,
+                scaleFactor=1.1,
+                minNeighbors=5,
+                minSize=(30, 30)
+            )
+            metrics.HAAR_SECONDS.observe(time.perf_counter() - haar_start)
+            person_data['has_face'] = len(faces) > 0
 
-            # Process faces
+            # Faces are classified together once every person has been looked at
             for (fx, fy, fw, fh) in faces:
-                face_x1 = x1 + fx
-                face_y1 = y1 + fy
-                face_x2 = face_x1 + fw
-                face_y2 = face_y1 + fh
+                face_x1 = int(x1 + fx)
+                face_y1 = int(y1 + fy)
+                face_x2 = int(face_x1 + fw)
+                face_y2 = int(face_y1 + fh)
 
                 # Extract face
                 face_crop = frame[face_y1:face_y2, face_x1:face_x2]
-
-                # Predict emotion
-                raw_emotion, raw_confidence = self.get_emotion(face_crop)
-
-                if raw_emotion:
-                    # Add to tracker history
-                    self.emotion_tracker.add_detection(
-                        tracker_id, raw_emotion, raw_confidence, current_time
-                    )
-
-                    # Draw face rectangle
-                    cv2.rectangle(frame, (face_x1, face_y1), (face_x2, face_y2), box_color, 1)
-
-            # Display smoothed emotion
-            if smoothed_emotion:
-                label = f'{smoothed_emotion} ({smoothed_conf * 100:.0f}%)'
-                self.draw_label(frame, label, (x1, y2 + 5), box_color)
+                pending_faces.append((person_data, tracker_id, [face_x1, face_y1, face_x2, face_y2], face_crop))
 
             frame_data['people'].append(person_data)
 
-        # Cleanup old trackers
-        self.emotion_tracker.cleanup_old_trackers(current_time, timeout=10.0)
-
-        return frame, frame_data
-
-    def detection_loop(self):
-        """Main detection loop running in separate thread"""
-        cap = cv2.VideoCapture(0)
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-
-        if not cap.isOpened():
-            print("Error: Could not open camera")
-            return
-
-        print("✓ Camera opened")
+        # Predict emotions of every face in the frame in one batch
+        inferences = []
+        if pending_faces:
+            emotion_start = time.perf_counter()
+            inferences = self.infer_emotions([face_crop for *_, face_crop in pending_faces])
+            metrics.EMOTION_SECONDS.observe(time.perf_counter() - emotion_start)
 
-        while self.running:
-            ret, frame = cap.read()
-            if not ret:
+        for (person_data, tracker_id, face_box, _), inference in zip(pending_faces, inferences):
+            if inference is None:
                 continue
+            probabilities, embedding = inference
+
+            # Someone back under a new ID picks up their history before this detection joins it
+            if reid is not None:
+                previous = reid.observe(int(tracker_id), embedding, current_time, present_ids)
+                if previous is not None:
+                    person_data['reidentified_from'] = previous
+                    smoothed_emotion, smoothed_conf = emotion_tracker.get_smoothed_emotion(
+                        tracker_id, current_time
+                    )
+                    person_data['emotion'] = smoothed_emotion
+                    person_data['confidence'] = float(smoothed_conf) if smoothed_conf else 0.0
+
+            # Add to tracker history
+            predicted = int(np.argmax(probabilities))
+            emotion_tracker.add_detection(
+                tracker_id, self.emotions[predicted], float(probabilities[predicted]), current_time,
+                distribution=dict(zip(self.emotions, probabilities.tolist()))
+            )
+            person_data['faces'].append(face_box)
+
+        # Latest full distribution of everyone with one (reused emotions keep the last)
+        for person_data in frame_data['people']:
+            distribution = emotion_tracker.distributions.get(person_data['id'])
+            if distribution is not None:
+                person_data['probabilities'] = {
+                    emotion: round(probability, 4) for emotion, probability in distribution.items()
+                }
+
+        # Cleanup old trackers (re-identification keeps their history a while longer)
+        removed = emotion_tracker.cleanup_old_trackers(current_time, timeout=10.0)
+        if reid is not None:
+            reid.retire(removed)
+        if source_id == self.source_id:
+            metrics.ACTIVE_TRACKS.set(len(emotion_tracker.last_seen))
+        if trace is not None:
+            trace.mark('emotion')
 
-            # Process frame (returns frame + data)
-            processed_frame, frame_data = self.process_frame(frame)
-
-            # Update current frame and data
-            with self.frame_lock:
-                self.current_frame = processed_frame
-                self.current_data = frame_data
+        return frame, frame_data
 
-            time.sleep(0.033)  # ~30 fps
+    def create_frame_source(self, stop_event):
+        """Frame source picked by the frame_source setting (the camera by default)"""
+        settings = get_settings()
+        return create_frame_source(
+            settings.frame_source,
+            speed=settings.frame_source_speed,
+            loop=settings.frame_source_loop,
+            seed=settings.frame_source_seed,
+            stop_event=stop_event
+        )
 
-        cap.release()
-        print("Camera closed")
+    def detection_loop(self, stop_event):
+        """Main detection loop running in separate thread, until stop_event is set"""
+        source = self.create_frame_source(stop_event)
+        record_dir = get_settings().record_session_dir
+        recorder = SessionRecorder(record_dir) if record_dir else None
+        try:
+            if not source.open():
+                print(f"Error: Could not open frame source {source.name}")
+                return
+
+            print(f"✓ Frame source opened: {source.name}")
+
+            while not stop_event.is_set():
+                capture_start = time.perf_counter()
+                frame = source.read()
+                if frame is None:
+                    if source.exhausted:
+                        print(f"Frame source {source.name} finished")
+                        break
+                    metrics.DROPPED_CAPTURE.inc()
+                    stop_event.wait(0.01)
+                    continue
+                metrics.CAPTURE_SECONDS.observe(time.perf_counter() - capture_start)
+
+                # This loop is the only publisher, so the next sequence number is known up front
+                trace = FrameTrace(self.frame_seq + 1, time.monotonic())
+                if recorder:
+                    recorder.record(frame, trace.captured_at)
+
+                # Process frame (returns frame + data)
+                process_start = time.perf_counter()
+                try:
+                    processed_frame, frame_data = self.process_frame(frame, trace)
+                except SessionClosed:
+                    break  # The session or the scheduler closed while this frame waited
+                metrics.PROCESS_SECONDS.observe(time.perf_counter() - process_start)
+                metrics.FRAMES_PROCESSED.inc()
+
+                # Published frames are shared by reference, so freeze them
+                processed_frame.flags.writeable = False
+
+                # Update current frame and data
+                self.traces.add(trace)
+                with self.frame_lock:
+                    self.current_frame = processed_frame
+                    self.current_data = frame_data
+                    self.frame_seq += 1
+
+                trace.mark('publish')
+                self.trace_stats.record_frame(trace)
+                self.publish_times.append(trace.marks[-1][1])
+
+                self.notify_subscribers(frame_data)
+
+                # ~30 fps from the camera, less when shedding load; other sources keep their own pace
+                delay = self.load_shedding.frame_interval(0.033)
+                if source.paces_itself:
+                    delay -= 0.033
+                if delay > 0:
+                    stop_event.wait(delay)
+        finally:
+            # Whatever ends the loop, the camera is given back
+            source.close()
+            if recorder:
+                recorder.close()
+            print(f"Frame source {source.name} closed")
 
     def start(self):
         """Start the detection system"""
-        if self.running:
-            return
-
-        self.load_models()
-        self.running = True
-        self.detection_thread = Thread(target=self.detection_loop, daemon=True)
-        self.detection_thread.start()
-        print("✓ Detection system started")
+        with self.state_lock:
+            if self.running:
+                return
+
+            # A previous run that outlived stop() still holds the camera
+            stop_timeout = get_settings().detection_stop_timeout_s
+            if self.detection_thread is not None and self.detection_thread.is_alive():
+                self.detection_thread.join(timeout=stop_timeout)
+
+            self.load_models()
+            self.inference_scheduler.start()
+            self.sessions.open(self.source_id)  # Fresh tracker IDs and history for this run
+            self.started_at = time.monotonic()
+            self.publish_times.clear()
+            self.running = True
+            self.stop_event = Event()
+            self.detection_thread = Thread(target=self.detection_loop, args=(self.stop_event,), daemon=True)
+            self.detection_thread.start()
+            print("✓ Detection system started")
 
     def stop(self):
-        """Stop the detection system"""
-        self.running = False
-        if self.detection_thread:
-            self.detection_thread.join(timeout=2)
-
-    def get_current_frame_base64(self):
-        """Get current frame as base64 JPEG"""
+        """Stop the detection system, waiting for the camera to be released"""
+        with self.state_lock:
+            self.running = False
+            if self.stop_event is not None:
+                self.stop_event.set()
+
+            if self.detection_thread:
+                self.detection_thread.join(timeout=get_settings().detection_stop_timeout_s)
+                if self.detection_thread.is_alive():
+                    print("Warning: detection thread still busy; it closes the camera when its frame is done")
+
+            if self.sessions:
+                self.sessions.close(self.source_id, final=True)
+            self.stop_inference_if_idle()
+
+    def shutdown(self):
+        """Stop everything and release the models' resources (application exit)"""
+        with self.state_lock:
+            self.stop()
+            for source in list(self.client_sources):
+                self.remove_client_source(source)
+            if self.sessions:
+                self.sessions.stop()
+            if self.inference_scheduler:
+                self.inference_scheduler.stop()
+                self.inference_scheduler.detector.close()
+
+    def start_inference(self):
+        """Load the models and start batched inference, without the camera (for client sources)"""
+        with self.state_lock:
+            self.load_models()
+            self.inference_scheduler.start()
+
+    def stop_inference_if_idle(self):
+        """Stop batched inference once neither the camera nor any client source needs it"""
+        with self.state_lock:
+            if self.inference_scheduler and not self.running and not self.client_sources:
+                self.inference_scheduler.stop()
+
+    def add_client_source(self, source):
+        """Give a client's uploaded frames their own tracking session on the shared scheduler"""
+        with self.state_lock:
+            self.start_inference()
+            self.sessions.open(source.source_id)
+            self.client_sources.add(source)
+        print(f"Client source {source.source_id} added. Total client sources: {len(self.client_sources)}")
+
+    def remove_client_source(self, source):
+        with self.state_lock:
+            self.client_sources.discard(source)
+            if self.sessions:
+                self.sessions.close(source.source_id, final=True)
+            self.stop_inference_if_idle()
+        print(f"Client source {source.source_id} removed. Total client sources: {len(self.client_sources)}")
+
+    def get_current_frame(self):
+        """Get the latest raw frame (read-only, shared) with its data and sequence number"""
         with self.frame_lock:
-            if self.current_frame is None:
-                return None
-
-            frame = self.current_frame.copy()
-
-        # Encode as JPEG
-        _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-        jpg_base64 = base64.b64encode(buffer).decode('utf-8')
+            return self.current_frame, self.current_data, self.frame_seq
+
+    def get_current_frame_base64(self, annotated=True, profile='full'):
+        """Get current frame as base64 JPEG, drawing and encoding each profile at most once per published frame"""
+        frame, data, seq = self.get_current_frame()
+        if frame is None:
+            return None
+
+        with self.encode_lock:
+            cached = self.encoded_cache.get((annotated, profile))
+            if cached and cached[0] == seq:
+                return cached[1]
+
+            draw_seconds = 0.0
+            if annotated:
+                if self.annotated_cache[0] != seq:
+                    draw_start = time.perf_counter()
+                    self.annotated_cache = (seq, draw_overlay(frame, data['people'], self.emotion_colors))
+                    draw_seconds = time.perf_counter() - draw_start
+                    metrics.DRAW_SECONDS.observe(draw_seconds)
+                frame = self.annotated_cache[1]
+
+            # Encode as JPEG at the profile's resolution and quality (lowered when shedding load)
+            stream_profile = STREAM_PROFILES[profile]
+            stream_profile = stream_profile._replace(quality=self.load_shedding.jpeg_quality(stream_profile.quality))
+            encode_start = time.perf_counter()
+            buffer = encode_profile(frame, stream_profile)
+            jpg_base64 = base64.b64encode(buffer).decode('utf-8')
+            encode_seconds = time.perf_counter() - encode_start
+            self.load_shedding.observe('encode', draw_seconds + encode_seconds)
+
+            metrics.ENCODE_SECONDS.observe(encode_seconds)
+            trace = self.traces.get(seq)
+            if trace is not None:
+                self.trace_stats.record_encode(trace, profile, encode_seconds)
+
+            self.encoded_cache[(annotated, profile)] = (seq, jpg_base64)
 
         return jpg_base64
 
+    def active_tracks(self, source_id=None):
+        """People followed by a source's emotion tracker (the camera by default)"""
+        session = self.sessions.get(source_id or self.source_id) if self.sessions else None
+        return len(session.emotion_tracker.last_seen) if session else 0
+
+    def get_trace(self, seq):
+        """Trace of a recently published frame, or None once it has aged out"""
+        return self.traces.get(seq)
+
+    def get_pipeline_state(self, fps_window=2.0):
+        """Snapshot of the detection pipeline for health checks"""
+        now = time.monotonic()
+        publish_times = list(self.publish_times)
+        recent = [t for t in publish_times if now - t <= fps_window]
+        scheduler = self.inference_scheduler
+
+        return {
+            'running': self.running,
+            'models_loaded': scheduler is not None and self.emotion_model is not None,
+            'detection_thread_alive': self.detection_thread is not None and self.detection_thread.is_alive(),
+            'seconds_since_start': now - self.started_at if self.started_at is not None else None,
+            'seconds_since_last_frame': now - publish_times[-1] if publish_times else None,
+            'fps': len(recent) / fps_window,
+            'backlog': len(scheduler.pending) if scheduler is not None else 0,
+            'clients': len(self.clients),
+            'sessions': len(self.sessions.sessions) if self.sessions else 0,
+            'quality_tier': self.load_shedding.tier_name,
+        }
+
     def get_current_data(self):
         """Get current emotion data for all tracked people"""
         with self.frame_lock:
@@ -421,15 +816,66 @@ class EmotionDetectionBroadcaster:
             # Return a copy to avoid threading issues
             return {'people': self.current_data['people'][:]}
 
+    def subscribe(self, callback):
+        """Call callback(frame_data) for every processed frame (on the detection thread; keep it cheap)"""
+        if callback not in self.subscribers:
+            self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """Stop feeding frame data to a callback"""
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def notify_subscribers(self, frame_data):
+        """Hand the latest frame data to every subscriber"""
+        for callback in list(self.subscribers):
+            try:
+                callback(frame_data)
+            except Exception as e:
+                print(f"Subscriber error: {e}")
+
+    # ----------------------------------------
+    # Client lifecycle (event loop)
+    # ----------------------------------------
+
     async def register_client(self, websocket):
-        """Register a WebSocket client"""
-        self.clients.add(websocket)
-        print(f"Client connected. Total clients: {len(self.clients)}")
-
-    def unregister_client(self, websocket):
-        """Unregister a WebSocket client"""
-        self.clients.discard(websocket)
-        print(f"Client disconnected. Total clients: {len(self.clients)}")
+        """Register a WebSocket client, starting detection for the first one"""
+        async with self.lifecycle_lock:
+            # Back within the grace period: the camera never closed
+            if self.shutdown_task is not None:
+                self.shutdown_task.cancel()
+                self.shutdown_task = None
+
+            self.clients.add(websocket)
+            print(f"Client connected. Total clients: {len(self.clients)}")
+
+            if not self.running:
+                print("First client connected - starting detection system...")
+                try:
+                    await asyncio.get_running_loop().run_in_executor(None, self.start)
+                except Exception:
+                    self.clients.discard(websocket)
+                    raise
+
+    async def unregister_client(self, websocket):
+        """Unregister a WebSocket client; detection stops once nobody is back within the grace period"""
+        async with self.lifecycle_lock:
+            self.clients.discard(websocket)
+            print(f"Client disconnected. Total clients: {len(self.clients)}")
+
+            if not self.clients and self.running and self.shutdown_task is None:
+                self.shutdown_task = asyncio.create_task(self.stop_after_grace_period())
+
+    async def stop_after_grace_period(self):
+        await asyncio.sleep(get_settings().detection_grace_period_s)
+
+        async with self.lifecycle_lock:
+            self.shutdown_task = None
+            if self.clients or not self.running:
+                return
+
+            print("Last client disconnected - stopping detection system...")
+            await asyncio.get_running_loop().run_in_executor(None, self.stop)
 
 
 # ============================================
@@ -0,0 +1,325 @@
+"""
+Where the detection loop gets its frames
+
+    camera[:index]        a local webcam (the default)
+    video:<path>          a video file, at its own frame rate or faster
+    replay:<directory>    a session recorded by SessionRecorder, with its original timing or faster
+    synthetic[:people]    generated frames with people moving about; no camera or files needed
+
+Everything but the camera paces itself: speed=1 plays at the original rate
+(skipping frames when processing falls behind, as a live camera would),
+speed=2 twice as fast and speed=0 as fast as frames can be processed, with
+none skipped. A fixed recording played at speed 0 makes the same work on
+every run, so the whole pipeline can be measured headless and compared
+between runs.
+"""
+
+import json
+import os
+import queue
+import time
+from threading import Event, Thread
+
+import cv2
+import numpy as np
+
+
+class FrameSource:
+    """Base class: open(), then read() until it returns None with exhausted set, then close()"""
+
+    paces_itself = True
+    name = 'source'
+
+    def __init__(self, speed=1.0, stop_event=None):
+        self.speed = speed
+        self.stop_event = stop_event or Event()  # Interrupts pacing waits when the pipeline stops
+        self.exhausted = False
+        self.skipped = 0  # Frames dropped to keep real-time pacing
+        self.started_at = None
+
+    def open(self):
+        return True
+
+    def read(self):
+        """Next frame, or None (no frame right now, or no more frames once exhausted is set)"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    # ----------------------------------------
+    # Pacing
+    # ----------------------------------------
+
+    def restart_clock(self):
+        self.started_at = time.monotonic()
+
+    def lateness(self, offset):
+        """Seconds past the time a frame at offset (in source time) is due; negative when early"""
+        if self.speed <= 0:
+            return 0.0
+        if self.started_at is None:
+            self.restart_clock()
+        return time.monotonic() - (self.started_at + offset / self.speed)
+
+    def wait_until(self, offset):
+        lateness = self.lateness(offset)
+        if lateness < 0:
+            self.stop_event.wait(-lateness)
+
+
+class CameraSource(FrameSource):
+    """A local webcam through OpenCV"""
+
+    paces_itself = False
+
+    def __init__(self, index=0, width=640, height=480, **kwargs):
+        super().__init__(**kwargs)
+        self.index = index
+        self.width = width
+        self.height = height
+        self.name = f'camera:{index}'
+        self.cap = None
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.index)
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        return self.cap.isOpened()
+
+    def read(self):
+        ret, frame = self.cap.read()
+        return frame if ret else None
+
+    def close(self):
+        if self.cap is not None:
+            self.cap.release()
+
+
+class VideoFileSource(FrameSource):
+    """A video file, paced by its own frame rate"""
+
+    def __init__(self, path, loop=True, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.loop = loop
+        self.name = f'video:{path}'
+        self.cap = None
+        self.fps = 30.0
+        self.position = 0  # Frames into the current pass
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.path)
+        if not self.cap.isOpened():
+            return False
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        return True
+
+    def read(self):
+        # Behind schedule: skip frames without decoding them
+        while self.lateness((self.position + 1) / self.fps) > 0 and self.cap.grab():
+            self.position += 1
+            self.skipped += 1
+
+        self.wait_until(self.position / self.fps)
+        ret, frame = self.cap.read()
+        if not ret:
+            if not self.loop:
+                self.exhausted = True
+                return None
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            self.position = 0
+            self.restart_clock()
+            return None
+
+        self.position += 1
+        return frame
+
+    def close(self):
+        if self.cap is not None:
+            self.cap.release()
+
+
+class ReplaySource(FrameSource):
+    """A session recorded by SessionRecorder, replayed with its recorded timing"""
+
+    def __init__(self, directory, loop=True, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+        self.loop = loop
+        self.name = f'replay:{directory}'
+        self.frames = []  # [(file name, offset seconds)]
+        self.position = 0
+
+    def open(self):
+        try:
+            with open(os.path.join(self.directory, 'index.json')) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        self.frames = [(entry['file'], entry['offset']) for entry in index['frames']]
+        return bool(self.frames)
+
+    def read(self):
+        if self.position >= len(self.frames):
+            if not self.loop:
+                self.exhausted = True
+                return None
+            self.position = 0
+            self.restart_clock()
+
+        # Behind schedule: jump to the newest frame that is already due
+        while self.position + 1 < len(self.frames) and self.lateness(self.frames[self.position + 1][1]) > 0:
+            self.position += 1
+            self.skipped += 1
+
+        name, offset = self.frames[self.position]
+        self.wait_until(offset)
+        self.position += 1
+        return cv2.imread(os.path.join(self.directory, name), cv2.IMREAD_COLOR)
+
+
+class SyntheticSource(FrameSource):
+    """Generated frames: a fixed noisy background with people (body and face) moving on set paths"""
+
+    def __init__(self, people=2, fps=30.0, width=640, height=480, seed=0, frames=None, **kwargs):
+        super().__init__(**kwargs)
+        self.people = people
+        self.fps = fps
+        self.width = width
+        self.height = height
+        self.frames = frames  # Stop after this many (None = endless)
+        self.name = f'synthetic:{people}'
+        self.position = 0
+
+        rng = np.random.default_rng(seed)
+        self.background = rng.integers(40, 90, (height, width, 3), dtype=np.uint8)
+        # Per person: horizontal phase, speed, vertical offset and skin tone
+        self.paths = [
+            (rng.uniform(0, 2 * np.pi), rng.uniform(0.2, 0.6), rng.uniform(-0.05, 0.05), rng.integers(120, 220, 3))
+            for _ in range(people)
+        ]
+
+    def render(self, position):
+        frame = self.background.copy()
+        t = position / self.fps
+        lane = self.width / max(1, self.people)
+        face = max(12, int(self.height * 0.09))
+
+        for i, (phase, speed, rise, tone) in enumerate(self.paths):
+            cx = int(lane * (i + 0.5) + 0.3 * lane * np.sin(phase + speed * 2 * np.pi * t))
+            cy = int(self.height * (0.35 + rise))
+            cv2.rectangle(frame, (cx - 2 * face, cy + face), (cx + 2 * face, self.height - 1), (70, 60, 150), -1)
+            cv2.ellipse(frame, (cx, cy), (face, int(face * 1.3)), 0, 0, 360, tuple(int(c) for c in tone), -1)
+            for side in (-1, 1):
+                cv2.circle(frame, (cx + side * face // 2, cy - face // 4), max(2, face // 8), (30, 30, 30), -1)
+            cv2.ellipse(frame, (cx, cy + face // 2), (face // 2, face // 5), 0, 0, 180, (40, 40, 120), 2)
+
+        return frame
+
+    def read(self):
+        if self.frames is not None and self.position >= self.frames:
+            self.exhausted = True
+            return None
+
+        # Behind schedule: skip the frames whose time has passed
+        while self.lateness((self.position + 1) / self.fps) > 0:
+            self.position += 1
+            self.skipped += 1
+
+        self.wait_until(self.position / self.fps)
+        frame = self.render(self.position)
+        self.position += 1
+        return frame
+
+
+def create_frame_source(spec, speed=1.0, loop=True, seed=0, stop_event=None):
+    """Frame source from a spec such as "camera", "camera:1", "video:clip.mp4", "replay:recordings/a" or "synthetic:3\""""
+    kind, _, argument = spec.partition(':')
+    options = {'speed': speed, 'stop_event': stop_event}
+
+    if kind == 'camera':
+        return CameraSource(int(argument or 0), **options)
+    if kind == 'video':
+        return VideoFileSource(argument, loop=loop, **options)
+    if kind == 'replay':
+        return ReplaySource(argument, loop=loop, **options)
+    if kind == 'synthetic':
+        return SyntheticSource(people=int(argument or 2), seed=seed, **options)
+
+    raise ValueError(f"Unknown frame source: {spec}")
+
+# ============================================
+# RECORDING
+# ============================================
+
+
+class SessionRecorder:
+    """Writes frames and their capture offsets to a directory that ReplaySource plays back
+
+    JPEG encoding and disk writes happen on a writer thread, so recording
+    doesn't slow the detection loop down. Frames wait in a bounded queue; when
+    the disk can't keep up, new frames are dropped (and left out of the index)
+    instead of piling up in memory, or with drop_when_behind=False record()
+    waits for room. Recorded frames must not be modified afterwards (the
+    detection loop freezes them anyway).
+    """
+
+    def __init__(self, directory, quality=95, max_frames=None, max_pending=64, drop_when_behind=True):
+        self.directory = directory
+        self.quality = quality
+        self.max_frames = max_frames
+        self.drop_when_behind = drop_when_behind
+        self.frames = []
+        self.first_at = None
+        self.dropped = 0
+        self.failed = 0
+        os.makedirs(directory, exist_ok=True)
+
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.writer = Thread(target=self.write_loop, daemon=True, name='session-recorder')
+        self.writer.start()
+
+    def record(self, frame, captured_at):
+        """Queue one frame for writing; False once max_frames is reached or when the writer is behind"""
+        if self.max_frames is not None and len(self.frames) >= self.max_frames:
+            return False
+
+        if self.first_at is None:
+            self.first_at = captured_at
+
+        name = f'{len(self.frames):06d}.jpg'
+        try:
+            self.pending.put((name, frame), block=not self.drop_when_behind)
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+        self.frames.append({'file': name, 'offset': captured_at - self.first_at})
+        return True
+
+    def write_loop(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                break
+
+            name, frame = item
+            try:
+                if not cv2.imwrite(os.path.join(self.directory, name), frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality]):
+                    self.failed += 1
+            except cv2.error as e:
+                self.failed += 1
+                print(f"Could not record frame {name}: {e}")
+
+    def close(self):
+        """Write what is still queued, then the index"""
+        self.pending.put(None)
+        self.writer.join()
+
+        with open(os.path.join(self.directory, 'index.json'), 'w') as f:
+            json.dump({'frames': self.frames}, f)
+        print(f"✓ Recorded {len(self.frames)} frames to {self.directory}"
+              f"{f' ({self.dropped} dropped while the disk was behind)' if self.dropped else ''}"
+              f"{f' ({self.failed} could not be written)' if self.failed else ''}")
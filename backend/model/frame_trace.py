@@ -0,0 +1,188 @@
+"""
+Per-frame trace context from camera capture to WebSocket delivery
+
+Every captured frame gets a FrameTrace carrying its sequence number and the
+monotonic time it came off the camera. Pipeline stages mark it as the frame
+moves on; the WebSocket endpoint reports how old the frame is when sent and,
+when the client acknowledges it, when it was received. TraceStats keeps
+rolling windows of those latencies for percentiles per stage and per client.
+"""
+
+import time
+from collections import OrderedDict, deque
+from threading import Lock
+
+import numpy as np
+
+from model import metrics
+
+
+class FrameTrace:
+    """Monotonic timestamps of one frame's stages"""
+
+    __slots__ = ('seq', 'captured_at', 'marks', 'encode_times')
+
+    def __init__(self, seq, captured_at):
+        self.seq = seq
+        self.captured_at = captured_at
+        self.marks = [('capture', captured_at)]
+        self.encode_times = {}  # {profile: seconds}, encoded lazily per profile
+
+    def mark(self, stage, now=None):
+        """Record the end of a pipeline stage"""
+        self.marks.append((stage, time.monotonic() if now is None else now))
+
+    def stage_durations(self):
+        """Seconds spent in each marked stage after capture"""
+        return {stage: end - start for (_, start), (stage, end) in zip(self.marks, self.marks[1:])}
+
+    def age(self, now=None):
+        return (time.monotonic() if now is None else now) - self.captured_at
+
+    def to_payload(self, now=None):
+        """Trace fields sent to clients along with the frame"""
+        return {
+            'seq': self.seq,
+            'captured_at': self.captured_at,  # Server monotonic clock
+            'age_ms': self.age(now) * 1000,
+            'stages_ms': {stage: seconds * 1000 for stage, seconds in self.stage_durations().items()},
+        }
+
+
+class TraceBuffer:
+    """The most recent traces by sequence number (acks arrive after newer frames exist)"""
+
+    def __init__(self, size=256):
+        self.size = size
+        self.traces = OrderedDict()
+        self.lock = Lock()
+
+    def add(self, trace):
+        with self.lock:
+            self.traces[trace.seq] = trace
+            while len(self.traces) > self.size:
+                self.traces.popitem(last=False)
+
+    def get(self, seq):
+        with self.lock:
+            return self.traces.get(seq)
+
+# ============================================
+# LATENCY STATISTICS
+# ============================================
+
+
+class LatencyWindow:
+    """Rolling window of latency samples"""
+
+    def __init__(self, size=1024):
+        self.samples = deque(maxlen=size)
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def summary(self):
+        samples = np.array(self.samples, dtype=float) * 1000
+        if samples.size == 0:
+            return {'count': 0}
+
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+        return {
+            'count': int(samples.size),
+            'p50_ms': float(p50),
+            'p95_ms': float(p95),
+            'p99_ms': float(p99),
+            'max_ms': float(samples.max()),
+        }
+
+
+class ClientLatency:
+    """Latencies seen by one WebSocket client"""
+
+    def __init__(self, size=1024):
+        self.frame_age_at_send = LatencyWindow(size)  # Capture -> handed to the socket
+        self.glass_to_glass = LatencyWindow(size)  # Capture -> client ack received (includes the ack's trip back)
+        self.ack_round_trip = LatencyWindow(size)  # Sent -> client ack received
+        self.sent_at = OrderedDict()  # {seq: monotonic send time}, for acks
+
+    def summary(self):
+        return {
+            'frame_age_at_send': self.frame_age_at_send.summary(),
+            'glass_to_glass': self.glass_to_glass.summary(),
+            'ack_round_trip': self.ack_round_trip.summary(),
+        }
+
+
+class TraceStats:
+    """Stage and per-client latency percentiles over the last few hundred frames"""
+
+    def __init__(self, window=1024, pending_acks=256):
+        self.window = window
+        self.pending_acks = pending_acks
+        self.stages = {}
+        self.clients = {}
+        self.lock = Lock()  # Guards the dicts; windows append without it
+
+    def stage_window(self, stage):
+        window = self.stages.get(stage)
+        if window is None:
+            with self.lock:
+                window = self.stages.setdefault(stage, LatencyWindow(self.window))
+        return window
+
+    def record_frame(self, trace):
+        """A frame was published: record its pipeline stages"""
+        for stage, seconds in trace.stage_durations().items():
+            self.stage_window(stage).add(seconds)
+        self.stage_window('capture_to_publish').add(trace.age(trace.marks[-1][1]))
+
+    def record_encode(self, trace, profile, seconds):
+        trace.encode_times[profile] = seconds
+        self.stage_window(f'encode:{profile}').add(seconds)
+
+    def add_client(self, client_id):
+        with self.lock:
+            self.clients[client_id] = ClientLatency(self.window)
+
+    def remove_client(self, client_id):
+        with self.lock:
+            self.clients.pop(client_id, None)
+
+    def record_send(self, client_id, trace, sent_at):
+        client = self.clients.get(client_id)
+        if client is None:
+            return
+
+        age = sent_at - trace.captured_at
+        client.frame_age_at_send.add(age)
+        metrics.FRAME_AGE_AT_SEND.observe(age)
+
+        client.sent_at[trace.seq] = sent_at
+        while len(client.sent_at) > self.pending_acks:
+            client.sent_at.popitem(last=False)
+
+    def record_ack(self, client_id, trace, acked_at):
+        """The client confirmed it received (or rendered) the frame; False when it was never sent to it"""
+        client = self.clients.get(client_id)
+        if client is None:
+            return False
+
+        sent_at = client.sent_at.pop(trace.seq, None)
+        if sent_at is None:
+            return False
+
+        age = acked_at - trace.captured_at
+        client.glass_to_glass.add(age)
+        client.ack_round_trip.add(acked_at - sent_at)
+        metrics.FRAME_AGE_AT_ACK.observe(age)
+        return True
+
+    def report(self):
+        with self.lock:
+            stages = dict(self.stages)
+            clients = dict(self.clients)
+
+        return {
+            'stages': {stage: window.summary() for stage, window in stages.items()},
+            'clients': {str(client_id): client.summary() for client_id, client in clients.items()},
+        }
@@ -0,0 +1,253 @@
+"""
+Batched person detection shared by every frame source
+
+Sources submit their latest frame; a scheduler thread gathers the pending
+frames, runs the detector once on the whole batch and hands each source's
+detections to its own ByteTrack instance. The detector is either YOLO in this
+process (YoloDetector) or a pool of worker processes (InferenceWorkerPool).
+"""
+
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from threading import Thread, Condition
+
+import supervision as sv
+from model import metrics
+from model.tracking_sessions import SessionClosed
+from model.adaptive_resolution import downscale, upscale_detections
+
+
+class YoloDetector:
+    """Runs YOLO person detection in the current process"""
+
+    def __init__(self, model, conf=0.5):
+        self.model = model
+        self.conf = conf
+
+    def __call__(self, frames, imgsz=None):
+        options = {'imgsz': imgsz} if imgsz else {}
+        results = self.model(frames, classes=[0], verbose=False, conf=self.conf, **options)
+        return [sv.Detections.from_ultralytics(result) for result in results]
+
+    def close(self):
+        pass
+
+
+class InferenceScheduler:
+    """Deadline-aware detection batching across frame sources"""
+
+    def __init__(self, detector, max_batch_size=4, max_wait_ms=10):
+        self.detector = detector
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+
+        self.trackers = {}
+        self.resolutions = {}  # {source_id: AdaptiveResolution}, only for adaptive sources
+        self.imgsz_cap = lambda: None  # Largest YOLO input size allowed right now (load shedding), or None
+        self.pending = {}  # {source_id: (frame, future, submitted_at)}
+        self.condition = Condition()
+        self.running = False
+        self.thread = None
+
+    # ----------------------------------------
+    # Sources
+    # ----------------------------------------
+
+    def register_source(self, source_id, tracker, resolution=None):
+        """Attach a source, the ByteTrack instance that follows its people and optionally its AdaptiveResolution"""
+        with self.condition:
+            self.trackers[source_id] = tracker
+            if resolution is not None:
+                self.resolutions[source_id] = resolution
+
+    def unregister_source(self, source_id):
+        """Detach a source; its pending frame, if any, fails with SessionClosed"""
+        with self.condition:
+            self.trackers.pop(source_id, None)
+            self.resolutions.pop(source_id, None)
+            entry = self.pending.pop(source_id, None)
+            self.condition.notify()
+
+        if entry:
+            self._close_future(source_id, entry[1])
+
+    @staticmethod
+    def _close_future(source_id, future):
+        """Fail a frame whose source went away, so its waiter stops like on a closed session"""
+        if future.set_running_or_notify_cancel():
+            future.set_exception(SessionClosed(source_id))
+
+    # ----------------------------------------
+    # Submission
+    # ----------------------------------------
+
+    def submit(self, source_id, frame):
+        """Queue the latest frame of a source and return a Future of its tracked detections"""
+        future = Future()
+
+        with self.condition:
+            if source_id not in self.trackers:
+                raise KeyError(f"Unknown frame source: {source_id}")
+
+            # Only the newest frame per source is worth running
+            stale = self.pending.pop(source_id, None)
+            self.pending[source_id] = (frame, future, time.monotonic())
+            self.condition.notify()
+
+        if stale:
+            stale[1].cancel()
+            metrics.DROPPED_STALE.inc()
+
+        if not self.running:
+            self._run_once()
+
+        return future
+
+    def detect(self, source_id, frame, timeout=None):
+        """Blocking helper: submit a frame and wait for its detections"""
+        return self.submit(source_id, frame).result(timeout=timeout)
+
+    # ----------------------------------------
+    # Scheduling
+    # ----------------------------------------
+
+    def _take_batch(self):
+        """Wait until the batch is full, every source is in, or the oldest frame hits its deadline"""
+        with self.condition:
+            while self.running and not self.pending:
+                self.condition.wait()
+
+            if not self.pending:
+                return []
+
+            oldest = min(entry[2] for entry in self.pending.values())
+            deadline = oldest + self.max_wait
+
+            while self.running:
+                waiting_for = set(self.trackers) - set(self.pending)
+                if len(self.pending) >= self.max_batch_size or not waiting_for:
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                self.condition.wait(timeout=remaining)
+
+            # Oldest frames first so no source starves behind a full batch
+            ordered = sorted(self.pending.items(), key=lambda item: item[1][2])
+            batch = ordered[:self.max_batch_size]
+            for source_id, _ in batch:
+                del self.pending[source_id]
+
+            return [(source_id, frame, future) for source_id, (frame, future, _) in batch]
+
+    def _detect_group(self, items, imgsz):
+        """Run the detector on frames sharing one input size; boxes come back in full resolution"""
+        metrics.YOLO_BATCH_SIZE.observe(len(items))
+
+        if imgsz is None:
+            with metrics.YOLO_SECONDS.time():
+                return self.detector([frame for _, frame, _ in items])
+
+        scaled = [downscale(frame, imgsz) for _, frame, _ in items]
+
+        start = time.perf_counter()
+        results = self.detector([frame for frame, _ in scaled], imgsz=imgsz)
+        latency = time.perf_counter() - start
+        metrics.YOLO_SECONDS.observe(latency)
+
+        detections_list = []
+        for (source_id, frame, _), (_, scale), detections in zip(items, scaled, results):
+            detections = upscale_detections(detections, scale)
+            resolution = self.resolutions.get(source_id)
+            if resolution is not None and resolution.imgsz == imgsz:  # Not when capped below its own size
+                resolution.record(latency, detections, frame.shape[0])
+            detections_list.append(detections)
+
+        return detections_list
+
+    def _run_batch(self, batch):
+        """Run the detector once per input size and split results back to each tracker"""
+        batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        # Sources on different adaptive sizes cannot share one YOLO call
+        cap = self.imgsz_cap()
+        groups = defaultdict(list)
+        for item in batch:
+            resolution = self.resolutions.get(item[0])
+            imgsz = resolution.imgsz if resolution else None
+            if cap is not None:
+                imgsz = min(imgsz or cap, cap)
+            groups[imgsz].append(item)
+
+        for imgsz, items in groups.items():
+            try:
+                results = self._detect_group(items, imgsz)
+            except Exception as e:
+                for _, _, future in items:
+                    future.set_exception(e)
+                continue
+
+            for (source_id, _, future), detections in zip(items, results):
+                try:
+                    tracker = self.trackers.get(source_id)
+                    if tracker is None:
+                        # Unregistered mid-batch: untracked detections are no use to anyone
+                        future.set_exception(SessionClosed(source_id))
+                        continue
+                    with metrics.TRACKING_SECONDS.time():
+                        detections = tracker.update_with_detections(detections)
+                    future.set_result(detections)
+                except Exception as e:
+                    future.set_exception(e)
+
+    def _run_once(self):
+        """Run whatever is pending on the caller's thread (scheduler stopped)"""
+        with self.condition:
+            batch = [(source_id, frame, future) for source_id, (frame, future, _) in self.pending.items()]
+            self.pending.clear()
+
+        for start in range(0, len(batch), self.max_batch_size):
+            self._run_batch(batch[start:start + self.max_batch_size])
+
+    def scheduler_loop(self):
+        """Main scheduling loop running in separate thread"""
+        while self.running:
+            batch = self._take_batch()
+            if batch:
+                self._run_batch(batch)
+
+    # ----------------------------------------
+    # Lifecycle
+    # ----------------------------------------
+
+    def start(self):
+        """Start the scheduler thread"""
+        if self.running:
+            return
+
+        self.running = True
+        self.thread = Thread(target=self.scheduler_loop, daemon=True)
+        self.thread.start()
+        print(f"✓ Inference scheduler started (batch<={self.max_batch_size}, wait<={self.max_wait * 1000:.0f}ms)")
+
+    def stop(self):
+        """Stop the scheduler thread and fail frames still waiting with SessionClosed"""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+        if self.thread:
+            self.thread.join(timeout=2)
+            self.thread = None
+
+        with self.condition:
+            leftovers = [(source_id, entry[1]) for source_id, entry in self.pending.items()]
+            self.pending.clear()
+
+        for source_id, future in leftovers:
+            self._close_future(source_id, future)
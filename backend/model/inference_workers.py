@@ -0,0 +1,289 @@
+"""
+Person detection in worker processes
+
+Keeps YOLO out of the uvicorn process so inference does not hold the GIL
+while the event loop encodes and sends frames. Frames travel through a
+shared-memory ring per worker (the worker reads them as zero-copy numpy
+views) and only the small detection arrays come back over a queue.
+
+Frames larger than a slot are downscaled to fit (YOLO shrinks them to imgsz
+anyway) and their boxes scaled back. A worker that misses the deadline keeps
+its ring until its late answer arrives, so the slots it may still be reading
+are never overwritten. When no worker is free, the late ones are replaced
+and the batch fails instead of waiting for their models to load; the
+others keep serving, and a replacement takes work once it reports ready.
+"""
+
+import math
+import os
+import queue
+import time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+import supervision as sv
+
+
+class SharedFrameRing:
+    """Fixed-size frame slots in one shared memory block"""
+
+    def __init__(self, slots, slot_bytes, name=None):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.next_slot = 0
+
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def view(self, slot, shape, dtype=np.uint8):
+        """Numpy array backed directly by a slot (no copy)"""
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def write(self, frame):
+        """Copy a frame into the next slot and return (slot, shape)"""
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame of {frame.nbytes} bytes does not fit a {self.slot_bytes} byte slot")
+
+        slot = self.next_slot
+        self.next_slot = (self.next_slot + 1) % self.slots
+        self.view(slot, frame.shape)[...] = frame
+        return slot, frame.shape
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _worker_main(worker_index, ring_name, slots, slot_bytes, tasks, results, model_path, conf, threads):
+    """Worker process: load YOLO once, then detect people on frames read from the ring"""
+    import torch
+    from ultralytics import YOLO
+
+    torch.set_num_threads(threads)
+    ring = SharedFrameRing(slots, slot_bytes, name=ring_name)
+
+    load_start = time.perf_counter()
+    model = YOLO(model_path)
+    results.put(('ready', worker_index, time.perf_counter() - load_start))
+
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+
+            job_id, chunk_index, frames_meta, imgsz = task
+            try:
+                frames = [ring.view(slot, shape) for slot, shape in frames_meta]
+                options = {'imgsz': imgsz} if imgsz else {}
+                predictions = model(frames, classes=[0], verbose=False, conf=conf, **options)
+
+                detections = []
+                for prediction in predictions:
+                    boxes = prediction.boxes
+                    detections.append((
+                        boxes.xyxy.cpu().numpy(),
+                        boxes.conf.cpu().numpy(),
+                        boxes.cls.cpu().numpy().astype(int)
+                    ))
+
+                results.put((job_id, worker_index, chunk_index, detections, None))
+            except Exception as e:
+                results.put((job_id, worker_index, chunk_index, None, repr(e)))
+    finally:
+        ring.close()
+
+
+def fit_frame(frame, max_bytes):
+    """The frame, downscaled if it doesn't fit max_bytes, and the (x, y, x, y) scale applied to it"""
+    if frame.nbytes <= max_bytes:
+        return frame, 1.0
+
+    scale = math.sqrt(max_bytes / frame.nbytes)
+    height, width = frame.shape[:2]
+    size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA), np.array([size[0] / width, size[1] / height] * 2)
+
+
+class InferenceWorkerPool:
+    """Detector backed by YOLO worker processes fed through shared memory"""
+
+    def __init__(self, workers=None, model_path='yolov8n.pt', conf=0.5,
+                 max_batch_size=4, max_frame_shape=(1080, 1920, 3), timeout=10.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.model_path = model_path
+        self.conf = conf
+        self.slots = max(1, max_batch_size)
+        self.slot_bytes = int(np.prod(max_frame_shape))
+        self.timeout = timeout
+        self.threads = max(1, (os.cpu_count() or 1) // self.workers)
+
+        self.context = mp.get_context('spawn')
+        self.results = self.context.Queue()
+        self.processes = []
+        self.task_queues = []
+        self.rings = []
+        self.load_times = {}
+        self.in_flight = {}  # {worker index: job_id} of chunks sent and not answered yet
+        self.starting = set()  # Replaced workers still loading their model
+        self.next_job = 0
+
+    def _spawn(self, index):
+        ring = SharedFrameRing(self.slots, self.slot_bytes)
+        tasks = self.context.Queue()
+        process = self.context.Process(
+            target=_worker_main,
+            args=(index, ring.name, self.slots, self.slot_bytes, tasks, self.results,
+                  self.model_path, self.conf, self.threads),
+            daemon=True
+        )
+        process.start()
+        return ring, tasks, process
+
+    def _wait_ready(self, indices):
+        indices = set(indices)
+        while indices:
+            message = self.results.get(timeout=120)
+            if message[0] == 'ready' and message[1] in indices:
+                self.load_times[message[1]] = message[2]
+                indices.discard(message[1])
+            # Anything else answers a batch that already timed out
+
+    def start(self):
+        """Spawn the workers and wait until every model is loaded"""
+        if self.processes:
+            return
+
+        for index in range(self.workers):
+            ring, tasks, process = self._spawn(index)
+            self.rings.append(ring)
+            self.task_queues.append(tasks)
+            self.processes.append(process)
+
+        self._wait_ready(range(self.workers))
+        print(f"✓ {self.workers} inference worker(s) ready")
+
+    def _replace(self, index):
+        """Swap a late worker for a fresh one; its ring goes with it, so no slot it may still read is reused
+
+        The new worker loads its model in the background and takes work once its ready message is seen.
+        """
+        process = self.processes[index]
+        process.terminate()
+        process.join(timeout=5)
+        self.rings[index].close()
+        self.in_flight.pop(index, None)
+
+        self.rings[index], self.task_queues[index], self.processes[index] = self._spawn(index)
+        self.starting.add(index)
+        print(f"Inference worker {index} replaced after missing its deadline")
+
+    def _settle(self, message):
+        """Free the worker that sent a result; returns (job_id, chunk_index, detections, error), None for a ready worker"""
+        if message[0] == 'ready':
+            _, index, load_time = message
+            self.load_times[index] = load_time
+            if index in self.starting:
+                self.starting.discard(index)
+                print(f"✓ Inference worker {index} ready again")
+            return None
+        job_id, worker_index, chunk_index, detections, error = message
+        if self.in_flight.get(worker_index) == job_id:
+            del self.in_flight[worker_index]
+        return job_id, chunk_index, detections, error
+
+    def _free_workers(self):
+        # Late answers free their workers' rings, ready messages bring replacements in
+        while self.in_flight or self.starting:
+            try:
+                self._settle(self.results.get_nowait())
+            except queue.Empty:
+                break
+
+        free = [index for index in range(self.workers) if index not in self.in_flight and index not in self.starting]
+        if not free:
+            for index in list(self.in_flight):
+                self._replace(index)
+            raise RuntimeError("No inference worker free; late ones are being replaced")
+        return free
+
+    def __call__(self, frames, imgsz=None):
+        """Detect people on a batch, spread over the free workers, in the original order"""
+        if not self.processes:
+            self.start()
+
+        workers = self._free_workers()
+
+        # Ring slots hold one batch per worker, so never hand a worker more than that
+        per_worker = min(self.slots, -(-len(frames) // len(workers)))
+        chunks = [frames[i:i + per_worker] for i in range(0, len(frames), per_worker)]
+        if len(chunks) > len(workers):
+            raise ValueError(f"Batch of {len(frames)} frames exceeds pool capacity")
+
+        job_id = self.next_job
+        self.next_job += 1
+
+        scales = []
+        for chunk_index, chunk in enumerate(chunks):
+            worker = workers[chunk_index]
+            frames_meta = []
+            for frame in chunk:
+                frame, scale = fit_frame(np.ascontiguousarray(frame), self.slot_bytes)
+                frames_meta.append(self.rings[worker].write(frame))
+                scales.append(scale)
+            self.task_queues[worker].put((job_id, chunk_index, frames_meta, imgsz))
+            self.in_flight[worker] = job_id
+
+        collected = {}
+        deadline = time.monotonic() + self.timeout
+        while len(collected) < len(chunks):
+            try:
+                message = self.results.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise RuntimeError("Inference workers did not answer in time")
+
+            result = self._settle(message)
+            if result is None or result[0] != job_id:
+                continue  # Late answer from a batch that already timed out
+            _, chunk_index, detections, error = result
+            if error:
+                raise RuntimeError(f"Inference worker failed: {error}")
+            collected[chunk_index] = detections
+
+        output = []
+        detections = (detection for chunk_index in range(len(chunks)) for detection in collected[chunk_index])
+        for (xyxy, confidence, class_id), scale in zip(detections, scales):
+            output.append(sv.Detections(xyxy=xyxy / scale, confidence=confidence, class_id=class_id))
+
+        return output
+
+    def close(self):
+        """Stop the workers and release shared memory"""
+        for tasks in self.task_queues:
+            tasks.put(None)
+
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+        for ring in self.rings:
+            ring.close()
+
+        self.processes = []
+        self.task_queues = []
+        self.rings = []
+        self.load_times = {}
+        self.in_flight = {}
+        self.starting = set()
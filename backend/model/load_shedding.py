@@ -0,0 +1,160 @@
+"""
+Load shedding for the detection pipeline
+
+When a pipeline stage is busy nearly all the time, so frames start queueing
+behind it, the pipeline steps down through quality tiers instead of slowing
+down everywhere at once. Off by default: a CPU-only machine keeps YOLO busy
+most of the time at any tier, so turn it on where the full pipeline normally
+has headroom.
+Each tier keeps the savings of the tiers before it:
+
+    full              everything
+    stable_emotions   no new emotion inference for tracks whose smoothed emotion
+                      is settled (re-checked every few frames)
+    low_resolution    YOLO input capped at a small size
+    low_quality       lower JPEG quality for every stream profile
+    low_fps           camera frames processed at a fraction of the rate
+    metadata_only     clients get emotion data without images
+
+The load is the duty cycle of the busiest stage: the fraction of wall time
+spent in it over the last windows (per worker for stages running on several
+threads), smoothed across windows. Processing fewer frames (low_fps) lowers
+it just as faster frames do, and a stage that stops running (no client
+asking for images) decays to zero instead of keeping its last value. Above the high
+watermark for down_after seconds the tier steps down; below the low
+watermark for the (longer) up_after seconds it steps back up, so a tier
+isn't left the moment its own savings kick in.
+"""
+
+import time
+from collections import defaultdict
+from threading import Lock
+
+TIERS = ['full', 'stable_emotions', 'low_resolution', 'low_quality', 'low_fps', 'metadata_only']
+
+
+class LoadSheddingController:
+    """Picks the pipeline's quality tier from how busy its stages are"""
+
+    def __init__(self, high_watermark=0.8, low_watermark=0.5, down_after=1.0, up_after=5.0,
+                 window=0.5, smoothing=0.3, capacity=None, max_tier='metadata_only', enabled=True,
+                 imgsz=320, quality_factor=0.6, fps_factor=0.5, stable_refresh_frames=5):
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.down_after = down_after
+        self.up_after = up_after
+        self.window = window
+        self.smoothing = smoothing
+        self.capacity = capacity or {}  # {stage: threads running it}, 1 if not listed
+        self.max_tier = TIERS.index(max_tier) if enabled else 0
+
+        self.imgsz = imgsz
+        self.quality_factor = quality_factor
+        self.fps_factor = fps_factor
+        self.stable_refresh_frames = stable_refresh_frames
+
+        self.busy = defaultdict(float)  # {stage: seconds spent in it during the current window}
+        self.window_start = time.monotonic()
+        self.stage_duty = {}  # {stage: smoothed fraction of wall time}
+        self.tier = 0
+        self.over_since = None
+        self.under_since = None
+        self.last_change = self.window_start
+        self.lock = Lock()
+
+    @property
+    def tier_name(self):
+        return TIERS[self.tier]
+
+    @property
+    def load(self):
+        """Smoothed duty cycle of the busiest stage (1.0 = never idle)"""
+        return max(self.stage_duty.values(), default=0.0)
+
+    def observe(self, stage, seconds, now=None):
+        """Count time spent in a stage; each completed window updates the load and may change tier"""
+        now = time.monotonic() if now is None else now
+
+        with self.lock:
+            self.busy[stage] += seconds
+            if now - self.window_start >= self.window:
+                self._close_window(now)
+                self._update(now)
+
+    def _close_window(self, now):
+        elapsed = now - self.window_start
+        for stage in set(self.busy) | set(self.stage_duty):
+            duty = self.busy.get(stage, 0.0) / (elapsed * self.capacity.get(stage, 1))
+            previous = self.stage_duty.get(stage)
+            duty = duty if previous is None else previous + self.smoothing * (duty - previous)
+            if duty < 0.001 and stage not in self.busy:
+                self.stage_duty.pop(stage, None)  # Stopped running
+            else:
+                self.stage_duty[stage] = duty
+
+        self.busy.clear()
+        self.window_start = now
+
+    def _update(self, now):
+        load = self.load
+
+        if load > self.high_watermark:
+            self.under_since = None
+            if self.over_since is None:
+                self.over_since = now
+            elif now - self.over_since >= self.down_after and self.tier < self.max_tier:
+                self._set_tier(self.tier + 1, now, load)
+                self.over_since = now  # Give the new tier its own down_after to take effect
+        elif load < self.low_watermark:
+            self.over_since = None
+            if self.under_since is None:
+                self.under_since = now
+            elif now - self.under_since >= self.up_after and self.tier > 0:
+                self._set_tier(self.tier - 1, now, load)
+                self.under_since = now
+        else:
+            self.over_since = None
+            self.under_since = None
+
+    def _set_tier(self, tier, now, load):
+        print(f"Load shedding: {TIERS[self.tier]} -> {TIERS[tier]} (busiest stage {load:.0%} busy)")
+        self.tier = tier
+        self.last_change = now
+
+    # ----------------------------------------
+    # What the current tier turns off
+    # ----------------------------------------
+
+    @property
+    def skip_stable_emotions(self):
+        return self.tier >= TIERS.index('stable_emotions')
+
+    @property
+    def max_imgsz(self):
+        """YOLO input size cap, or None"""
+        return self.imgsz if self.tier >= TIERS.index('low_resolution') else None
+
+    def jpeg_quality(self, quality):
+        if self.tier >= TIERS.index('low_quality'):
+            return max(10, int(quality * self.quality_factor))
+        return quality
+
+    def frame_interval(self, interval):
+        """Camera pacing for the current tier"""
+        if self.tier >= TIERS.index('low_fps'):
+            return interval / self.fps_factor
+        return interval
+
+    @property
+    def metadata_only(self):
+        return self.tier >= TIERS.index('metadata_only')
+
+    def stats(self):
+        with self.lock:
+            return {
+                'tier': self.tier,
+                'tier_name': self.tier_name,
+                'load': round(self.load, 3),
+                'stage_duty': {stage: round(duty, 3) for stage, duty in self.stage_duty.items()},
+                'seconds_in_tier': round(time.monotonic() - self.last_change, 1),
+            }
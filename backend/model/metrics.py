@@ -0,0 +1,317 @@
+"""
+Prometheus-style metrics for the detection pipeline
+
+Hot-path updates never take a lock: every thread writes to its own shard (a
+plain list, registered the first time that thread touches a metric) and only
+a scrape sums the shards. Each shard has a single writer, so under the GIL an
+update can't be lost; a scrape racing an update is at most one sample behind.
+"""
+
+import bisect
+import time
+from threading import Lock, local
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; the pipeline runs at ~30 fps, so most of the resolution is below 33ms
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.02, 0.033, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class ShardedValues:
+    """Per-thread lists of numbers, summed on read"""
+
+    def __init__(self, size):
+        self.size = size
+        self.local = local()
+        self.shards = []
+        self.lock = Lock()  # Only taken when a new thread registers its shard
+
+    def shard(self):
+        """This thread's list (created on first use)"""
+        try:
+            return self.local.shard
+        except AttributeError:
+            shard = [0] * self.size
+            with self.lock:
+                self.shards.append(shard)
+            self.local.shard = shard
+            return shard
+
+    def totals(self):
+        """Sum of every thread's shard"""
+        with self.lock:
+            shards = list(self.shards)
+
+        totals = [0] * self.size
+        for shard in shards:
+            for i, value in enumerate(shard):
+                totals[i] += value
+        return totals
+
+
+# ============================================
+# METRIC VALUES (one per label combination)
+# ============================================
+
+
+class CounterValue:
+    def __init__(self):
+        self.values = ShardedValues(1)
+
+    def inc(self, amount=1):
+        self.values.shard()[0] += amount
+
+    def samples(self, name, labels):
+        yield name, labels, self.values.totals()[0]
+
+
+class GaugeValue:
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        """Read the value from function() at scrape time instead"""
+        self.function = function
+
+    def samples(self, name, labels):
+        value = self.value
+        if self.function is not None:
+            try:
+                value = self.function()
+            except Exception:
+                return
+        yield name, labels, value
+
+
+class HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.values = ShardedValues(len(buckets) + 2)  # Bucket counts, +Inf count, sum
+
+    def observe(self, value):
+        shard = self.values.shard()
+        shard[bisect.bisect_left(self.buckets, value)] += 1
+        shard[-1] += value
+
+    def time(self):
+        """Context manager observing the duration of its block"""
+        return Timer(self)
+
+    def samples(self, name, labels):
+        totals = self.values.totals()
+        cumulative = 0
+        for bound, count in zip(self.buckets, totals):
+            cumulative += count
+            yield f'{name}_bucket', labels + (('le', repr(float(bound))),), cumulative
+
+        cumulative += totals[len(self.buckets)]
+        yield f'{name}_bucket', labels + (('le', '+Inf'),), cumulative
+        yield f'{name}_sum', labels, totals[-1]
+        yield f'{name}_count', labels, cumulative
+
+
+class Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+# ============================================
+# METRIC FAMILIES
+# ============================================
+
+
+class Metric:
+    """A named metric, split into one value per label combination"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = Lock()
+
+    def create_value(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """The value for one label combination; bind it once outside hot loops"""
+        values = tuple(str(value) for value in values)
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self.lock:
+                child = self.children.setdefault(values, self.create_value())
+        return child
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for values, child in list(self.children.items()):
+            labels = tuple(zip(self.labelnames, values))
+            for name, sample_labels, value in child.samples(self.name, labels):
+                lines.append(f'{name}{format_labels(sample_labels)} {format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def create_value(self):
+        return CounterValue()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def create_value(self):
+        return GaugeValue()
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def set_function(self, function):
+        self.labels().set_function(function)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def create_value(self):
+        return HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (key, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def format_value(value):
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class Registry:
+    """Every metric exposed on /metrics"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = Lock()
+
+    def register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# ============================================
+# PIPELINE METRICS
+# ============================================
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'emotiplay_stage_seconds', 'Latency of each detection pipeline stage', ['stage']
+))
+CAPTURE_SECONDS = STAGE_SECONDS.labels('capture')
+YOLO_SECONDS = STAGE_SECONDS.labels('yolo')  # One observation per batch
+TRACKING_SECONDS = STAGE_SECONDS.labels('tracking')
+HAAR_SECONDS = STAGE_SECONDS.labels('haar')
+EMOTION_SECONDS = STAGE_SECONDS.labels('emotion')
+PROCESS_SECONDS = STAGE_SECONDS.labels('process')  # Whole process_frame
+DRAW_SECONDS = STAGE_SECONDS.labels('draw')
+ENCODE_SECONDS = STAGE_SECONDS.labels('encode')
+WS_SEND_SECONDS = STAGE_SECONDS.labels('ws_send')
+
+FRAME_AGE_SECONDS = REGISTRY.register(Histogram(
+    'emotiplay_frame_age_seconds', 'Time since camera capture when a frame reaches a point', ['point'],
+    buckets=(0.01, 0.02, 0.033, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3, 0.5, 1.0, 2.0)
+))
+FRAME_AGE_AT_SEND = FRAME_AGE_SECONDS.labels('send')
+FRAME_AGE_AT_ACK = FRAME_AGE_SECONDS.labels('ack')  # Client acknowledgement received
+
+YOLO_BATCH_SIZE = REGISTRY.register(Histogram(
+    'emotiplay_yolo_batch_size', 'Frames per batched YOLO call', buckets=(1, 2, 4, 8, 16)
+))
+EMOTION_BATCH_SIZE = REGISTRY.register(Histogram(
+    'emotiplay_emotion_batch_size', 'Faces per batched emotion model call', buckets=(1, 2, 4, 8, 16)
+))
+
+FRAMES_PROCESSED = REGISTRY.register(Counter(
+    'emotiplay_frames_processed_total', 'Frames that went through the whole pipeline'
+))
+FRAMES_DROPPED = REGISTRY.register(Counter(
+    'emotiplay_frames_dropped_total', 'Frames not processed or not delivered', ['reason']
+))
+DROPPED_CAPTURE = FRAMES_DROPPED.labels('capture')  # Camera read failed
+DROPPED_STALE = FRAMES_DROPPED.labels('stale')  # Replaced by a newer frame before YOLO ran
+DROPPED_CLIENT = FRAMES_DROPPED.labels('client_skip')  # Published but skipped by a slow client
+DROPPED_UPLOAD = FRAMES_DROPPED.labels('upload_replaced')  # Uploaded frame replaced by a newer one before processing
+
+ACTIVE_TRACKS = REGISTRY.register(Gauge(
+    'emotiplay_active_tracks', 'People currently followed by the emotion tracker'
+))
+CONNECTED_CLIENTS = REGISTRY.register(Gauge(
+    'emotiplay_connected_clients', 'WebSocket clients receiving the stream'
+))
+CLIENT_SOURCES = REGISTRY.register(Gauge(
+    'emotiplay_client_sources', 'WebSocket clients uploading frames from their own camera'
+))
+TRACKING_SESSIONS = REGISTRY.register(Gauge(
+    'emotiplay_tracking_sessions', 'Open tracking sessions (ByteTrack + emotion history per frame source)'
+))
+SESSIONS_EVICTED = REGISTRY.register(Counter(
+    'emotiplay_tracking_sessions_evicted_total', 'Idle tracking sessions evicted', ['reason']
+))
+QUALITY_TIER = REGISTRY.register(Gauge(
+    'emotiplay_quality_tier', 'Load shedding tier (0 = full quality, 5 = metadata only)'
+))
+PIPELINE_LOAD = REGISTRY.register(Gauge(
+    'emotiplay_pipeline_load', 'Smoothed duty cycle of the busiest pipeline stage (1 = never idle)'
+))
+REID_MATCHES = REGISTRY.register(Counter(
+    'emotiplay_reid_matches_total', 'New tracker IDs recognized as a returning person and given their history'
+))
+MODEL_LOAD_SECONDS = REGISTRY.register(Gauge(
+    'emotiplay_model_load_seconds', 'Time it took to load each model', ['model']
+))
@@ -0,0 +1,145 @@
+"""
+Sampling profiler for the running server
+
+A background thread reads the stacks of the chosen threads through
+sys._current_frames() every few milliseconds, for a fixed time. Nothing is
+hooked into the profiled code, so the pipeline runs untouched when no profile
+is running and only pays for the GIL hand-offs of the sampler while one is.
+
+The sampler needs the GIL to read stacks, so samples favour moments when the
+profiled thread has released it (OpenCV, torch and numpy calls); short bursts
+of pure Python between such calls are under-counted.
+"""
+
+import os
+import sys
+import time
+from collections import Counter
+from threading import Event, Thread
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class StackSampler:
+    """Counts identical stacks of some threads over a time-limited run"""
+
+    def __init__(self, threads, interval=0.005):
+        self.threads = threads  # {thread ident: name shown at the root of its stacks}
+        self.interval = interval
+        self.stacks = Counter()  # {(thread name, outermost frame, ..., innermost frame): samples}
+        self.lines = Counter()  # {(innermost frame, line): samples}, for time spent in C calls
+        self.samples = 0
+        self.started_at = None
+        self.elapsed = 0.0
+        self.stop_event = Event()
+        self.thread = None
+
+    def sample(self):
+        frames = sys._current_frames()
+        for ident, name in self.threads.items():
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+
+            self.lines[(frame_label(frame), frame.f_lineno)] += 1
+
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            stack.append(name)
+            stack.reverse()
+            self.stacks[tuple(stack)] += 1
+
+        self.samples += 1
+
+    def run(self, duration):
+        deadline = time.monotonic() + duration
+        while not self.stop_event.is_set() and time.monotonic() < deadline:
+            self.sample()
+            self.stop_event.wait(self.interval)
+        self.elapsed = time.monotonic() - self.started_at
+
+    def start(self, duration):
+        """Sample in the background for up to duration seconds"""
+        self.started_at = time.monotonic()
+        self.thread = Thread(target=self.run, args=(duration,), daemon=True, name='stack-sampler')
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=2)
+
+    # ----------------------------------------
+    # Reports
+    # ----------------------------------------
+
+    def collapsed(self):
+        """Collapsed stacks ("root;caller;callee count" per line), as flamegraph.pl and speedscope read them"""
+        return '\n'.join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common()) + '\n'
+
+    def functions(self, limit=30):
+        """Hottest functions by inclusive samples, with their self samples"""
+        inclusive = Counter()
+        own = Counter()
+        for stack, count in self.stacks.items():
+            for label in set(stack[1:]):
+                inclusive[label] += count
+            own[stack[-1]] += count
+
+        total = sum(self.stacks.values()) or 1
+        return [
+            {
+                'function': label,
+                'inclusive_samples': samples,
+                'self_samples': own[label],
+                'inclusive_share': samples / total,
+                'self_share': own[label] / total,
+            }
+            for label, samples in inclusive.most_common(limit)
+        ]
+
+    def breakdown(self, function):
+        """Where the samples inside a function go: per direct callee, and per line of its own body"""
+        suffix = f":{function}"
+        callees = Counter()
+        total = 0
+
+        for stack, count in self.stacks.items():
+            positions = [i for i, label in enumerate(stack) if label.endswith(suffix)]
+            if not positions:
+                continue
+
+            position = positions[-1]
+            total += count
+            callees[stack[position + 1] if position + 1 < len(stack) else '<self>'] += count
+
+        own_lines = Counter()
+        for (label, line), count in self.lines.items():
+            if label.endswith(suffix):
+                own_lines[f"{label}:{line}"] += count
+
+        share = lambda count: count / total if total else 0.0
+        return {
+            'function': function,
+            'samples': total,
+            'callees': [{'function': label, 'samples': count, 'share': share(count)}
+                        for label, count in callees.most_common()],
+            'self_lines': [{'line': label, 'samples': count, 'share': share(count)}
+                           for label, count in own_lines.most_common()],
+        }
+
+    def report(self, hot_paths=('process_frame', 'infer_emotions', '_run_batch', 'get_current_frame_base64')):
+        return {
+            'threads': sorted(self.threads.values()),
+            'interval_ms': self.interval * 1000,
+            'duration_s': self.elapsed,
+            'samples': self.samples,
+            'functions': self.functions(),
+            'hot_paths': {function: self.breakdown(function) for function in hot_paths},
+            'collapsed': self.collapsed(),
+        }
@@ -0,0 +1,103 @@
+"""
+Re-identification of people who come back under a new ByteTrack ID
+
+ByteTrack gives someone who left the frame (or stayed hidden past its lost
+track buffer) a new tracker_id when they return, and their emotion history
+would start again from nothing. Each tracked face's embedding, the emotion
+model's 256-d penultimate activation from the same forward pass as its
+emotion, is kept per tracker_id in a small index; the first embedding of a
+new tracker_id is compared with the people missing from the frame, and a
+close enough match (cosine similarity) hands the new ID the previous one's
+history.
+
+Entries expire ttl seconds after their person was last seen and the index
+never holds more than max_entries (the least recently seen go first), so a
+busy doorway doesn't grow it without bound.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+from model import metrics
+
+
+class ReIdentifier:
+    """Face embedding index of one tracking session, merging returning people into their history"""
+
+    def __init__(self, emotion_tracker, max_entries=128, ttl=60.0, threshold=0.9, smoothing=0.2):
+        self.emotion_tracker = emotion_tracker
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.smoothing = smoothing
+
+        self.entries = OrderedDict()  # {tracker_id: (unit embedding, last seen)}, least recently seen first
+        self.retired = {}  # {tracker_id: history state} of people the emotion tracker has already dropped
+        self.matched = 0
+
+    def observe(self, tracker_id, embedding, current_time, present_ids):
+        """Record a face embedding of tracker_id; returns the ID whose history it took over, if any"""
+        embedding = unit(embedding)
+        previous = None
+
+        entry = self.entries.pop(tracker_id, None)
+        if entry is None:
+            previous = self.match(embedding, current_time, present_ids)
+            if previous is not None:
+                self.merge(previous, tracker_id, current_time)
+                entry = self.entries.pop(previous)
+
+        if entry is not None:
+            embedding = unit(entry[0] + self.smoothing * (embedding - entry[0]))
+
+        self.entries[tracker_id] = (embedding, current_time)
+        while len(self.entries) > self.max_entries:
+            evicted, _ = self.entries.popitem(last=False)
+            self.retired.pop(evicted, None)
+
+        return previous
+
+    def match(self, embedding, current_time, present_ids):
+        """Closest person not in the frame above the similarity threshold, or None"""
+        self.expire(current_time)
+
+        candidates = [(tracker_id, entry[0]) for tracker_id, entry in self.entries.items()
+                      if tracker_id not in present_ids]
+        if not candidates:
+            return None
+
+        similarities = np.stack([candidate for _, candidate in candidates]) @ embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+        return candidates[best][0]
+
+    def merge(self, previous, tracker_id, current_time):
+        # Still in the emotion tracker if they were gone only briefly
+        state = self.retired.pop(previous, None) or self.emotion_tracker.release(previous)
+        if state is not None:
+            self.emotion_tracker.adopt(tracker_id, state, current_time)
+
+        self.matched += 1
+        metrics.REID_MATCHES.inc()
+
+    def retire(self, removed):
+        """Keep the history of people the emotion tracker dropped for as long as their embedding"""
+        for tracker_id, state in removed.items():
+            if tracker_id in self.entries:
+                self.retired[tracker_id] = state
+
+    def expire(self, current_time):
+        while self.entries:
+            tracker_id, (_, last_seen) = next(iter(self.entries.items()))
+            if current_time - last_seen <= self.ttl:
+                break
+            del self.entries[tracker_id]
+            self.retired.pop(tracker_id, None)
+
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
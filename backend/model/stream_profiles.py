@@ -0,0 +1,104 @@
+"""
+Per-client stream profiles for the detection WebSocket
+
+A profile fixes the JPEG resolution and quality a client receives. The
+broadcaster encodes each profile at most once per published frame, and each
+client's ClientStream steps between profiles from its measured send latency
+and how many frames went by while it was still sending (backlog).
+"""
+
+import time
+from collections import namedtuple
+
+import cv2
+
+StreamProfile = namedtuple('StreamProfile', ['name', 'scale', 'quality'])
+
+STREAM_PROFILES = {
+    'full': StreamProfile('full', 1.0, 80),
+    'medium': StreamProfile('medium', 0.5, 65),
+    'thumbnail': StreamProfile('thumbnail', 0.25, 50),
+    # Emotion data only, no image at all
+    'metadata': StreamProfile('metadata', 0.0, 0),
+}
+
+# Adaptive clients move along this ladder; metadata is only used when asked for
+PROFILE_LADDER = ['full', 'medium', 'thumbnail']
+
+
+def encode_profile(frame, profile):
+    """Resize and JPEG-encode a frame for a profile; returns the JPEG buffer"""
+    if profile.scale < 1.0:
+        height, width = frame.shape[:2]
+        size = (max(1, int(width * profile.scale)), max(1, int(height * profile.scale)))
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+    _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, profile.quality])
+    return buffer
+
+
+class ClientStream:
+    """Tracks one client's send latency and backlog and picks its profile"""
+
+    def __init__(self, profile='full', adaptive=True, frame_interval=0.033,
+                 smoothing=0.2, cooldown=2.0, recover_after=30):
+        if profile not in STREAM_PROFILES:
+            raise ValueError(f"Unknown stream profile: {profile}")
+
+        self.requested = profile
+        self.adaptive = adaptive and profile in PROFILE_LADDER
+        self.current = profile
+        self.frame_interval = frame_interval
+        self.smoothing = smoothing
+        self.cooldown = cooldown
+        self.recover_after = recover_after
+
+        self.send_latency = 0.0
+        self.backlog = 0.0
+        self.frames_sent = 0
+        self.frames_skipped = 0
+        self.healthy_sends = 0
+        self.last_change = time.monotonic()
+
+    @property
+    def profile(self):
+        return STREAM_PROFILES[self.current]
+
+    def record_send(self, latency, skipped=0, now=None):
+        """Feed one send: its duration and how many published frames the client missed meanwhile"""
+        now = time.monotonic() if now is None else now
+
+        self.frames_sent += 1
+        self.frames_skipped += skipped
+        self.send_latency += self.smoothing * (latency - self.send_latency)
+        self.backlog += self.smoothing * (skipped - self.backlog)
+
+        if not self.adaptive or now - self.last_change < self.cooldown:
+            return
+
+        position = PROFILE_LADDER.index(self.current)
+        ceiling = PROFILE_LADDER.index(self.requested)
+        behind = self.send_latency > 0.5 * self.frame_interval or self.backlog > 1.0
+
+        if behind:
+            self.healthy_sends = 0
+            if position < len(PROFILE_LADDER) - 1:
+                self.current = PROFILE_LADDER[position + 1]
+                self.last_change = now
+            return
+
+        self.healthy_sends += 1
+        if self.healthy_sends >= self.recover_after and position > ceiling:
+            self.current = PROFILE_LADDER[position - 1]
+            self.healthy_sends = 0
+            self.last_change = now
+
+    def stats(self):
+        return {
+            'profile': self.current,
+            'requested_profile': self.requested,
+            'send_latency_ms': round(self.send_latency * 1000, 2),
+            'backlog': round(self.backlog, 2),
+            'frames_sent': self.frames_sent,
+            'frames_skipped': self.frames_skipped,
+        }
@@ -0,0 +1,193 @@
+"""
+Tracking sessions: ByteTrack and emotion history scoped to one run of one source
+
+A session is opened when a frame source starts (the camera on the first
+client, an upload connection when it opens) and closed when it stops, so a
+restart gets fresh tracker IDs and an empty history instead of the previous
+run's. Sessions that stop receiving frames are evicted after a while, sooner
+when the process or the machine is short of memory; a source that sends
+again afterwards gets a new session. A source closed for good (an upload
+connection that ended, the camera once stopped) gets none: a frame of it
+still on its way raises SessionClosed instead of opening a session nobody
+would ever close.
+"""
+
+import itertools
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Event, Lock, Thread
+
+import psutil
+
+from model import metrics
+
+session_numbers = itertools.count(1)
+
+
+class SessionClosed(Exception):
+    """A frame arrived for a source whose session was closed for good"""
+
+
+class TrackingSession:
+    """Tracker state of one frame source for one run"""
+
+    def __init__(self, source_id, tracker, emotion_tracker, resolution=None, reid=None):
+        self.session_id = next(session_numbers)
+        self.source_id = source_id
+        self.tracker = tracker
+        self.emotion_tracker = emotion_tracker
+        self.resolution = resolution
+        self.reid = reid  # ReIdentifier over emotion_tracker, or None
+        self.created_at = time.monotonic()
+        self.last_active = self.created_at
+        self.busy = 0  # Frames being processed right now
+        self.frames = 0
+
+    def summary(self, now=None):
+        now = time.monotonic() if now is None else now
+        return {
+            'session_id': self.session_id,
+            'source_id': self.source_id,
+            'age_s': now - self.created_at,
+            'idle_s': 0.0 if self.busy else now - self.last_active,
+            'frames': self.frames,
+            'tracks': len(self.emotion_tracker.last_seen),
+            'reidentified': self.reid.matched if self.reid else 0,
+        }
+
+
+class TrackingSessionManager:
+    """Open sessions by source, registered with the inference scheduler, with idle eviction"""
+
+    def __init__(self, broadcaster, idle_timeout=300.0, pressure_idle_timeout=10.0,
+                 memory_limit_mb=0, memory_percent_limit=90.0, sweep_interval=5.0, max_closed=1024):
+        self.broadcaster = broadcaster
+        self.idle_timeout = idle_timeout
+        self.pressure_idle_timeout = pressure_idle_timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.memory_percent_limit = memory_percent_limit
+        self.sweep_interval = sweep_interval
+
+        self.sessions = {}  # {source_id: TrackingSession}
+        self.closed = OrderedDict()  # {source_id: None} of sources closed for good, most recent last
+        self.max_closed = max_closed
+        self.lock = Lock()
+        self.process = psutil.Process()
+        self.stop_event = Event()
+
+        metrics.TRACKING_SESSIONS.set_function(lambda: len(self.sessions))
+
+        # Sources that stop sending never come back through use(), so eviction runs on its own thread
+        self.thread = Thread(target=self.sweep_loop, daemon=True, name='session-sweeper')
+        self.thread.start()
+
+    # ----------------------------------------
+    # Lifecycle
+    # ----------------------------------------
+
+    def _create(self, source_id):
+        """New session for a source, replacing its tracker on the scheduler (call with the lock held)"""
+        emotion_tracker = self.broadcaster.create_emotion_tracker()
+        session = TrackingSession(
+            source_id,
+            self.broadcaster.create_tracker(),
+            emotion_tracker,
+            self.broadcaster.create_resolution(),
+            self.broadcaster.create_reidentifier(emotion_tracker)
+        )
+        self.broadcaster.inference_scheduler.register_source(source_id, session.tracker, session.resolution)
+        self.sessions[source_id] = session
+        return session
+
+    def open(self, source_id):
+        """Start a fresh session for a source; any previous one is dropped with its IDs and history"""
+        with self.lock:
+            self.closed.pop(source_id, None)
+            self.sessions.pop(source_id, None)
+            return self._create(source_id)
+
+    def close(self, source_id, final=False):
+        """End a source's session and detach it from the scheduler; after a final close, use() refuses
+        the source until it is opened again"""
+        with self.lock:
+            session = self.sessions.pop(source_id, None)
+            if session is not None:
+                self.broadcaster.inference_scheduler.unregister_source(source_id)
+            if final:
+                # Only frames already in flight can still arrive, so the most recent ids are enough
+                self.closed[source_id] = None
+                while len(self.closed) > self.max_closed:
+                    self.closed.popitem(last=False)
+        return session
+
+    def get(self, source_id):
+        return self.sessions.get(source_id)
+
+    @contextmanager
+    def use(self, source_id):
+        """The source's session for the duration of one frame, opening one if it was evicted"""
+        with self.lock:
+            if source_id in self.closed:
+                raise SessionClosed(source_id)
+            session = self.sessions.get(source_id) or self._create(source_id)
+            session.busy += 1
+
+        try:
+            yield session
+        finally:
+            with self.lock:
+                session.busy -= 1
+                session.frames += 1
+                session.last_active = time.monotonic()
+
+    # ----------------------------------------
+    # Eviction
+    # ----------------------------------------
+
+    def memory_pressure(self):
+        """True when the process is over its RSS limit or the machine is running out of memory"""
+        try:
+            if self.memory_limit_mb and self.process.memory_info().rss > self.memory_limit_mb * 1024 * 1024:
+                return True
+            return psutil.virtual_memory().percent >= self.memory_percent_limit
+        except psutil.Error:
+            return False
+
+    def sweep(self, now=None):
+        """Evict idle sessions; returns the evicted ones"""
+        now = time.monotonic() if now is None else now
+        pressure = self.memory_pressure()
+        timeout = self.pressure_idle_timeout if pressure else self.idle_timeout
+
+        with self.lock:
+            evicted = [
+                session for session in self.sessions.values()
+                if not session.busy and now - session.last_active > timeout
+            ]
+            for session in evicted:
+                del self.sessions[session.source_id]
+                self.broadcaster.inference_scheduler.unregister_source(session.source_id)
+
+        for session in evicted:
+            metrics.SESSIONS_EVICTED.labels('memory' if pressure else 'idle').inc()
+            print(f"Evicted idle tracking session {session.session_id} ({session.source_id}"
+                  f"{', memory pressure' if pressure else ''})")
+
+        return evicted
+
+    def sweep_loop(self):
+        while not self.stop_event.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Session sweep error: {e}")
+
+    def stop(self):
+        self.stop_event.set()
+
+    def report(self):
+        now = time.monotonic()
+        with self.lock:
+            sessions = list(self.sessions.values())
+        return [session.summary(now) for session in sessions]
@@ -0,0 +1,160 @@
+"""
+In-process stand-in for the Spotify accounts service and Web API
+
+Serves /api/token and the /v1 endpoints the backend calls from a FastAPI app
+mounted on httpx.ASGITransport, so SpotifyClient and everything built on it
+run their real HTTP code without the network. Tests script failures ahead of
+time (fail()), expire access tokens (expire_access_tokens()) and look at
+what was called (calls) and at the player state afterwards.
+"""
+
+import itertools
+from collections import defaultdict, deque
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+from app.services.spotify_client import SpotifyClient, SpotifyToken
+
+API_BASE = "http://spotify.test/v1"
+ACCOUNTS_BASE = "http://accounts.spotify.test"
+
+
+class SpotifyStandIn:
+    def __init__(self, rotate_refresh_tokens: bool = False):
+        self.rotate_refresh_tokens = rotate_refresh_tokens
+        self.counter = itertools.count(1)
+        self.access_tokens: set[str] = set()
+        self.refresh_tokens: set[str] = set()
+        self.failures: dict[str, deque] = defaultdict(deque)  # {path: [(status, headers)]} answered first
+        self.calls: list[tuple[str, str, dict]] = []  # (method, path, query)
+
+        # Player state of the one device
+        self.device = {"id": "device-1", "name": "spotifyd", "is_active": True}
+        self.playlists: dict[str, list[str]] = {}  # {playlist_id: track URIs}
+        self.playing: str | None = None
+        self.queue: deque[str] = deque()
+
+        self.app = FastAPI()
+        self.app.middleware("http")(self.scripted_failures)
+        self.routes()
+
+    # ----------------------------------------
+    # Test helpers
+    # ----------------------------------------
+
+    def client(self, **kwargs) -> SpotifyClient:
+        kwargs.setdefault("backoff", 0.001)
+        return SpotifyClient("client-id", "client-secret", "http://127.0.0.1/callback",
+                             api_base=API_BASE, accounts_base=ACCOUNTS_BASE,
+                             transport=httpx.ASGITransport(app=self.app), **kwargs)
+
+    def login(self) -> SpotifyToken:
+        """A token pair as the authorization code exchange would hand it out"""
+        return SpotifyToken(self.issue(self.access_tokens, "access"), self.issue(self.refresh_tokens, "refresh"))
+
+    def issue(self, tokens: set[str], kind: str) -> str:
+        token = f"{kind}-{next(self.counter)}"
+        tokens.add(token)
+        return token
+
+    def expire_access_tokens(self):
+        """Revoke every access token; the next API call is answered 401"""
+        self.access_tokens.clear()
+
+    def fail(self, path: str, status: int, times: int = 1, headers: dict | None = None):
+        self.failures[path].extend([(status, headers or {})] * times)
+
+    def count(self, method: str, path: str) -> int:
+        return sum(1 for call in self.calls if call[:2] == (method, path))
+
+    async def scripted_failures(self, request: Request, call_next):
+        path = request.url.path
+        self.calls.append((request.method, path, dict(request.query_params)))
+        if self.failures[path]:
+            status, headers = self.failures[path].popleft()
+            return JSONResponse(status_code=status, content={"error": {"status": status}}, headers=headers)
+        return await call_next(request)
+
+    # ----------------------------------------
+    # Endpoints
+    # ----------------------------------------
+
+    def authorized(self, request: Request) -> bool:
+        return request.headers.get("Authorization", "").removeprefix("Bearer ") in self.access_tokens
+
+    def routes(self):
+        app = self.app
+        unauthorized = JSONResponse(status_code=401, content={"error": {"status": 401, "message": "Token expired"}})
+
+        @app.post("/api/token")
+        async def token(request: Request):
+            form = await request.form()
+            if form.get("grant_type") != "refresh_token":
+                return JSONResponse(status_code=400, content={"error": "unsupported_grant_type"})
+            if form.get("refresh_token") not in self.refresh_tokens:
+                return JSONResponse(status_code=400, content={"error": "invalid_grant"})
+
+            answer = {"access_token": self.issue(self.access_tokens, "access"), "expires_in": 3600}
+            if self.rotate_refresh_tokens:
+                self.refresh_tokens.discard(form["refresh_token"])
+                answer["refresh_token"] = self.issue(self.refresh_tokens, "refresh")
+            return answer
+
+        @app.get("/v1/me")
+        async def me(request: Request):
+            if not self.authorized(request):
+                return unauthorized
+            return {"id": "listener"}
+
+        @app.get("/v1/me/player/devices")
+        async def devices(request: Request):
+            if not self.authorized(request):
+                return unauthorized
+            return {"devices": [self.device]}
+
+        @app.get("/v1/me/player/queue")
+        async def queue(request: Request):
+            if not self.authorized(request):
+                return unauthorized
+            return {"currently_playing": self.playing and {"uri": self.playing},
+                    "queue": [{"uri": uri} for uri in self.queue]}
+
+        @app.post("/v1/me/player/queue")
+        async def add_to_queue(request: Request, uri: str):
+            if not self.authorized(request):
+                return unauthorized
+            self.queue.append(uri)
+            return Response(status_code=204)
+
+        @app.post("/v1/me/player/next")
+        async def skip(request: Request):
+            if not self.authorized(request):
+                return unauthorized
+            self.playing = self.queue.popleft() if self.queue else None
+            return Response(status_code=204)
+
+        @app.put("/v1/me/player/play")
+        async def play(request: Request):
+            if not self.authorized(request):
+                return unauthorized
+            body = await request.json()
+            # Playing a context doesn't touch the user's queue
+            playlist_id = body["context_uri"].rsplit(":", 1)[-1]
+            offset = body.get("offset", {})
+            self.playing = offset.get("uri") or self.playlists[playlist_id][offset.get("position", 0)]
+            return Response(status_code=204)
+
+        @app.get("/v1/playlists/{playlist_id}")
+        async def playlist(request: Request, playlist_id: str):
+            if not self.authorized(request):
+                return unauthorized
+            return {"tracks": {"total": len(self.playlists[playlist_id])}}
+
+        @app.get("/v1/playlists/{playlist_id}/tracks")
+        async def playlist_tracks(request: Request, playlist_id: str, offset: int = 0, limit: int = 100):
+            if not self.authorized(request):
+                return unauthorized
+            uris = self.playlists[playlist_id][offset:offset + limit]
+            return {"items": [{"track": {"uri": uri}} for uri in uris]}
@@ -0,0 +1,104 @@
+import asyncio
+import unittest
+
+from app.services.playback_planner import PlaybackPlanner
+from app.services.spotify_cache import SpotifyCache
+from tests.spotify_standin import SpotifyStandIn
+
+PLAYLISTS = {emotion: f"spotify:playlist:{emotion}" for emotion in ("happy", "sad")}
+USER_TRACK = "spotify:track:queued-by-user"
+
+
+class PlaybackPlannerTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.spotify = SpotifyStandIn()
+        for emotion in PLAYLISTS:
+            self.spotify.playlists[emotion] = [f"spotify:track:{emotion}-{i}" for i in range(20)]
+
+        self.client = self.spotify.client()
+        self.token = self.spotify.login()
+        self.planner = PlaybackPlanner(self.client, SpotifyCache(self.client), PLAYLISTS, queue_size=3)
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    async def switch(self, emotion: str) -> str:
+        """What start_playback does: play the lined-up (or a fresh) track of the emotion"""
+        uri = await self.planner.track_for("session", self.token, emotion)
+        response = await self.client.request("PUT", "/me/player/play", self.token, json_data={
+            "context_uri": PLAYLISTS[emotion], "offset": {"uri": uri}, "position_ms": 0})
+        self.assertEqual(response.status_code, 204)
+        return uri
+
+    async def settle(self):
+        """Let background refills finish, so they aren't counted as part of the next call"""
+        while self.planner.background:
+            await asyncio.gather(*self.planner.background)
+        self.spotify.calls.clear()
+
+    async def test_line_up_leaves_the_device_queue_alone(self):
+        await self.planner.line_up("session", self.token, "happy")
+        await self.planner.line_up("session", self.token, "sad")
+
+        self.assertEqual(self.spotify.count("POST", "/v1/me/player/queue"), 0)
+        self.assertEqual(list(self.spotify.queue), [])
+        self.assertEqual(self.planner.lined_up["session"][0], "sad")
+
+    async def test_switch_plays_the_lined_up_track(self):
+        await self.planner.line_up("session", self.token, "happy")
+        lined_up = self.planner.lined_up["session"][1]
+
+        self.assertEqual(await self.switch("happy"), lined_up)
+        self.assertEqual(self.spotify.playing, lined_up)
+        self.assertNotIn("session", self.planner.lined_up)
+
+    async def test_switch_to_another_emotion_ignores_the_lined_up_track(self):
+        await self.planner.line_up("session", self.token, "happy")
+
+        uri = await self.switch("sad")
+
+        self.assertTrue(uri.startswith("spotify:track:sad-"))
+        self.assertEqual(self.spotify.playing, uri)
+
+    async def test_switch_leaves_what_the_user_queued(self):
+        self.spotify.queue.append(USER_TRACK)
+        await self.planner.line_up("session", self.token, "happy")
+
+        uri = await self.switch("happy")
+
+        self.assertEqual(self.spotify.playing, uri)
+        self.assertEqual(list(self.spotify.queue), [USER_TRACK])  # Still plays after ours
+
+    async def test_lined_up_switch_is_one_round_trip(self):
+        await self.planner.line_up("session", self.token, "happy")
+        await self.settle()
+
+        await self.switch("happy")
+
+        self.assertEqual([call[:2] for call in self.spotify.calls], [("PUT", "/v1/me/player/play")])
+
+    async def test_switch_on_a_prefetched_track_is_one_round_trip(self):
+        await self.planner.prefetch_all(self.token)
+        await self.settle()
+
+        await self.switch("sad")
+
+        self.assertEqual([call[:2] for call in self.spotify.calls], [("PUT", "/v1/me/player/play")])
+
+    async def test_lines_up_once_per_emotion(self):
+        await self.planner.line_up("session", self.token, "happy")
+        lined_up = self.planner.lined_up["session"]
+        await self.planner.line_up("session", self.token, "happy")
+
+        self.assertEqual(self.planner.lined_up["session"], lined_up)
+
+    async def test_forget_drops_the_lined_up_track(self):
+        await self.planner.line_up("session", self.token, "happy")
+        lined_up = self.planner.lined_up["session"][1]
+        self.planner.forget("session")
+
+        self.assertNotEqual(await self.planner.track_for("session", self.token, "happy"), lined_up)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from app.services import spotify_service
+from app.services.session_store import InMemorySessionStore, SQLiteSessionStore
+from tests.spotify_standin import SpotifyStandIn
+
+
+class SessionTokenTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.spotify = SpotifyStandIn(rotate_refresh_tokens=True)
+        self.client = self.spotify.client()
+        store = InMemorySessionStore(session_ttl=60, oauth_state_ttl=60)
+        patches = [mock.patch.object(spotify_service, "session_store", store),
+                   mock.patch.object(spotify_service, "session_tokens", type(spotify_service.session_tokens)())]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    async def test_requests_of_a_session_share_one_token(self):
+        await spotify_service.save_session_token("session", self.spotify.login())
+
+        first = await spotify_service.load_session_token("session")
+        second = await spotify_service.load_session_token("session")
+
+        self.assertIs(first, second)
+
+    async def test_concurrent_requests_refresh_a_rotating_token_once(self):
+        await spotify_service.save_session_token("session", self.spotify.login())
+        self.spotify.expire_access_tokens()
+
+        async def handle_request():
+            token = await spotify_service.load_session_token("session")
+            response = await self.client.request("GET", "/me", token)
+            await spotify_service.save_session_token("session", token)
+            return response.status_code
+
+        self.assertEqual(await asyncio.gather(*(handle_request() for _ in range(5))), [200] * 5)
+        self.assertEqual(self.spotify.count("POST", "/api/token"), 1)
+
+        # The stored refresh token is the one Spotify still accepts
+        stored = await spotify_service.load_session_token("session")
+        self.assertEqual(self.spotify.refresh_tokens, {stored.refresh_token})
+
+    async def test_takes_over_a_token_refreshed_by_another_worker(self):
+        token = self.spotify.login()
+        await spotify_service.save_session_token("session", token)
+        cached = await spotify_service.load_session_token("session")
+
+        newer = dict(token.to_dict(), access_token="access-from-elsewhere", expires_at=token.expires_at + 60)
+        await spotify_service.session_store.aset("session", {"spotify_token": newer})
+
+        self.assertIs(await spotify_service.load_session_token("session"), cached)
+        self.assertEqual(cached.access_token, "access-from-elsewhere")
+
+    async def test_delete_session_forgets_the_token(self):
+        await spotify_service.save_session_token("session", self.spotify.login())
+
+        await spotify_service.delete_session("session")
+
+        self.assertIsNone(await spotify_service.load_session_token("session"))
+        self.assertIsNone(spotify_service.cached_session_token("session"))
+
+
+class SQLiteSessionStoreTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = SQLiteSessionStore(os.path.join(directory.name, "sessions.db"), session_ttl=60, oauth_state_ttl=60)
+        self.addCleanup(self.store.executor.shutdown)
+
+    async def test_queries_run_off_the_event_loop(self):
+        threads = []
+        get = self.store.get
+
+        def recording_get(session_id):
+            threads.append(threading.current_thread())
+            return get(session_id)
+
+        self.store.get = recording_get
+        await self.store.aset("session", {"answer": 42})
+
+        self.assertEqual(await self.store.aget("session"), {"answer": 42})
+        self.assertNotIn(threading.main_thread(), threads)
+
+    async def test_oauth_state_is_consumed_once(self):
+        await self.store.aput_oauth_state("state", "session")
+
+        self.assertEqual(await self.store.apop_oauth_state("state"), "session")
+        self.assertIsNone(await self.store.apop_oauth_state("state"))
+
+
+if __name__ == "__main__":
+    unittest.main()
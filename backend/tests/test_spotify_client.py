@@ -0,0 +1,136 @@
+import asyncio
+import time
+import unittest
+
+from app.services.spotify_client import SpotifyAuthError
+from tests.spotify_standin import SpotifyStandIn
+
+
+class SpotifyClientTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.spotify = SpotifyStandIn()
+        self.client = self.spotify.client()
+        self.token = self.spotify.login()
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    def record_delays(self) -> list[float]:
+        """Keep the delays the client picks between retries, without waiting them out"""
+        delays = []
+        retry_delay = self.client._retry_delay
+
+        def recording(attempt, response):
+            delays.append(retry_delay(attempt, response))
+            return 0.0
+
+        self.client._retry_delay = recording
+        return delays
+
+    # ----------------------------------------
+    # Tokens
+    # ----------------------------------------
+
+    async def test_refreshes_and_retries_once_on_401(self):
+        stale = self.token.access_token
+        self.spotify.expire_access_tokens()
+
+        response = await self.client.request("GET", "/me", self.token)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(self.token.access_token, stale)
+        self.assertEqual(self.spotify.count("POST", "/api/token"), 1)
+        self.assertEqual(self.spotify.count("GET", "/v1/me"), 2)
+
+    async def test_concurrent_401s_share_one_refresh(self):
+        self.spotify.expire_access_tokens()
+
+        responses = await asyncio.gather(*(self.client.request("GET", "/me", self.token) for _ in range(5)))
+
+        self.assertEqual([response.status_code for response in responses], [200] * 5)
+        self.assertEqual(self.spotify.count("POST", "/api/token"), 1)
+
+    async def test_refreshes_expiring_token_before_the_request(self):
+        self.token.expires_at = time.time() + 10
+        self.spotify.expire_access_tokens()
+
+        response = await self.client.request("GET", "/me", self.token)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.spotify.count("GET", "/v1/me"), 1)  # No 401 round trip
+
+    async def test_keeps_rotated_refresh_token(self):
+        self.spotify.rotate_refresh_tokens = True
+        first_refresh_token = self.token.refresh_token
+
+        for _ in range(2):
+            self.spotify.expire_access_tokens()
+            self.assertEqual((await self.client.request("GET", "/me", self.token)).status_code, 200)
+
+        # Both refreshes went through, the second one with the token the first handed out
+        self.assertEqual(self.spotify.count("POST", "/api/token"), 2)
+        self.assertNotEqual(self.token.refresh_token, first_refresh_token)
+        self.assertEqual(self.spotify.refresh_tokens, {self.token.refresh_token})
+
+    async def test_keeps_refresh_token_when_not_rotated(self):
+        refresh_token = self.token.refresh_token
+        self.spotify.expire_access_tokens()
+
+        await self.client.request("GET", "/me", self.token)
+
+        self.assertEqual(self.token.refresh_token, refresh_token)
+
+    async def test_revoked_refresh_token_raises(self):
+        self.spotify.refresh_tokens.clear()
+        self.spotify.expire_access_tokens()
+
+        with self.assertRaises(SpotifyAuthError):
+            await self.client.request("GET", "/me", self.token)
+
+    # ----------------------------------------
+    # Retries
+    # ----------------------------------------
+
+    async def test_429_waits_retry_after(self):
+        delays = self.record_delays()
+        self.spotify.fail("/v1/me", 429, headers={"Retry-After": "7"})
+
+        response = await self.client.request("GET", "/me", self.token)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(delays, [7.0])
+
+    async def test_5xx_backs_off_exponentially_until_success(self):
+        delays = self.record_delays()
+        self.spotify.fail("/v1/me", 502)
+        self.spotify.fail("/v1/me", 503)
+
+        response = await self.client.request("GET", "/me", self.token)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.spotify.count("GET", "/v1/me"), 3)
+        for attempt, delay in enumerate(delays):
+            full = self.client.backoff * 2 ** attempt
+            self.assertTrue(full / 2 <= delay <= full, f"delay {delay} of attempt {attempt}")
+
+    async def test_5xx_gives_up_after_max_retries(self):
+        delays = self.record_delays()
+        self.spotify.fail("/v1/me", 503, times=10)
+
+        response = await self.client.request("GET", "/me", self.token)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.spotify.count("GET", "/v1/me"), self.client.max_retries + 1)
+        self.assertEqual(len(delays), self.client.max_retries)
+
+    async def test_client_errors_are_not_retried(self):
+        self.spotify.fail("/v1/me", 404)
+
+        response = await self.client.request("GET", "/me", self.token)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.spotify.count("GET", "/v1/me"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
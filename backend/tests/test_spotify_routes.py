@@ -0,0 +1,55 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from app.routers import spotify as routes
+from app.services import spotify_service
+from app.services.playback_planner import PlaybackPlanner
+from app.services.session_store import InMemorySessionStore
+from app.services.spotify_cache import SpotifyCache
+from tests.spotify_standin import SpotifyStandIn
+
+
+class StartPlaybackTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.spotify = SpotifyStandIn()
+        for entry in routes.playlists.values():
+            playlist_id = entry['playlist'].rsplit(":", 1)[-1]
+            self.spotify.playlists[playlist_id] = [f"spotify:track:{playlist_id}-{i}" for i in range(20)]
+
+        self.client = self.spotify.client()
+        cache = SpotifyCache(self.client)
+        self.planner = PlaybackPlanner(self.client, cache, {emotion: entry['playlist'] for emotion, entry in routes.playlists.items()})
+        store = InMemorySessionStore(session_ttl=60, oauth_state_ttl=60)
+
+        patches = [mock.patch.object(spotify_service, "spotify_client", self.client),
+                   mock.patch.object(spotify_service, "spotify_cache", cache),
+                   mock.patch.object(spotify_service, "session_store", store),
+                   mock.patch.object(spotify_service, "session_tokens", type(spotify_service.session_tokens)()),
+                   mock.patch.object(routes, "spotify_cache", cache),
+                   mock.patch.object(routes, "playback_planner", self.planner)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    async def test_lined_up_track_on_a_cached_device_is_one_request(self):
+        token = self.spotify.login()
+        await spotify_service.save_session_token("session", token)
+        await spotify_service.find_spotify_device_id("session", token)
+        await self.planner.line_up("session", token, "happy")
+        lined_up = self.planner.lined_up["session"][1]
+        while self.planner.background:
+            await asyncio.gather(*self.planner.background)
+        self.spotify.calls.clear()
+
+        self.assertIsNone(await routes.start_playback("session", "happy"))
+
+        self.assertEqual([call[:2] for call in self.spotify.calls], [("PUT", "/v1/me/player/play")])
+        self.assertEqual(self.spotify.playing, lined_up)
+
+
+if __name__ == "__main__":
+    unittest.main()